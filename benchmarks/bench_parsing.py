@@ -0,0 +1,110 @@
+# benchmarks/bench_parsing.py
+"""
+So sánh parse số / giờ kiểu cũ (Series.apply từng dòng) với src.utils.parsing.
+
+Chạy từ thư mục gốc:
+    python -m benchmarks.bench_parsing [--rows 2000000]
+
+Dữ liệu giả lập giống roads_*.csv / customers: số thập phân dấu chấm lẫn dấu phẩy,
+ô trống, chuỗi rác, giờ "HH:MM". Kiểm tra kết quả giống hệt trước khi in thời gian.
+"""
+
+import argparse
+import re
+import time
+
+import numpy as np
+import pandas as pd
+
+from src.utils.parsing import extract_leading_number, hhmm_to_min, parse_number
+
+
+# ---- bản cũ (copy từ các loader trước khi vector hoá) ----
+
+def _parse_number_row(x):
+    if pd.isna(x):
+        return None
+    s = str(x).strip().replace(",", ".")
+    try:
+        return float(s)
+    except ValueError:
+        return None
+
+
+def _hhmm_to_min_row(x):
+    if pd.isna(x):
+        return None
+    m = re.match(r"(\d{1,2}):(\d{2})", str(x))
+    if not m:
+        return None
+    return int(m.group(1)) * 60 + int(m.group(2))
+
+
+def _extract_leading_number_row(x):
+    if pd.isna(x):
+        return None
+    m = re.match(r"(\d+(\.\d+)?)", str(x).strip())
+    return float(m.group(1)) if m else None
+
+
+# ---- dữ liệu giả lập ----
+
+def _make_columns(rows: int, seed: int = 0) -> dict:
+    rng = np.random.default_rng(seed)
+    values = np.round(rng.uniform(0.1, 500, rows), 3).astype(str).astype(object)
+    comma = rng.random(rows) < 0.3
+    values[comma] = [v.replace(".", ",") for v in values[comma]]
+    values[rng.random(rows) < 0.01] = None
+    values[rng.random(rows) < 0.005] = "n/a"
+
+    hours = rng.integers(0, 24, rows)
+    minutes = rng.integers(0, 60, rows)
+    times = np.char.add(np.char.add(hours.astype(str), ":"),
+                        np.char.zfill(minutes.astype(str), 2)).astype(object)
+    times[rng.random(rows) < 0.01] = None
+
+    hours_text = np.char.add(rng.integers(4, 13, rows).astype(str), " hours").astype(object)
+
+    numeric = np.round(rng.uniform(0.1, 500, rows), 3)
+    numeric[rng.random(rows) < 0.01] = np.nan
+
+    return {
+        "number": pd.Series(values, dtype=object),
+        "numeric": pd.Series(numeric),
+        "hhmm": pd.Series(times, dtype=object),
+        "leading": pd.Series(hours_text, dtype=object),
+    }
+
+
+def _timed(fn, *args):
+    t0 = time.perf_counter()
+    out = fn(*args)
+    return out, time.perf_counter() - t0
+
+
+def run(rows: int):
+    cols = _make_columns(rows)
+    cases = [
+        ("parse_number (chuỗi)", cols["number"], _parse_number_row, parse_number),
+        ("parse_number (đã là số)", cols["numeric"], _parse_number_row, parse_number),
+        ("hhmm_to_min", cols["hhmm"], _hhmm_to_min_row, hhmm_to_min),
+        ("extract_leading_number", cols["leading"], _extract_leading_number_row, extract_leading_number),
+    ]
+
+    print(f"Benchmark parse ({rows:,} dòng)")
+    for name, series, row_fn, vec_fn in cases:
+        old, t_old = _timed(series.apply, row_fn)
+        new, t_new = _timed(vec_fn, series)
+        same = np.array_equal(
+            old.to_numpy(dtype="float64"), new.to_numpy(dtype="float64"), equal_nan=True
+        )
+        print(
+            f"  - {name:<24} apply {t_old:7.2f}s | vector {t_new:6.2f}s "
+            f"| x{t_old / max(t_new, 1e-9):7.1f} | {'giống hệt' if same else 'KHÁC!'}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    run(parser.parse_args().rows)
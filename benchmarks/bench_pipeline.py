@@ -0,0 +1,376 @@
+# benchmarks/bench_pipeline.py
+"""
+Benchmark toàn pipeline (Stage 1–6 + GA) trên dữ liệu giả lập nhiều kích thước.
+
+Chạy từ thư mục gốc:
+    python -m benchmarks.bench_pipeline run --nodes 1000 5000 20000 [--save-baseline]
+    python -m benchmarks.bench_pipeline compare [--threshold 0.15]
+
+run:
+    - mỗi kích thước: sinh data_raw (benchmarks.synthetic) trong 1 workspace tạm gồm
+      bản copy main.py + src/ (config.py ghi đè theo --set, mặc định dùng hết khách:
+      MAX_CUSTOMERS_PER_REGION = None), data_processed của repo không bị đụng tới
+    - mỗi stage chạy `python main.py --stage N --force` trong process riêng; GA chạy
+      `python -m src.ga.ga_improved` với số thế hệ cố định (--ga-generations, 0 = bỏ)
+    - ghi wall time, CPU time, peak RSS (process + worker, theo wait4) và throughput
+      (số đơn vị / giây: dòng roads, edge, ô ma trận ...) vào history (JSON)
+compare:
+    - lần chạy mới nhất trong history của từng kích thước so với baseline cùng kích
+      thước; chậm hơn threshold (và hơn --min-seconds) hoặc RSS tăng hơn
+      --memory-threshold -> báo regression, exit code 1
+"""
+
+import argparse
+import json
+import os
+import platform
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.synthetic import generate_instance
+from src.utils.config import ROOT
+
+RESULTS_DIR = ROOT / "benchmarks" / "results"
+HISTORY_FILE = RESULTS_DIR / "history.json"
+BASELINE_FILE = RESULTS_DIR / "baseline.json"
+
+# Ghi đè config.py trong workspace (tên hằng -> biểu thức Python)
+DEFAULT_OVERRIDES = {"MAX_CUSTOMERS_PER_REGION": "None"}
+
+GA_ISLANDS = 2
+GA_POPULATION = 20
+
+
+# ============================================================
+#  WORKSPACE
+# ============================================================
+
+def _patch_config(config_path: Path, overrides: dict):
+    text = config_path.read_text(encoding="utf-8")
+    for name, value in overrides.items():
+        pattern = re.compile(rf"^({re.escape(name)}\s*=\s*)([^#\n]*?)(\s*(#.*)?)$", re.MULTILINE)
+        if not pattern.search(text):
+            raise KeyError(f"Không có {name} trong config.py")
+        text = pattern.sub(lambda m: m.group(1) + value + m.group(3), text, count=1)
+    config_path.write_text(text, encoding="utf-8")
+
+
+def prepare_workspace(workdir: Path, overrides: dict) -> Path:
+    """Copy main.py + src/ vào workdir, ghi đè config; data_raw / data_processed để trống."""
+    workdir = Path(workdir)
+    shutil.copy2(ROOT / "main.py", workdir / "main.py")
+    shutil.copytree(ROOT / "src", workdir / "src", ignore=shutil.ignore_patterns("__pycache__"))
+    _patch_config(workdir / "src" / "utils" / "config.py", overrides)
+    (workdir / "data_processed").mkdir(exist_ok=True)
+    (workdir / "logs").mkdir(exist_ok=True)
+    return workdir
+
+
+# ============================================================
+#  ĐO 1 BƯỚC
+# ============================================================
+
+def run_step(name: str, cmd: list, workdir: Path) -> dict:
+    """
+    Chạy cmd trong workdir (process riêng), trả về wall / CPU time + peak RSS.
+    Log ghi ra workdir/logs/{name}.log; exit code khác 0 -> RuntimeError.
+    """
+    log_path = workdir / "logs" / f"{name}.log"
+    with open(log_path, "w", encoding="utf-8") as log:
+        t0 = time.perf_counter()
+        proc = subprocess.Popen(cmd, cwd=workdir, stdout=log, stderr=subprocess.STDOUT)
+        # wait4: rusage của riêng process này (+ các worker nó đã đợi), không lẫn bước trước
+        _, status, usage = os.wait4(proc.pid, 0)
+        seconds = time.perf_counter() - t0
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    if proc.returncode != 0:
+        tail = log_path.read_text(encoding="utf-8", errors="replace").splitlines()[-15:]
+        raise RuntimeError(f"{name} lỗi (exit {proc.returncode}):\n" + "\n".join(tail))
+
+    scale = 1024 ** 2 if sys.platform == "darwin" else 1024   # ru_maxrss: bytes (macOS) / kB
+    return {
+        "name": name,
+        "seconds": round(seconds, 3),
+        "cpu_seconds": round(usage.ru_utime + usage.ru_stime, 3),
+        "peak_rss_mb": round(usage.ru_maxrss / scale, 1),
+    }
+
+
+def _count_edges(path: Path) -> int:
+    with np.load(path, allow_pickle=False) as data:
+        return int(len(data["origin_id"]))
+
+
+def _matrix_cells(processed: Path) -> int:
+    return sum(
+        len(pd.read_csv(path, usecols=["node_id"])) ** 2
+        for path in processed.glob("matrix_nodes_*.csv")
+    )
+
+
+def _stage_items(stage: int, instance, processed: Path):
+    """(số đơn vị, tên đơn vị) mà stage xử lý, để tính throughput."""
+    if stage == 1:
+        return instance.customers + instance.depots + instance.vehicles, "dòng raw"
+    if stage == 3:
+        return instance.road_rows, "dòng roads"
+    if stage == 4:
+        return _count_edges(processed / "edges_master.npz"), "edge"
+    if stage == 5:
+        return _matrix_cells(processed), "ô ma trận"
+    return instance.nodes, "node"
+
+
+def _regions(processed: Path) -> list:
+    nodes = pd.read_csv(processed / "nodes_master.csv", usecols=["region_id"])
+    return nodes["region_id"].dropna().unique().tolist()
+
+
+# ============================================================
+#  RUN
+# ============================================================
+
+def _environment() -> dict:
+    return {
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def _git_commit() -> str:
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+            capture_output=True, text=True, check=True,
+        )
+        return out.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def bench_size(
+    nodes: int,
+    workdir: Path,
+    seed: int = 0,
+    raw_format: str = "xlsx",
+    overrides: dict = None,
+    ga_generations: int = 3,
+) -> dict:
+    """Sinh dữ liệu + chạy Stage 1–6 (+ GA) cho 1 kích thước, trả về bản ghi kết quả."""
+    overrides = {**DEFAULT_OVERRIDES, **(overrides or {})}
+    prepare_workspace(workdir, overrides)
+    processed = workdir / "data_processed"
+
+    t0 = time.perf_counter()
+    instance = generate_instance(workdir / "data_raw", nodes, seed=seed, raw_format=raw_format)
+    generate_seconds = time.perf_counter() - t0
+    print(f"\n=== BENCHMARK {instance.nodes} node ({instance.customers} khách, {instance.depots} depot, "
+          f"{instance.road_rows:,} dòng roads) – sinh dữ liệu {generate_seconds:.1f}s ===")
+
+    steps = []
+    for stage in range(1, 7):
+        step = run_step(f"stage{stage}", [sys.executable, "main.py", "--stage", str(stage), "--force"], workdir)
+        step["items"], step["unit"] = _stage_items(stage, instance, processed)
+        steps.append(step)
+
+    if ga_generations:
+        cmd = [
+            sys.executable, "-m", "src.ga.ga_improved", *_regions(processed),
+            "--generations", str(ga_generations), "--stagnation", str(ga_generations),
+            "--islands", str(GA_ISLANDS), "--population", str(GA_POPULATION), "--seed", str(seed),
+        ]
+        step = run_step("ga", cmd, workdir)
+        step["items"], step["unit"] = instance.customers * ga_generations, "khách·thế hệ"
+        steps.append(step)
+
+    for step in steps:
+        step["throughput"] = round(step["items"] / max(step["seconds"], 1e-9), 1)
+        print(f"  - {step['name']:<7} {step['seconds']:8.2f}s | CPU {step['cpu_seconds']:8.2f}s "
+              f"| peak RSS {step['peak_rss_mb']:8.1f} MB | {step['throughput']:>12,.0f} {step['unit']}/s")
+
+    return {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "commit": _git_commit(),
+        "instance": instance.to_dict(),
+        "overrides": overrides,
+        "ga_generations": ga_generations,
+        "environment": _environment(),
+        "generate_seconds": round(generate_seconds, 3),
+        "total_seconds": round(sum(step["seconds"] for step in steps), 3),
+        "steps": steps,
+    }
+
+
+# ============================================================
+#  HISTORY / BASELINE
+# ============================================================
+
+def load_runs(path: Path) -> list:
+    path = Path(path)
+    if not path.exists():
+        return []
+    return json.loads(path.read_text(encoding="utf-8"))
+
+
+def save_runs(runs: list, path: Path):
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_text(json.dumps(runs, ensure_ascii=False, indent=2), encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def _latest_by_size(runs: list) -> dict:
+    """Số node -> lần chạy mới nhất (thứ tự trong file)."""
+    return {run["instance"]["nodes"]: run for run in runs}
+
+
+def update_baseline(records: list, path: Path = BASELINE_FILE):
+    """Ghi đè baseline của các kích thước vừa chạy, giữ nguyên kích thước khác."""
+    latest = _latest_by_size(load_runs(path))
+    latest.update(_latest_by_size(records))
+    save_runs([latest[nodes] for nodes in sorted(latest)], path)
+
+
+def compare_runs(
+    current: dict,
+    baseline: dict,
+    threshold: float = 0.15,
+    memory_threshold: float = 0.25,
+    min_seconds: float = 0.5,
+) -> list:
+    """
+    So 1 lần chạy với baseline cùng kích thước, in bảng theo bước.
+    Trả về list bước bị regression (thời gian và / hoặc RSS).
+    """
+    base_steps = {step["name"]: step for step in baseline["steps"]}
+    regressions = []
+    print(f"\n=== {current['instance']['nodes']} node: {current.get('commit')} ({current['timestamp']}) "
+          f"so với baseline {baseline.get('commit')} ({baseline['timestamp']}) ===")
+    for step in current["steps"]:
+        base = base_steps.get(step["name"])
+        if base is None:
+            print(f"  - {step['name']:<7} {step['seconds']:8.2f}s (baseline không có bước này)")
+            continue
+        ratio = step["seconds"] / max(base["seconds"], 1e-9) - 1
+        mem_ratio = step["peak_rss_mb"] / max(base["peak_rss_mb"], 1e-9) - 1
+        slower = ratio > threshold and step["seconds"] - base["seconds"] > min_seconds
+        heavier = mem_ratio > memory_threshold
+        flag = ""
+        if slower or heavier:
+            regressions.append(step["name"])
+            flag = "  ⚠ REGRESSION" + (" (thời gian)" if slower else "") + (" (bộ nhớ)" if heavier else "")
+        elif ratio < -threshold and base["seconds"] - step["seconds"] > min_seconds:
+            flag = "  ✔ nhanh hơn"
+        print(f"  - {step['name']:<7} {base['seconds']:8.2f}s -> {step['seconds']:8.2f}s ({ratio:+7.1%}) "
+              f"| RSS {base['peak_rss_mb']:7.1f} -> {step['peak_rss_mb']:7.1f} MB ({mem_ratio:+6.1%}){flag}")
+    return regressions
+
+
+# ============================================================
+#  CLI
+# ============================================================
+
+def _parse_overrides(items: list) -> dict:
+    overrides = {}
+    for item in items or []:
+        name, sep, value = item.partition("=")
+        if not sep:
+            raise SystemExit(f"--set cần dạng TÊN=GIÁ_TRỊ, nhận được: {item}")
+        overrides[name.strip()] = value.strip()
+    return overrides
+
+
+def cmd_run(args) -> int:
+    records = []
+    if args.workdir is not None:
+        args.workdir.mkdir(parents=True, exist_ok=True)
+    for nodes in args.nodes:
+        workdir = Path(tempfile.mkdtemp(prefix=f"lmd_bench_{nodes}_", dir=args.workdir))
+        try:
+            records.append(bench_size(
+                nodes, workdir, seed=args.seed, raw_format=args.raw_format,
+                overrides=_parse_overrides(args.set), ga_generations=args.ga_generations,
+            ))
+        finally:
+            if args.keep:
+                print(f"  → Giữ workspace: {workdir}")
+            else:
+                shutil.rmtree(workdir, ignore_errors=True)
+
+    save_runs(load_runs(args.history) + records, args.history)
+    print(f"\n✔ Đã ghi {len(records)} kết quả vào {args.history}")
+    if args.save_baseline:
+        update_baseline(records, args.baseline)
+        print(f"✔ Đã cập nhật baseline: {args.baseline}")
+    return 0
+
+
+def cmd_compare(args) -> int:
+    current = _latest_by_size(load_runs(args.history))
+    baseline = _latest_by_size(load_runs(args.baseline))
+    if not current or not baseline:
+        print(f"⚠ Thiếu history ({args.history}) hoặc baseline ({args.baseline}).")
+        return 2
+
+    regressions = {}
+    for nodes, run in sorted(current.items()):
+        if nodes not in baseline:
+            print(f"⚠ Baseline không có kích thước {nodes} node, bỏ qua.")
+            continue
+        found = compare_runs(run, baseline[nodes], args.threshold, args.memory_threshold, args.min_seconds)
+        if found:
+            regressions[nodes] = found
+
+    if regressions:
+        print("\n⚠ Regression: " + "; ".join(f"{n} node: {', '.join(s)}" for n, s in regressions.items()))
+        return 1
+    print("\n✔ Không có regression.")
+    return 0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    run = sub.add_parser("run", help="sinh dữ liệu + đo Stage 1–6 (+ GA)")
+    run.add_argument("--nodes", type=int, nargs="+", default=[1000, 5000, 20000])
+    run.add_argument("--seed", type=int, default=0)
+    run.add_argument("--raw-format", choices=["xlsx", "csv"], default="xlsx")
+    run.add_argument("--set", action="append", metavar="TÊN=GIÁ_TRỊ",
+                     help="ghi đè config.py trong workspace, vd. --set MATRIX_ENGINE='\"ch\"'")
+    run.add_argument("--ga-generations", type=int, default=3, help="0 = không chạy GA")
+    run.add_argument("--workdir", type=Path, default=None, help="thư mục chứa workspace tạm")
+    run.add_argument("--keep", action="store_true", help="giữ workspace (log, data) sau khi chạy")
+    run.add_argument("--history", type=Path, default=HISTORY_FILE)
+    run.add_argument("--baseline", type=Path, default=BASELINE_FILE)
+    run.add_argument("--save-baseline", action="store_true", help="lưu kết quả làm baseline mới")
+    run.set_defaults(func=cmd_run)
+
+    compare = sub.add_parser("compare", help="so lần chạy mới nhất với baseline")
+    compare.add_argument("--history", type=Path, default=HISTORY_FILE)
+    compare.add_argument("--baseline", type=Path, default=BASELINE_FILE)
+    compare.add_argument("--threshold", type=float, default=0.15, help="tỉ lệ chậm hơn cho phép")
+    compare.add_argument("--memory-threshold", type=float, default=0.25, help="tỉ lệ RSS tăng cho phép")
+    compare.add_argument("--min-seconds", type=float, default=0.5,
+                         help="bỏ qua chênh lệch thời gian nhỏ hơn (nhiễu)")
+    compare.set_defaults(func=cmd_compare)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
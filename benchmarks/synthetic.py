@@ -0,0 +1,250 @@
+# benchmarks/synthetic.py
+"""
+Sinh bộ dữ liệu raw giả lập cùng schema với data_raw (cho benchmark pipeline).
+
+    python -m benchmarks.synthetic /tmp/lmd_synth --nodes 5000 [--seed 0] [--raw-format csv]
+
+Ghi vào out_dir:
+    - customers_vietnam / depots_vietnam / vehicles_vietnam (.xlsx hoặc .csv, đúng tên cột gốc)
+    - roads_D001_D002/roads_D001_1.csv ... : Origin_Node_ID, Destination_Node_ID,
+      Distance_km, Travel_Time_min, Traffic_Level, Road_Restrictions
+
+Phân bố theo bộ dữ liệu thật:
+    - 10 city, mỗi city depots_per_city depot (D001 = Ho Chi Minh City ...)
+    - khách chỉ ở 4 city lớn (tỉ lệ HCM / Hanoi / Da Nang / Can Tho như bản gốc),
+      toạ độ quanh tâm city (độ lệch ~0.05–0.07 độ)
+    - mỗi file roads_{depot}.csv nối depot -> toàn bộ khách (như bản gốc),
+      distance = haversine x hệ số vòng 1.2–1.6, time theo tốc độ của Traffic_Level,
+      ~10% One-Way / ~10% No Heavy Trucks
+    - ~1 xe / 160 khách (ít nhất 1 xe / depot), start depot ngẫu nhiên
+Số node = số khách + số depot; cùng seed -> cùng dữ liệu.
+"""
+
+import argparse
+from dataclasses import asdict, dataclass
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from src.preprocessing.graph_engine import EARTH_RADIUS_KM
+
+# (city, lat, lon, tỉ lệ khách, độ lệch toạ độ) – theo thứ tự mã depot D001..D010
+CITIES = [
+    ("Ho Chi Minh City", 10.7856, 106.7063, 0.448, 0.069),
+    ("Hanoi", 21.0271, 105.8504, 0.352, 0.069),
+    ("Da Nang", 16.0592, 108.2031, 0.120, 0.046),
+    ("Can Tho", 10.0359, 105.7497, 0.080, 0.035),
+    ("Hai Phong", 20.8438, 106.6887, 0.0, 0.0),
+    ("Nha Trang", 12.2342, 109.2006, 0.0, 0.0),
+    ("Hue", 16.4641, 107.5826, 0.0, 0.0),
+    ("Bien Hoa", 10.9635, 106.8424, 0.0, 0.0),
+    ("Vung Tau", 10.3411, 107.0947, 0.0, 0.0),
+    ("Buon Ma Thuot", 12.6615, 108.0328, 0.0, 0.0),
+]
+
+TRAFFIC_LEVELS = np.array(["Low", "Medium", "High"], dtype=object)
+TRAFFIC_SHARE = [0.20, 0.55, 0.25]
+TRAFFIC_SPEED_KMH = np.array([35.0, 25.0, 15.0])
+RESTRICTIONS = np.array(["None", "No Heavy Trucks", "One-Way"], dtype=object)
+RESTRICTION_SHARE = [0.80, 0.10, 0.10]
+
+# (loại xe, tỉ lệ, tải kg (min, max), thể tích m3 (min, max))
+VEHICLE_TYPES = [
+    ("Motorbike", 0.36, (50, 150), (0.3, 1.0)),
+    ("Bike", 0.24, (20, 40), (0.1, 0.3)),
+    ("Van", 0.22, (800, 1500), (7.0, 14.0)),
+    ("EV Van", 0.15, (600, 1200), (5.0, 10.0)),
+    ("Cargo Trike", 0.03, (200, 400), (1.0, 3.0)),
+]
+
+CUSTOMERS_PER_VEHICLE = 160
+
+
+@dataclass
+class SyntheticInstance:
+    """Kích thước bộ dữ liệu đã sinh (ghi kèm kết quả benchmark)."""
+
+    nodes: int
+    customers: int
+    depots: int
+    vehicles: int
+    road_rows: int
+    road_files: int
+    seed: int
+    raw_format: str
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+# ============================================================
+#  BẢNG RAW
+# ============================================================
+
+def _hhmm(minutes: np.ndarray) -> np.ndarray:
+    return np.char.add(
+        np.char.add(np.char.zfill((minutes // 60).astype(str), 2), ":"),
+        np.char.zfill((minutes % 60).astype(str), 2),
+    ).astype(object)
+
+
+def make_depots(depots_per_city: int, rng: np.random.Generator) -> pd.DataFrame:
+    rows = []
+    for c, (city, lat, lon, _, _) in enumerate(CITIES, start=1):
+        for k in range(1, depots_per_city + 1):
+            rows.append({
+                "Depot_ID": f"D{c:03d}_{k}",
+                "City": city,
+                "Latitude": round(lat + rng.normal(0, 0.02), 6),
+                "Longitude": round(lon + rng.normal(0, 0.02), 6),
+                "Capacity_Storage": int(rng.integers(2000, 20000)),
+                "Operating_Hours": "06:00-22:00",
+            })
+    return pd.DataFrame(rows)
+
+
+def make_customers(n: int, rng: np.random.Generator) -> pd.DataFrame:
+    share = np.array([c[3] for c in CITIES])
+    city = rng.choice(len(CITIES), size=n, p=share / share.sum())
+    centre = np.array([[c[1], c[2]] for c in CITIES])
+    spread = np.array([c[4] for c in CITIES])
+    lat = centre[city, 0] + rng.normal(0, 1, n) * spread[city]
+    lon = centre[city, 1] + rng.normal(0, 1, n) * spread[city]
+
+    start = rng.choice([8, 9, 10, 13, 15, 17], size=n) * 60
+    length = rng.choice([2, 3, 4, 6], size=n) * 60
+    end = np.minimum(start + length, 21 * 60)
+    return pd.DataFrame({
+        "Customer_ID": [f"C{i:06d}" for i in range(1, n + 1)],
+        "Latitude": np.round(lat, 6),
+        "Longitude": np.round(lon, 6),
+        "City": np.array([c[0] for c in CITIES], dtype=object)[city],
+        "Order_Weight": np.round(rng.uniform(0.2, 25.0, n), 2),
+        "Order_Volume": np.round(rng.uniform(0.005, 0.25, n), 3),
+        "Time_Window_Start": _hhmm(start),
+        "Time_Window_End": _hhmm(end),
+        "Service_Time": rng.integers(3, 16, n),
+        "Priority_Level": rng.choice([1, 2, 3], size=n, p=[0.2, 0.6, 0.2]),
+        "Delivery_Type": rng.choice(["Home", "Locker", "Office"], size=n, p=[0.8, 0.15, 0.05]),
+        "Return_Flag": rng.random(n) < 0.08,
+    })
+
+
+def make_vehicles(n: int, depot_ids: np.ndarray, rng: np.random.Generator) -> pd.DataFrame:
+    share = np.array([t[1] for t in VEHICLE_TYPES])
+    kind = rng.choice(len(VEHICLE_TYPES), size=n, p=share / share.sum())
+    weight = np.array([t[2] for t in VEHICLE_TYPES], dtype=np.float64)[kind]
+    volume = np.array([t[3] for t in VEHICLE_TYPES], dtype=np.float64)[kind]
+    depot = rng.choice(depot_ids, size=n)
+    return pd.DataFrame({
+        "Vehicle_ID": [f"V{i:04d}" for i in range(1, n + 1)],
+        "Vehicle_Type": np.array([t[0] for t in VEHICLE_TYPES], dtype=object)[kind],
+        "Capacity_Weight": rng.uniform(weight[:, 0], weight[:, 1]).astype(np.int64),
+        "Capacity_Volume": np.round(rng.uniform(volume[:, 0], volume[:, 1]), 2),
+        "Fixed_Cost": np.round(rng.uniform(8.0, 80.0, n), 2),
+        "Variable_Cost": np.round(rng.uniform(0.02, 0.28, n), 2),
+        "Max_Distance": rng.integers(30, 350, n),
+        "Max_Working_Hours": rng.choice([8, 10, 12], size=n),
+        "Start_Depot_ID": depot,
+        "End_Depot_ID": depot,
+    })
+
+
+def make_roads(depot: pd.Series, customers: pd.DataFrame, rng: np.random.Generator) -> pd.DataFrame:
+    """roads_{depot}.csv: depot -> mọi khách."""
+    lat1, lon1 = np.radians(depot["Latitude"]), np.radians(depot["Longitude"])
+    lat2 = np.radians(customers["Latitude"].to_numpy())
+    lon2 = np.radians(customers["Longitude"].to_numpy())
+    a = (
+        np.sin((lat2 - lat1) / 2) ** 2
+        + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    )
+    n = len(customers)
+    km = 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a)) * rng.uniform(1.2, 1.6, n) + 0.3
+    traffic = rng.choice(len(TRAFFIC_LEVELS), size=n, p=TRAFFIC_SHARE)
+    return pd.DataFrame({
+        "Origin_Node_ID": depot["Depot_ID"],
+        "Destination_Node_ID": customers["Customer_ID"].to_numpy(),
+        "Distance_km": np.round(km, 3),
+        "Travel_Time_min": np.round(km / TRAFFIC_SPEED_KMH[traffic] * 60, 1),
+        "Traffic_Level": TRAFFIC_LEVELS[traffic],
+        "Road_Restrictions": rng.choice(RESTRICTIONS, size=n, p=RESTRICTION_SHARE),
+    })
+
+
+# ============================================================
+#  GHI RA THƯ MỤC RAW
+# ============================================================
+
+def _write_table(df: pd.DataFrame, path: Path, raw_format: str):
+    if raw_format == "csv":
+        df.to_csv(path.with_suffix(".csv"), index=False)
+    else:
+        df.to_excel(path.with_suffix(".xlsx"), index=False)
+
+
+def generate_instance(
+    out_dir: Path,
+    nodes: int,
+    seed: int = 0,
+    depots_per_city: int = 5,
+    raw_format: str = "xlsx",
+) -> SyntheticInstance:
+    """
+    Sinh bộ dữ liệu raw `nodes` node (khách + depot) vào out_dir (tạo nếu chưa có).
+    raw_format: "xlsx" như bản gốc (Stage 1 đo cả parse Excel) hoặc "csv".
+    """
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    rng = np.random.default_rng(seed)
+
+    depots = make_depots(depots_per_city, rng)
+    n_customers = nodes - len(depots)
+    if n_customers <= 0:
+        raise ValueError(f"nodes={nodes} phải lớn hơn số depot ({len(depots)})")
+    customers = make_customers(n_customers, rng)
+    n_vehicles = max(len(depots), round(n_customers / CUSTOMERS_PER_VEHICLE))
+    vehicles = make_vehicles(n_vehicles, depots["Depot_ID"].to_numpy(dtype=object), rng)
+
+    _write_table(customers, out_dir / "customers_vietnam", raw_format)
+    _write_table(depots, out_dir / "depots_vietnam", raw_format)
+    _write_table(vehicles, out_dir / "vehicles_vietnam", raw_format)
+
+    road_rows = 0
+    for _, depot in depots.iterrows():
+        # thư mục theo cặp mã city như bản gốc: roads_D001_D002, roads_D003_D004, ...
+        c = int(depot["Depot_ID"][1:4])
+        first = c - (c + 1) % 2
+        folder = out_dir / f"roads_D{first:03d}_D{first + 1:03d}"
+        folder.mkdir(exist_ok=True)
+        roads = make_roads(depot, customers, rng)
+        roads.to_csv(folder / f"roads_{depot['Depot_ID']}.csv", index=False)
+        road_rows += len(roads)
+
+    return SyntheticInstance(
+        nodes=len(customers) + len(depots),
+        customers=len(customers),
+        depots=len(depots),
+        vehicles=len(vehicles),
+        road_rows=road_rows,
+        road_files=len(depots),
+        seed=seed,
+        raw_format=raw_format,
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("out_dir", type=Path)
+    parser.add_argument("--nodes", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--depots-per-city", type=int, default=5)
+    parser.add_argument("--raw-format", choices=["xlsx", "csv"], default="xlsx")
+    args = parser.parse_args()
+    instance = generate_instance(
+        args.out_dir, args.nodes, seed=args.seed,
+        depots_per_city=args.depots_per_city, raw_format=args.raw_format,
+    )
+    print(f"✔ Đã sinh {instance.nodes} node ({instance.customers} khách, {instance.depots} depot, "
+          f"{instance.vehicles} xe, {instance.road_rows:,} dòng roads) -> {args.out_dir}")
@@ -1,18 +1,60 @@
+import argparse
+
 from src.preprocessing.load_customers import load_customers
 from src.preprocessing.load_depots import load_depots
 from src.preprocessing.load_vehicles import load_vehicles
 from src.preprocessing.build_road_graph import build_nodes, build_edges
+from src.preprocessing.raw_input import raw_source
+from src.preprocessing.sharding import build_node_shards
 from src.preprocessing.build_matrix import (
     build_graphs_by_region,
     build_matrices_by_region,
     export_ga_ready_data,
 )
+from src.utils.config import (
+    DATA_RAW,
+    CUSTOMERS_RAW,
+    DEPOTS_RAW,
+    VEHICLES_RAW,
+    CUSTOMERS_CLEAN,
+    DEPOTS_CLEAN,
+    VEHICLES_CLEAN,
+    NODES_MASTER,
+    EDGES_MASTER,
+    EDGES_CROSS_REGION,
+    NODE_SHARDS,
+    REGION_MAP,
+    REGION_ASSIGNMENT,
+    SPATIAL_K_DEPOTS,
+    SHARD_MAX_CUSTOMERS,
+    SHARD_MIN_DEPOTS,
+    MAX_CUSTOMERS_PER_REGION,
+    RANDOM_SEED,
+    MATRIX_MODE,
+    MATRIX_PRIMARY_WEIGHT,
+    MATRIX_DTYPE,
+    EXPORT_MATRIX_CSV,
+    MATRIX_STORAGE,
+    MATRIX_KNN_K,
+    MATRIX_KNN_RADIUS,
+    MATRIX_ENGINE,
+    EDGES_REGION,
+    EXPORT_EDGES_CSV,
+    DISTANCE_MATRIX,
+    TIME_MATRIX,
+    MATRIX_NODES,
+    KNN_MATRIX,
+    NODES_FINAL,
+    EDGES_FINAL,
+    VEHICLES_REGION,
+)
+from src.utils.pipeline import Pipeline, Stage, per_region
 
 
 def run_stage1():
     print("=== GIAI ĐOẠN 1: Clean raw data + gán Region_ID ===")
+    load_depots()       # trước customers: region của customer theo depot gần nhất
     load_customers()
-    load_depots()
     load_vehicles()
     print("=== HOÀN TẤT GIAI ĐOẠN 1 ===\n")
 
@@ -26,6 +68,7 @@ def run_stage2():
 def run_stage3():
     print("=== GIAI ĐOẠN 3: Build edges_master từ tất cả roads_* ===")
     build_edges()
+    build_node_shards()
     print("=== HOÀN TẤT GIAI ĐOẠN 3 ===\n")
 
 
@@ -35,9 +78,12 @@ def run_stage4():
     print("=== HOÀN TẤT GIAI ĐOẠN 4 ===\n")
 
 
-def run_stage5():
+def run_stage5(workers: int = None, write_csv: bool = None, full: bool = False):
+    """full=True (--force) -> bỏ qua vá incremental, build lại toàn bộ ma trận."""
     print("=== GIAI ĐOẠN 5: Dijkstra + Matrix theo từng region (tối ưu) ===")
-    build_matrices_by_region()
+    build_matrices_by_region(
+        workers=workers, write_csv=write_csv, incremental=False if full else None,
+    )
     print("=== HOÀN TẤT GIAI ĐOẠN 5 ===\n")
 
 
@@ -47,5 +93,119 @@ def run_stage6():
     print("=== HOÀN TẤT GIAI ĐOẠN 6 ===\n")
 
 
+# ============================================================
+#  KHAI BÁO INPUT / OUTPUT CHO PIPELINE RUNNER
+# ============================================================
+
+def _road_files():
+    return sorted(DATA_RAW.glob("roads_*/*.csv"))
+
+
+def _matrix_outputs():
+    if MATRIX_STORAGE == "knn":
+        return per_region(KNN_MATRIX) + per_region(MATRIX_NODES)
+    return per_region(DISTANCE_MATRIX) + per_region(TIME_MATRIX) + per_region(MATRIX_NODES)
+
+
+def build_pipeline(workers: int = None, write_csv: bool = None, force: bool = False) -> Pipeline:
+    return Pipeline([
+        Stage(
+            1, "clean raw data", run_stage1,
+            inputs=lambda: [raw_source(p) for p in (CUSTOMERS_RAW, DEPOTS_RAW, VEHICLES_RAW)],
+            outputs=lambda: [CUSTOMERS_CLEAN, DEPOTS_CLEAN, VEHICLES_CLEAN],
+            params=lambda: {
+                "region_map": REGION_MAP,
+                "region_assignment": REGION_ASSIGNMENT,
+                "spatial_k": SPATIAL_K_DEPOTS,
+                "max_customers": MAX_CUSTOMERS_PER_REGION,
+                "seed": RANDOM_SEED,
+            },
+        ),
+        Stage(
+            2, "nodes_master", run_stage2,
+            inputs=lambda: [CUSTOMERS_CLEAN, DEPOTS_CLEAN],
+            outputs=lambda: [NODES_MASTER],
+        ),
+        Stage(
+            3, "edges_master", run_stage3,
+            inputs=lambda: [NODES_MASTER, CUSTOMERS_CLEAN] + _road_files(),
+            outputs=lambda: [EDGES_MASTER, NODE_SHARDS],
+            params=lambda: {
+                "csv": EXPORT_EDGES_CSV,
+                "shard_max_customers": SHARD_MAX_CUSTOMERS,
+                "shard_min_depots": SHARD_MIN_DEPOTS,
+            },
+        ),
+        Stage(
+            4, "edges theo region", run_stage4,
+            inputs=lambda: [NODES_MASTER, NODE_SHARDS, EDGES_MASTER],
+            outputs=lambda: per_region(EDGES_REGION) + [EDGES_CROSS_REGION],
+            params=lambda: {"csv": EXPORT_EDGES_CSV},
+        ),
+        Stage(
+            5, "ma trận distance/time", lambda: run_stage5(workers, write_csv, full=force),
+            inputs=lambda: [NODES_MASTER, NODE_SHARDS] + per_region(EDGES_REGION),
+            outputs=_matrix_outputs,
+            params=lambda: {
+                "mode": MATRIX_MODE,
+                "primary": MATRIX_PRIMARY_WEIGHT,
+                "dtype": MATRIX_DTYPE,
+                "csv": EXPORT_MATRIX_CSV if write_csv is None else write_csv,
+                "storage": MATRIX_STORAGE,
+                "engine": MATRIX_ENGINE,
+                "knn": [MATRIX_KNN_K, MATRIX_KNN_RADIUS] if MATRIX_STORAGE == "knn" else None,
+            },
+        ),
+        Stage(
+            6, "GA-ready data", run_stage6,
+            inputs=lambda: (
+                [NODES_MASTER, NODE_SHARDS, VEHICLES_CLEAN]
+                + per_region(EDGES_REGION)
+                + per_region(MATRIX_NODES)
+            ),
+            outputs=lambda: (
+                per_region(NODES_FINAL)
+                + per_region(EDGES_FINAL)
+                + per_region(VEHICLES_REGION)
+            ),
+        ),
+    ])
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="LMD preprocessing pipeline – bỏ qua stage có input không đổi"
+    )
+    parser.add_argument("--from", dest="first", type=int, default=1,
+                        help="stage bắt đầu (mặc định: 1)")
+    parser.add_argument("--to", dest="last", type=int, default=6,
+                        help="stage kết thúc (mặc định: 6)")
+    parser.add_argument("--stage", type=int, default=None,
+                        help="chỉ chạy 1 stage (= --from N --to N)")
+    parser.add_argument("--force", action="store_true",
+                        help="chạy lại các stage đã chọn dù input không đổi (Stage 5: build lại toàn bộ, không vá incremental)")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="chỉ in stage nào sẽ chạy lại, không chạy")
+    parser.add_argument("--profile", action="store_true",
+                        help="cProfile từng stage (process chính) -> PERF_PROFILE_DIR/stage{N}_*.prof")
+    parser.add_argument(
+        "--workers", type=int, default=None,
+        help="số process cho Stage 5 (mặc định: MATRIX_WORKERS trong config, None = số core)",
+    )
+    parser.add_argument(
+        "--matrix-csv", action="store_true", default=None,
+        help="Stage 5 ghi thêm distance/time_matrix_{region}.csv (mặc định: EXPORT_MATRIX_CSV)",
+    )
+    args = parser.parse_args(argv)
+    if args.stage is not None:
+        args.first = args.last = args.stage
+    return args
+
+
 if __name__ == "__main__":
-    run_stage6()
+    args = parse_args()
+    pipeline = build_pipeline(workers=args.workers, write_csv=args.matrix_csv, force=args.force)
+    pipeline.run(
+        first=args.first, last=args.last, force=args.force,
+        dry_run=args.dry_run, profile=args.profile,
+    )
@@ -0,0 +1,309 @@
+# src/ga/ga_baseline.py
+"""
+GA baseline cho VRP của 1 region (dữ liệu Giai đoạn 6).
+
+Mã hoá: hoán vị có dấu ngăn. Mỗi chromosome là 1 hàng int gồm các số 0..L-1 với
+L = n_customers + n_vehicles - 1:
+    - gen < n_customers: khách (chỉ số trong RegionProblem)
+    - gen = n_customers + k: dấu ngăn, bắt đầu tuyến của xe k + 1
+Đoạn trước dấu ngăn đầu tiên là tuyến của xe 0. Cả quần thể là mảng 2-D (P x L),
+được chấm điểm 1 lượt bằng gather trên ma trận + np.add.reduceat theo tuyến.
+"""
+
+import argparse
+import time
+from collections import namedtuple
+
+import numpy as np
+
+from src.ga.problem import RegionProblem, load_region_problem
+from src.utils.config import (
+    GA_CROSSOVER_RATE,
+    GA_ELITE_SIZE,
+    GA_GENERATIONS,
+    GA_MUTATION_RATE,
+    GA_PENALTY,
+    GA_POPULATION_SIZE,
+    GA_TOURNAMENT_SIZE,
+    RANDOM_SEED,
+)
+
+# Điểm của cả quần thể (mỗi trường là mảng (P,))
+PopulationScore = namedtuple(
+    "PopulationScore", ["fitness", "cost", "distance", "violation", "routes_used"]
+)
+
+
+# ============================================================
+#  CHẤM ĐIỂM CẢ QUẦN THỂ (VECTOR HOÁ)
+# ============================================================
+
+def chromosome_length(problem: RegionProblem) -> int:
+    return problem.n_customers + problem.n_vehicles - 1
+
+
+def _gene_tables(problem: RegionProblem) -> dict:
+    """
+    Bảng tra theo giá trị gen (độ dài L+1, phần tử L = gen "kết thúc" ảo):
+        - leave_node: node rời đi (khách -> node khách, dấu ngăn xe k -> depot đầu của xe k)
+        - vehicle: xe của dấu ngăn (0 với khách)
+        - attrs (4 x (L+1)): service_time, demand_weight, demand_volume, 1 (đếm điểm dừng);
+          bằng 0 với dấu ngăn / gen kết thúc
+    """
+    n, n_veh = problem.n_customers, problem.n_vehicles
+    length = n + n_veh - 1
+    vehicle = np.zeros(length + 1, dtype=np.int64)
+    vehicle[n:length] = np.arange(1, n_veh)
+
+    leave_node = np.empty(length + 1, dtype=np.int64)
+    leave_node[:n] = problem.customer_nodes
+    leave_node[n:] = problem.start_nodes[vehicle[n:]]
+
+    attrs = np.zeros((4, length + 1))
+    attrs[0, :n] = problem.service_time
+    attrs[1, :n] = problem.demand_weight
+    attrs[2, :n] = problem.demand_volume
+    attrs[3, :n] = 1.0
+    return {"leave_node": leave_node, "vehicle": vehicle, "attrs": attrs}
+
+
+def _route_legs(problem: RegionProblem, population: np.ndarray, tables: dict) -> dict:
+    """
+    Trải mọi chặng đường của cả quần thể thành mảng (P x (L+1)).
+
+    Chặng k đi từ vị trí k-1 tới vị trí k (chặng 0 rời depot của xe 0,
+    chặng L về depot của xe cuối). Tại dấu ngăn giữa xe a và b:
+    chặng tới dấu ngăn = xe a về depot cuối của a, chặng rời dấu ngăn = xe b
+    rời depot đầu của b.
+
+    Mỗi hàng có đúng n_vehicles - 1 dấu ngăn nên mọi thứ theo tuyến có dạng (P x n_vehicles).
+    """
+    pop = np.asarray(population)
+    n_pop, length = pop.shape
+    n, n_veh = problem.n_customers, problem.n_vehicles
+    n_nodes = problem.distance.shape[0]
+
+    is_sep = pop >= n
+    route_vehicle = np.zeros((n_pop, n_veh), dtype=np.int64)
+    route_vehicle[:, 1:] = tables["vehicle"][pop[is_sep]].reshape(n_pop, n_veh - 1)
+
+    leave = tables["leave_node"][pop]
+    arrive = leave.copy()
+    arrive[is_sep] = problem.end_nodes[route_vehicle[:, :-1]].ravel()
+
+    # chỉ số phẳng vào ma trận N x N (take trên mảng 1-D nhanh hơn gather 2-D)
+    flat = np.empty((n_pop, length + 1), dtype=np.int64)
+    flat[:, 0] = problem.start_nodes[0] * n_nodes
+    flat[:, 1:] = leave * n_nodes
+    flat[:, :-1] += arrive
+    flat[:, -1] += problem.end_nodes[route_vehicle[:, -1]]
+
+    gene = np.empty((n_pop, length + 1), dtype=np.int64)
+    gene[:, :-1] = pop
+    gene[:, -1] = length
+
+    # chặng mở đầu 1 tuyến: chặng 0 và chặng ngay sau mỗi dấu ngăn
+    route_start = np.empty((n_pop, length + 1), dtype=bool)
+    route_start[:, 0] = True
+    route_start[:, 1:] = is_sep
+    return {
+        "flat": flat.ravel(),
+        "gene": gene.ravel(),
+        "starts": np.flatnonzero(route_start),
+        "route_vehicle": route_vehicle,
+    }
+
+
+def evaluate_population(
+    problem: RegionProblem, population: np.ndarray, penalty: float = GA_PENALTY
+) -> PopulationScore:
+    """
+    Chấm điểm cả quần thể 1 lượt, không vòng lặp Python theo cá thể.
+
+    cost = Σ tuyến (fixed_cost nếu xe có khách + variable_cost * km)
+    violation = Σ tuyến phần vượt: capacity_weight, capacity_volume,
+                max_distance_km, max_working_hours (chạy + phục vụ, phút)
+    fitness = cost + penalty * violation (càng nhỏ càng tốt)
+    """
+    tables = _gene_tables(problem)
+    legs = _route_legs(problem, population, tables)
+    veh = legs["route_vehicle"]
+    n_pop, n_veh = veh.shape
+
+    # mỗi chặng: km, phút (chạy + phục vụ), kg, m3, số điểm dừng -> cộng theo tuyến
+    flat, gene = legs["flat"], legs["gene"]
+    attrs = tables["attrs"]
+    values = np.empty((5, flat.size))
+    values[0] = problem.distance.ravel().take(flat)
+    values[1] = problem.time.ravel().take(flat)
+    values[1] += attrs[0].take(gene)
+    for row in range(1, 4):
+        values[row + 1] = attrs[row].take(gene)
+
+    route = np.add.reduceat(values, legs["starts"], axis=1).reshape(5, n_pop, n_veh)
+    dist, minutes, weight, volume = route[0], route[1], route[2], route[3]
+    used = route[4] > 0
+
+    cost = (
+        np.where(used, problem.fixed_cost[veh], 0.0)
+        + problem.variable_cost[veh] * dist
+    ).sum(axis=1)
+    violation = (
+        np.maximum(weight - problem.capacity_weight[veh], 0.0)
+        + np.maximum(volume - problem.capacity_volume[veh], 0.0)
+        + np.maximum(dist - problem.max_distance[veh], 0.0)
+        + np.maximum(minutes - problem.max_minutes[veh], 0.0)
+    ).sum(axis=1)
+
+    return PopulationScore(
+        fitness=cost + penalty * violation,
+        cost=cost,
+        distance=dist.sum(axis=1),
+        violation=violation,
+        routes_used=used.sum(axis=1),
+    )
+
+
+def decode_chromosome(problem: RegionProblem, chromosome: np.ndarray) -> list:
+    """Chromosome -> list tuyến (chỉ xe có khách): vehicle_id, customer_ids, km, kg."""
+    n = problem.n_customers
+    routes, current, vehicle = [], [], 0
+
+    def close(veh, stops):
+        if not stops:
+            return
+        nodes = [problem.start_nodes[veh]] + [problem.customer_nodes[c] for c in stops]
+        nodes.append(problem.end_nodes[veh])
+        routes.append({
+            "vehicle_id": problem.vehicle_ids[veh],
+            "customer_ids": [problem.customer_ids[c] for c in stops],
+            "distance_km": float(problem.distance[nodes[:-1], nodes[1:]].sum()),
+            "load_weight": float(problem.demand_weight[stops].sum()),
+        })
+
+    for gene in np.asarray(chromosome).tolist():
+        if gene >= n:
+            close(vehicle, current)
+            current, vehicle = [], gene - n + 1
+        else:
+            current.append(gene)
+    close(vehicle, current)
+    return routes
+
+
+# ============================================================
+#  TOÁN TỬ DI TRUYỀN
+# ============================================================
+
+def random_population(problem: RegionProblem, size: int, rng: np.random.Generator) -> np.ndarray:
+    length = chromosome_length(problem)
+    return rng.permuted(np.tile(np.arange(length, dtype=np.int32), (size, 1)), axis=1)
+
+
+def tournament_select(fitness: np.ndarray, count: int, k: int, rng: np.random.Generator) -> np.ndarray:
+    """Chỉ số `count` cá thể thắng tournament (k cá thể ngẫu nhiên / lượt)."""
+    entrants = rng.integers(len(fitness), size=(count, k))
+    return entrants[np.arange(count), np.argmin(fitness[entrants], axis=1)]
+
+
+def order_crossover(p1: np.ndarray, p2: np.ndarray, rng: np.random.Generator) -> np.ndarray:
+    """OX: giữ đoạn [a, b) của p1, phần còn lại lấy theo thứ tự xuất hiện trong p2."""
+    length = len(p1)
+    a, b = np.sort(rng.choice(length + 1, size=2, replace=False))
+    taken = np.zeros(length, dtype=bool)
+    taken[p1[a:b]] = True
+    rest = p2[~taken[p2]]
+
+    child = np.empty_like(p1)
+    child[:a] = rest[:a]
+    child[a:b] = p1[a:b]
+    child[b:] = rest[a:]
+    return child
+
+
+def mutate(population: np.ndarray, rate: float, rng: np.random.Generator) -> np.ndarray:
+    """Đảo ngược 1 đoạn ngẫu nhiên (inversion) trên các cá thể được chọn."""
+    length = population.shape[1]
+    for row in np.flatnonzero(rng.random(len(population)) < rate):
+        a, b = np.sort(rng.choice(length + 1, size=2, replace=False))
+        population[row, a:b] = population[row, a:b][::-1]
+    return population
+
+
+# ============================================================
+#  VÒNG LẶP GA
+# ============================================================
+
+def run_ga_baseline(
+    region: str,
+    generations: int = GA_GENERATIONS,
+    population_size: int = GA_POPULATION_SIZE,
+    seed: int = RANDOM_SEED,
+    problem: RegionProblem = None,
+    log_every: int = 50,
+) -> dict:
+    """Chạy GA baseline cho 1 region, trả về best chromosome + tuyến + lịch sử fitness."""
+    problem = problem or load_region_problem(region)
+    rng = np.random.default_rng(seed)
+    elite = min(GA_ELITE_SIZE, population_size)
+
+    print(f"=== GA BASELINE – REGION {region} ===")
+    print(f"  - {problem.n_customers} khách, {problem.n_vehicles} xe, quần thể {population_size}")
+
+    population = random_population(problem, population_size, rng)
+    best, history = None, []
+    eval_seconds, evaluated = 0.0, 0
+
+    for gen in range(generations + 1):
+        t0 = time.perf_counter()
+        score = evaluate_population(problem, population)
+        eval_seconds += time.perf_counter() - t0
+        evaluated += len(population)
+
+        order = np.argsort(score.fitness, kind="stable")
+        i = order[0]
+        if best is None or score.fitness[i] < best["fitness"]:
+            best = {
+                "chromosome": population[i].copy(),
+                "fitness": float(score.fitness[i]),
+                "cost": float(score.cost[i]),
+                "distance": float(score.distance[i]),
+                "violation": float(score.violation[i]),
+            }
+        history.append(best["fitness"])
+
+        if gen % log_every == 0 or gen == generations:
+            print(
+                f"  · gen {gen:4d}: fitness {best['fitness']:.1f} "
+                f"(cost {best['cost']:.1f}, vượt {best['violation']:.1f}) "
+                f"| {evaluated / max(eval_seconds, 1e-9):.0f} cá thể/s"
+            )
+        if gen == generations:
+            break
+
+        # chọn lọc + lai + đột biến
+        parents = population[tournament_select(
+            score.fitness, population_size - elite, GA_TOURNAMENT_SIZE, rng
+        )]
+        children = parents.copy()
+        for j in range(0, len(parents) - 1, 2):
+            if rng.random() < GA_CROSSOVER_RATE:
+                children[j] = order_crossover(parents[j], parents[j + 1], rng)
+                children[j + 1] = order_crossover(parents[j + 1], parents[j], rng)
+        mutate(children, GA_MUTATION_RATE, rng)
+        population = np.vstack([population[order[:elite]], children])
+
+    best["routes"] = decode_chromosome(problem, best["chromosome"])
+    best["history"] = history
+    print(f"✔ GA baseline {region}: {len(best['routes'])} tuyến, {best['distance']:.1f} km")
+    return best
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="GA baseline cho 1 region")
+    parser.add_argument("region", help="vd. HCM, HAN, DAN, CTO")
+    parser.add_argument("--generations", type=int, default=GA_GENERATIONS)
+    parser.add_argument("--population", type=int, default=GA_POPULATION_SIZE)
+    parser.add_argument("--seed", type=int, default=RANDOM_SEED)
+    args = parser.parse_args()
+    run_ga_baseline(args.region, args.generations, args.population, args.seed)
@@ -0,0 +1,519 @@
+# src/ga/ga_improved.py
+"""
+GA cải tiến cho VRP: mô hình đảo (island model) chạy song song.
+
+- Mã hoá: giant tour (hoán vị khách), giải mã bằng SplitDecoder (src/ga/split.py).
+- Mỗi region có K đảo (quần thể con) tiến hoá độc lập trên process pool; ma trận
+  distance / time của region được đặt 1 lần vào shared memory, worker gắn vào lúc
+  khởi tạo (không pickle ma trận theo từng task).
+- Cứ GA_MIGRATION_INTERVAL thế hệ: các đảo gửi cá thể tốt nhất sang đảo khác
+  (vòng "ring" hoặc "random"), cá thể tệ nhất của đảo nhận bị thay thế.
+- Memetic: mỗi thế hệ GA_LS_RATE số con được local search (src/ga/local_search.py);
+  cá thể giữ luôn lời giải sau local search (ranh giới tuyến + xe) thay vì Split lại.
+- Dừng theo region khi hết số thế hệ hoặc best không cải thiện sau
+  GA_STAGNATION_GENERATIONS thế hệ; dừng toàn bộ khi hết GA_TIME_BUDGET giây.
+- Nhiều region (HCM, HAN, DAN, CTO) chạy cùng lúc trên cùng 1 pool.
+- Region đã chia shard (src/preprocessing/sharding.py): mỗi shard là 1 bài toán
+  riêng, giải song song như các region rồi ghép lại (run_ga_improved_sharded).
+
+Seed cố định: mỗi đảo có RNG riêng sinh từ (seed, region, số thứ tự đảo) và đi kèm
+trạng thái đảo giữa các lần di cư, nên kết quả không phụ thuộc số worker.
+Khi không đặt time_budget, local search chỉ giới hạn bằng GA_LS_MAX_EVALUATIONS
+(bỏ giới hạn giây GA_LS_TIME_LIMIT) để kết quả tái lập được trên mọi máy.
+"""
+
+import argparse
+import dataclasses
+import multiprocessing as mp
+import os
+import time
+import zlib
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from src.ga.ga_baseline import mutate, order_crossover, tournament_select
+from src.ga.local_search import LocalSearch
+from src.ga.problem import RegionProblem, load_region_problem
+from src.ga.split import Decoded, SplitDecoder
+from src.preprocessing.sharding import region_shards
+from src.utils.config import (
+    GA_CROSSOVER_RATE,
+    GA_ELITE_SIZE,
+    GA_GENERATIONS,
+    GA_ISLAND_POPULATION,
+    GA_ISLANDS,
+    GA_LS_RATE,
+    GA_LS_TIME_LIMIT,
+    GA_MIGRANTS,
+    GA_MIGRATION_INTERVAL,
+    GA_MIGRATION_TOPOLOGY,
+    GA_MUTATION_RATE,
+    GA_STAGNATION_GENERATIONS,
+    GA_TIME_BUDGET,
+    GA_TOURNAMENT_SIZE,
+    GA_WORKERS,
+    RANDOM_SEED,
+)
+
+# Mảng lớn của RegionProblem đặt trong shared memory
+_SHARED_FIELDS = ("distance", "time")
+
+
+# ============================================================
+#  MA TRẬN DÙNG CHUNG (SHARED MEMORY)
+# ============================================================
+
+def share_problem(problem: RegionProblem):
+    """
+    Chép distance / time của problem vào shared memory.
+    Trả về (spec, blocks):
+        - spec: RegionProblem không kèm ma trận + (tên block, shape, dtype), gửi cho worker
+        - blocks: SharedMemory phía process cha, gọi release_blocks() khi xong
+    """
+    arrays, blocks = {}, []
+    for field in _SHARED_FIELDS:
+        values = np.ascontiguousarray(getattr(problem, field))
+        block = shared_memory.SharedMemory(create=True, size=max(values.nbytes, 1))
+        np.ndarray(values.shape, dtype=values.dtype, buffer=block.buf)[...] = values
+        arrays[field] = (block.name, values.shape, values.dtype.str)
+        blocks.append(block)
+    light = dataclasses.replace(problem, **{field: None for field in _SHARED_FIELDS})
+    return {"problem": light, "arrays": arrays}, blocks
+
+
+def attach_problem(spec: dict):
+    """spec (từ share_problem) -> (RegionProblem có ma trận trỏ vào shared memory, blocks)."""
+    views, blocks = {}, []
+    for field, (name, shape, dtype) in spec["arrays"].items():
+        block = shared_memory.SharedMemory(name=name)
+        views[field] = np.ndarray(shape, dtype=dtype, buffer=block.buf)
+        blocks.append(block)
+    return dataclasses.replace(spec["problem"], **views), blocks
+
+
+def release_blocks(blocks: list):
+    for block in blocks:
+        block.close()
+        block.unlink()
+
+
+# ============================================================
+#  WORKER
+# ============================================================
+
+# Decoder + local search của các region trong process hiện tại (set 1 lần bởi initializer)
+_WORKER_STATE = {}
+
+
+def _resolve_workers(workers: int = None) -> int:
+    """workers -> GA_WORKERS -> os.cpu_count() (tối thiểu 1)."""
+    if workers is None:
+        workers = GA_WORKERS
+    if workers is None:
+        workers = os.cpu_count() or 1
+    return max(1, int(workers))
+
+
+def _set_region(region: str, problem: RegionProblem, ls_time_limit):
+    decoder = SplitDecoder(problem)
+    _WORKER_STATE[region] = (decoder, LocalSearch(decoder, time_limit=ls_time_limit))
+
+
+def _init_island_worker(specs: dict, ls_time_limit):
+    blocks = []
+    for region, spec in specs.items():
+        problem, attached = attach_problem(spec)
+        _set_region(region, problem, ls_time_limit)
+        blocks.extend(attached)
+    # giữ tham chiếu: block bị đóng thì view ma trận không còn hợp lệ
+    _WORKER_STATE["_blocks"] = blocks
+
+
+def _evaluate_tours(decoder: SplitDecoder, tours: np.ndarray) -> np.ndarray:
+    return np.array([decoder.decode(tour).fitness for tour in tours])
+
+
+def _next_generation(searcher, population, fitness, plans, rng: np.random.Generator):
+    """
+    1 thế hệ của 1 đảo: elite + tournament + OX + inversion, rồi local search
+    GA_LS_RATE số con đã đổi. Chỉ decode con đã đổi; con giống hệt cha giữ fitness
+    (và lời giải) của cha.
+    plans[i]: (bounds, vehicles) nếu cá thể i là lời giải sau local search, None nếu
+    fitness là của Split.
+    """
+    decoder, local_search = searcher
+    size = len(population)
+    elite = min(GA_ELITE_SIZE, size)
+    order = np.argsort(fitness, kind="stable")
+
+    picked = tournament_select(fitness, size - elite, GA_TOURNAMENT_SIZE, rng)
+    parents = population[picked]
+    children = parents.copy()
+    for j in range(0, len(parents) - 1, 2):
+        if rng.random() < GA_CROSSOVER_RATE:
+            children[j] = order_crossover(parents[j], parents[j + 1], rng)
+            children[j + 1] = order_crossover(parents[j + 1], parents[j], rng)
+    mutate(children, GA_MUTATION_RATE, rng)
+
+    child_fitness = fitness[picked].copy()
+    child_plans = [plans[i] for i in picked.tolist()]
+    changed = np.flatnonzero((children != parents).any(axis=1))
+    educate = set(changed[rng.random(len(changed)) < GA_LS_RATE].tolist())
+    for c in changed.tolist():
+        decoded = decoder.decode(children[c])
+        child_plans[c] = None
+        if c in educate:
+            improved = local_search.run(decoded, rng)
+            if improved is not decoded:
+                children[c] = improved.tour
+                child_plans[c] = (improved.bounds, improved.vehicles)
+            decoded = improved
+        child_fitness[c] = decoded.fitness
+
+    population = np.vstack([population[order[:elite]], children])
+    fitness = np.concatenate([fitness[order[:elite]], child_fitness])
+    plans = [plans[i] for i in order[:elite].tolist()] + child_plans
+    return population, fitness, plans, len(changed)
+
+
+def _evolve_island(task):
+    """
+    Worker: cho 1 đảo tiến hoá `generations` thế hệ (dừng sớm nếu quá deadline).
+    Đảo (quần thể, fitness, RNG) đi kèm task nên kết quả không phụ thuộc worker nào chạy.
+    """
+    region, index, island, generations, deadline = task
+    searcher = _WORKER_STATE[region]
+    cache = searcher[1].cache
+    hits, misses = (cache.hits, cache.misses) if cache else (0, 0)
+    t0 = time.perf_counter()
+    evaluated = 0
+
+    if island["fitness"] is None:
+        island["fitness"] = _evaluate_tours(searcher[0], island["population"])
+        island["plans"] = [None] * len(island["population"])
+        evaluated += len(island["population"])
+
+    for _ in range(generations):
+        if deadline is not None and time.time() >= deadline:
+            break
+        island["population"], island["fitness"], island["plans"], n_eval = _next_generation(
+            searcher, island["population"], island["fitness"], island["plans"], island["rng"]
+        )
+        island["generation"] += 1
+        evaluated += n_eval
+    if cache:
+        hits, misses = cache.hits - hits, cache.misses - misses
+    return region, index, island, evaluated, (hits, misses), time.perf_counter() - t0
+
+
+# ============================================================
+#  ĐẢO + DI CƯ
+# ============================================================
+
+def _region_seeds(seed: int, region: str, islands: int) -> list:
+    """K + 1 seed độc lập cho region: K đảo + 1 cho di cư ngẫu nhiên."""
+    return np.random.SeedSequence([seed, zlib.crc32(region.encode())]).spawn(islands + 1)
+
+
+def _new_island(n_customers: int, size: int, seed: np.random.SeedSequence) -> dict:
+    rng = np.random.default_rng(seed)
+    population = rng.permuted(np.tile(np.arange(n_customers, dtype=np.int32), (size, 1)), axis=1)
+    return {"population": population, "fitness": None, "plans": None, "rng": rng, "generation": 0}
+
+
+def migrate(islands: list, migrants: int, topology: str, rng: np.random.Generator):
+    """
+    Mỗi đảo gửi `migrants` cá thể tốt nhất sang 1 đảo khác, thay cá thể tệ nhất ở đó.
+        - ring: đảo i -> i + 1
+        - random: đảo i -> 1 đảo khác chọn ngẫu nhiên (theo rng của region)
+    Cá thể gửi đi được lấy trước khi đảo nào bị thay -> không phụ thuộc thứ tự.
+    """
+    k = len(islands)
+    if k < 2 or migrants <= 0:
+        return
+    if topology == "ring":
+        targets = (np.arange(k) + 1) % k
+    elif topology == "random":
+        targets = (np.arange(k) + rng.integers(1, k, size=k)) % k
+    else:
+        raise ValueError(f"GA_MIGRATION_TOPOLOGY không hợp lệ: {topology!r}")
+
+    outgoing = []
+    for island in islands:
+        best = np.argsort(island["fitness"], kind="stable")[:migrants]
+        outgoing.append((
+            island["population"][best].copy(),
+            island["fitness"][best].copy(),
+            [island["plans"][i] for i in best.tolist()],
+        ))
+
+    for source, target in enumerate(targets):
+        tours, fitness, plans = outgoing[source]
+        island = islands[target]
+        worst = np.argsort(island["fitness"], kind="stable")[::-1][:len(tours)]
+        island["population"][worst] = tours
+        island["fitness"][worst] = fitness
+        for i, plan in zip(worst.tolist(), plans):
+            island["plans"][i] = plan
+
+
+# ============================================================
+#  VÒNG LẶP GA (NHIỀU REGION CÙNG LÚC)
+# ============================================================
+
+def _update_region(state: dict, stagnation: int, generations: int) -> str:
+    """Cập nhật best của region sau 1 epoch; trả về lý do dừng ('' nếu chạy tiếp)."""
+    islands = state["islands"]
+    generation = min(island["generation"] for island in islands)
+    best_island = min(islands, key=lambda island: island["fitness"].min())
+    i = int(np.argmin(best_island["fitness"]))
+    fitness = float(best_island["fitness"][i])
+
+    if state["best"] is None or fitness < state["best"]["fitness"]:
+        state["best"] = {
+            "tour": best_island["population"][i].copy(),
+            "fitness": fitness,
+            "plan": best_island["plans"][i],
+        }
+        state["improved_at"] = generation
+    state["history"].append((generation, state["best"]["fitness"]))
+
+    if generation >= generations:
+        return "đủ số thế hệ"
+    if generation - state["improved_at"] >= stagnation:
+        return f"{stagnation} thế hệ không cải thiện"
+    return ""
+
+
+def run_ga_improved_regions(
+    regions: list,
+    islands: int = GA_ISLANDS,
+    population_size: int = GA_ISLAND_POPULATION,
+    generations: int = GA_GENERATIONS,
+    workers: int = None,
+    time_budget: float = GA_TIME_BUDGET,
+    stagnation: int = GA_STAGNATION_GENERATIONS,
+    migration_interval: int = GA_MIGRATION_INTERVAL,
+    migrants: int = GA_MIGRANTS,
+    topology: str = GA_MIGRATION_TOPOLOGY,
+    seed: int = RANDOM_SEED,
+    problems: dict = None,
+) -> dict:
+    """
+    Chạy GA đảo cho nhiều region trên cùng 1 process pool.
+    Trả về dict region -> best (tour, fitness, cost, violation, routes, history, ...).
+
+    Mỗi epoch: mọi đảo của các region còn chạy tiến hoá migration_interval thế hệ
+    (song song), sau đó từng region cập nhật best, kiểm tra điều kiện dừng và di cư.
+    """
+    problems = dict(problems or {})
+    for region in regions:
+        if region not in problems:
+            problems[region] = load_region_problem(region)
+
+    states = {}
+    for region in regions:
+        seeds = _region_seeds(seed, region, islands)
+        states[region] = {
+            "islands": [_new_island(problems[region].n_customers, population_size, s) for s in seeds[:-1]],
+            "migration_rng": np.random.default_rng(seeds[-1]),
+            "best": None,
+            "improved_at": 0,
+            "history": [],
+            "stop": "",
+            "cache": [0, 0],
+        }
+
+    workers = min(_resolve_workers(workers), islands * len(regions))
+    deadline = time.time() + time_budget if time_budget else None
+    # không có time_budget: bỏ giới hạn giây của local search để tái lập được
+    ls_time_limit = GA_LS_TIME_LIMIT if deadline is not None else None
+    interval = max(1, int(migration_interval))
+
+    print("=== GA IMPROVED (ISLAND MODEL) ===")
+    for region in regions:
+        p = problems[region]
+        print(f"  - {region}: {p.n_customers} khách, {p.n_vehicles} xe")
+    print(
+        f"  - {islands} đảo x {population_size} cá thể / region, {workers} workers, "
+        f"di cư {migrants} cá thể / {interval} thế hệ ({topology})"
+    )
+
+    blocks, pool = [], None
+    if workers > 1:
+        specs = {}
+        for region in regions:
+            specs[region], region_blocks = share_problem(problems[region])
+            blocks.extend(region_blocks)
+        methods = mp.get_all_start_methods()
+        ctx = mp.get_context("fork" if "fork" in methods else None)
+        pool = ctx.Pool(
+            processes=workers, initializer=_init_island_worker, initargs=(specs, ls_time_limit)
+        )
+        run_tasks = pool.map
+    else:
+        for region in regions:
+            _set_region(region, problems[region], ls_time_limit)
+        run_tasks = lambda fn, tasks: list(map(fn, tasks))  # noqa: E731
+
+    t_start = time.perf_counter()
+    evaluated = 0
+    try:
+        while True:
+            active = [region for region in regions if not states[region]["stop"]]
+            if not active:
+                break
+            tasks = []
+            for region in active:
+                for index, island in enumerate(states[region]["islands"]):
+                    steps = min(interval, generations - island["generation"])
+                    tasks.append((region, index, island, steps, deadline))
+
+            for region, index, island, n_eval, (hits, misses), _ in run_tasks(_evolve_island, tasks):
+                states[region]["islands"][index] = island
+                states[region]["cache"][0] += hits
+                states[region]["cache"][1] += misses
+                evaluated += n_eval
+
+            out_of_time = deadline is not None and time.time() >= deadline
+            elapsed = time.perf_counter() - t_start
+            for region in active:
+                state = states[region]
+                state["stop"] = _update_region(state, stagnation, generations)
+                if not state["stop"] and out_of_time:
+                    state["stop"] = f"hết {time_budget:g}s"
+                generation, fitness = state["history"][-1]
+                print(
+                    f"  · {region} gen {generation:4d}: fitness {fitness:.1f} "
+                    f"| {evaluated / max(elapsed, 1e-9):.0f} cá thể/s"
+                )
+                if not state["stop"]:
+                    migrate(state["islands"], migrants, topology, state["migration_rng"])
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+        release_blocks(blocks)
+
+    results = {}
+    for region in regions:
+        state = states[region]
+        decoder = SplitDecoder(problems[region])
+        best = dict(state["best"])
+        plan = best.pop("plan")
+        if plan is None:
+            decoded = decoder.decode(best["tour"])
+        else:
+            tour = np.asarray(best["tour"], dtype=np.int64)
+            cost, violation, _ = decoder.evaluate(tour, *plan)
+            decoded = Decoded(tour, *plan, cost + decoder.penalty * violation, cost, violation)
+        routes = decoder.routes(decoded)
+        results[region] = {
+            **best,
+            "bounds": decoded.bounds,
+            "vehicles": decoded.vehicles,
+            "cost": decoded.cost,
+            "violation": decoded.violation,
+            "routes": routes,
+            "history": state["history"],
+            "generations": state["history"][-1][0],
+            "stop_reason": state["stop"],
+        }
+        hits, misses = state["cache"]
+        results[region]["route_cache"] = {
+            "hits": hits, "misses": misses, "hit_rate": hits / max(hits + misses, 1),
+        }
+        unassigned = sum(route["vehicle_id"] is None for route in routes)
+        print(
+            f"✔ GA improved {region}: {len(routes)} tuyến ({unassigned} thiếu xe), "
+            f"cost {decoded.cost:.1f}, vượt {decoded.violation:.1f} – dừng vì {state['stop']}"
+        )
+        if hits + misses:
+            print(
+                f"  · Route cache {region}: hit {hits / (hits + misses):.1%} "
+                f"({hits:,} / {hits + misses:,} lần tra)"
+            )
+    return results
+
+
+def run_ga_improved(region: str, **kwargs) -> dict:
+    """GA đảo cho 1 region (xem run_ga_improved_regions)."""
+    return run_ga_improved_regions([region], **kwargs)[region]
+
+
+# ============================================================
+#  SHARD -> REGION
+# ============================================================
+
+def merge_shard_results(results: dict, groups: dict) -> dict:
+    """
+    Ghép kết quả GA theo shard về region.
+
+    - groups: region -> list shard (sharding.region_shards)
+    - tuyến dùng id khách / xe gốc nên nối thẳng; cost / violation / fitness cộng lại
+      (shard rời nhau: khách, depot và xe không trùng)
+    - tour / bounds theo chỉ số riêng của từng shard -> giữ trong "shards"
+    """
+    merged = {}
+    for region, shards in groups.items():
+        parts = {shard: results[shard] for shard in shards if shard in results}
+        if list(parts) == [region]:
+            merged[region] = parts[region]
+            continue
+        routes = [route for part in parts.values() for route in part["routes"]]
+        merged[region] = {
+            "routes": routes,
+            "cost": sum(part["cost"] for part in parts.values()),
+            "violation": sum(part["violation"] for part in parts.values()),
+            "fitness": sum(part["fitness"] for part in parts.values()),
+            "generations": max((part["generations"] for part in parts.values()), default=0),
+            "stop_reason": "; ".join(f"{shard}: {part['stop_reason']}" for shard, part in parts.items()),
+            "shards": parts,
+        }
+        unassigned = sum(route["vehicle_id"] is None for route in routes)
+        print(
+            f"✔ GA improved {region} ({len(parts)} shard): {len(routes)} tuyến "
+            f"({unassigned} thiếu xe), cost {merged[region]['cost']:.1f}, "
+            f"vượt {merged[region]['violation']:.1f}"
+        )
+    return merged
+
+
+def run_ga_improved_sharded(regions: list, **kwargs) -> dict:
+    """
+    GA đảo cho các region, region đã chia shard thì giải từng shard (cùng 1 pool,
+    song song) rồi ghép lại. Trả về dict region -> kết quả như run_ga_improved_regions.
+    """
+    groups = region_shards(regions)
+    units = [shard for shards in groups.values() for shard in shards]
+    return merge_shard_results(run_ga_improved_regions(units, **kwargs), groups)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="GA đảo (island model) cho 1 hoặc nhiều region / shard")
+    parser.add_argument("regions", nargs="+", help="vd. HCM HAN DAN CTO")
+    parser.add_argument("--islands", type=int, default=GA_ISLANDS)
+    parser.add_argument("--population", type=int, default=GA_ISLAND_POPULATION, help="số cá thể / đảo")
+    parser.add_argument("--generations", type=int, default=GA_GENERATIONS)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--time-budget", type=float, default=GA_TIME_BUDGET, help="giây")
+    parser.add_argument("--stagnation", type=int, default=GA_STAGNATION_GENERATIONS)
+    parser.add_argument("--migration-interval", type=int, default=GA_MIGRATION_INTERVAL)
+    parser.add_argument("--migrants", type=int, default=GA_MIGRANTS)
+    parser.add_argument("--topology", choices=["ring", "random"], default=GA_MIGRATION_TOPOLOGY)
+    parser.add_argument("--seed", type=int, default=RANDOM_SEED)
+    args = parser.parse_args()
+    run_ga_improved_sharded(
+        args.regions,
+        islands=args.islands,
+        population_size=args.population,
+        generations=args.generations,
+        workers=args.workers,
+        time_budget=args.time_budget,
+        stagnation=args.stagnation,
+        migration_interval=args.migration_interval,
+        migrants=args.migrants,
+        topology=args.topology,
+        seed=args.seed,
+    )
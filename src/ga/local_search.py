@@ -0,0 +1,410 @@
+# src/ga/local_search.py
+"""
+Local search (bước "education" / memetic) cho GA trên lời giải đã decode.
+
+Lân cận: relocate, Or-opt (đoạn 2–3 khách), swap, 2-opt (trong tuyến),
+2-opt* (đổi đuôi 2 tuyến), SWAP* (đổi 2 khách giữa 2 tuyến, mỗi khách chèn vào
+vị trí tốt nhất của tuyến kia). Chỉ xét cặp (u, v) với v thuộc k khách gần u nhất
+theo distance_matrix (granular neighbour list).
+
+Đánh giá move giữa 2 tuyến trong O(1): mỗi tuyến giữ segment prefix (depot đầu +
+khách 1..i) và suffix (khách i..m): km, phút, tải, và dữ liệu time window kiểu
+Vidal (duration, time warp, earliest, latest) ghép được bằng 1 phép concat.
+Time warp chỉ dùng để lọc nhanh; move qua lọc được chấm lại chính xác (cùng công
+thức với SplitDecoder.evaluate, O(độ dài tuyến)) trước khi nhận. Kết quả chấm chính
+xác được giữ trong RouteCache (src/ga/route_cache.py): cùng 1 tuyến gặp lại (lượt
+quét sau, cá thể khác của quần thể đã hội tụ) không phải chấm lại.
+"""
+
+import time
+
+import numpy as np
+
+from src.ga.route_cache import RouteCache, route_key
+from src.ga.split import Decoded, SplitDecoder
+from src.utils.config import (
+    GA_LS_MAX_EVALUATIONS,
+    GA_LS_NEIGHBOURS,
+    GA_LS_TIME_LIMIT,
+    GA_ROUTE_CACHE_MB,
+)
+
+_EPS = 1e-6
+
+# Segment: (km, phút chạy + phục vụ, kg, m3, duration, time warp, earliest, latest,
+#           node đầu, node cuối, số khách)
+_DIST, _MIN, _W, _V, _DUR, _TW, _E, _L, _FIRST, _LAST, _COUNT = range(11)
+
+
+def neighbour_lists(decoder: SplitDecoder, k: int = GA_LS_NEIGHBOURS) -> list:
+    """k khách gần nhất (km, theo chiều u -> v) của mỗi khách, dạng list Python."""
+    p = decoder.problem
+    n = p.n_customers
+    k = min(k, n - 1)
+    if k <= 0:
+        return [[] for _ in range(n)]
+    dist = p.distance[np.ix_(p.customer_nodes, p.customer_nodes)].astype(np.float64)
+    np.fill_diagonal(dist, np.inf)
+    nearest = np.argpartition(dist, k - 1, axis=1)[:, :k]
+    order = np.argsort(np.take_along_axis(dist, nearest, axis=1), axis=1, kind="stable")
+    return np.take_along_axis(nearest, order, axis=1).tolist()
+
+
+class _Route:
+    __slots__ = ("vehicle", "customers", "fwd", "bwd", "screen", "exact")
+
+    def __init__(self, vehicle: int, customers: list):
+        self.vehicle = vehicle
+        self.customers = customers
+
+
+class LocalSearch:
+    """
+    Local search dùng lại cho mọi cá thể của 1 region (neighbour list tính 1 lần).
+
+        ls = LocalSearch(decoder)
+        better = ls.run(decoder.decode(tour), rng)   # -> Decoded, không tệ hơn đầu vào
+
+    time_limit (giây) là giới hạn cứng mỗi lần gọi; kết quả khi đó phụ thuộc tốc độ máy.
+    Cần tái lập được thì đặt time_limit=None và chỉ giới hạn bằng max_evaluations.
+
+    cache_mb: giới hạn RouteCache (mặc định GA_ROUTE_CACHE_MB; 0 / None = không cache).
+    """
+
+    def __init__(self, decoder: SplitDecoder, neighbours: int = GA_LS_NEIGHBOURS,
+                 time_limit: float = GA_LS_TIME_LIMIT, max_evaluations: int = GA_LS_MAX_EVALUATIONS,
+                 cache_mb: float = GA_ROUTE_CACHE_MB):
+        p = decoder.problem
+        self.decoder = decoder
+        self.cache = RouteCache(cache_mb) if cache_mb else None
+        self.problem = p
+        self.time_limit = time_limit
+        self.max_evaluations = max_evaluations
+        self.neighbours = neighbour_lists(decoder, neighbours)
+        self._n_nodes = p.distance.shape[0]
+        self._d = p.distance.ravel().item
+        self._t = p.time.ravel().item
+        self._node = p.customer_nodes.tolist()
+        self._service = p.service_time.tolist()
+        self._ready = p.ready_time.tolist()
+        self._due = p.due_time.tolist()
+        self._weight = p.demand_weight.tolist()
+        self._volume = p.demand_volume.tolist()
+        self._single = [
+            (0.0, s, w, v, s, 0.0, e, l, node, node, 1)
+            for s, w, v, e, l, node in zip(
+                self._service, self._weight, self._volume, self._ready, self._due, self._node
+            )
+        ]
+        vehicle = {
+            "start": p.start_nodes, "end": p.end_nodes, "open": p.depot_open, "close": p.depot_close,
+            "cap_w": p.capacity_weight, "cap_v": p.capacity_volume, "max_d": p.max_distance,
+            "max_m": p.max_minutes, "fixed": p.fixed_cost, "var": p.variable_cost,
+        }
+        self._veh = {key: values.tolist() for key, values in vehicle.items()}
+        self._penalty = decoder.penalty
+
+    # ---------- segment ----------
+
+    def _concat(self, a, b):
+        """Ghép segment a rồi b (chặng a.last -> b.first); None = đoạn rỗng."""
+        if a is None:
+            return b
+        if b is None:
+            return a
+        a_dist, a_min, a_w, a_v, a_dur, a_tw, a_e, a_l, a_first, a_last, a_count = a
+        b_dist, b_min, b_w, b_v, b_dur, b_tw, b_e, b_l, _, b_last, b_count = b
+        idx = a_last * self._n_nodes + b[_FIRST]
+        travel = self._t(idx)
+        delta = a_dur - a_tw + travel
+        wait = b_e - delta - a_l
+        wait = wait if wait > 0.0 else 0.0
+        warp = a_e + delta - b_l
+        warp = warp if warp > 0.0 else 0.0
+        earliest = b_e - delta
+        latest = b_l - delta
+        return (
+            a_dist + self._d(idx) + b_dist, a_min + travel + b_min, a_w + b_w, a_v + b_v,
+            a_dur + b_dur + travel + wait, a_tw + b_tw + warp,
+            (earliest if earliest > a_e else a_e) - wait, (latest if latest < a_l else a_l) + warp,
+            a_first, b_last, a_count + b_count,
+        )
+
+    def _depots(self, vehicle: int):
+        """Segment depot đầu (xuất phát đúng giờ mở cửa) và depot cuối (về trước giờ đóng)."""
+        v = self._veh
+        k = max(vehicle, 0)
+        start, end = v["start"][k], v["end"][k]
+        return (
+            (0.0, 0.0, 0.0, 0.0, 0.0, 0.0, v["open"][k], v["open"][k], start, start, 0),
+            (0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, v["close"][k], end, end, 0),
+        )
+
+    def _chain(self, customers, seg=None):
+        for c in customers:
+            seg = self._concat(seg, self._single[c])
+        return seg
+
+    def _screen(self, vehicle: int, seg) -> float:
+        """Chi phí ước lượng của tuyến hoàn chỉnh (time warp thay cho phút trễ)."""
+        if seg[_COUNT] == 0:
+            return 0.0
+        v = self._veh
+        k = max(vehicle, 0)
+        excess = (
+            max(seg[_W] - v["cap_w"][k], 0.0) + max(seg[_V] - v["cap_v"][k], 0.0)
+            + max(seg[_DIST] - v["max_d"][k], 0.0) + max(seg[_MIN] - v["max_m"][k], 0.0)
+            + seg[_TW] + (seg[_W] if vehicle < 0 else 0.0)
+        )
+        return v["fixed"][k] + v["var"][k] * seg[_DIST] + self._penalty * excess
+
+    def _exact(self, vehicle: int, customers: list) -> float:
+        """Chi phí chính xác (cost + penalty * violation) của 1 tuyến, qua cache nếu có."""
+        if not customers:
+            return 0.0
+        if self.cache is None:
+            record = self._score_route(vehicle, customers)
+        else:
+            key = route_key(vehicle, tuple([self._node[c] for c in customers]))
+            record = self.cache.get(key)
+            if record is None:
+                record = self._score_route(vehicle, customers)
+                self.cache.put(key, record)
+        return record[4] + self._penalty * record[5]
+
+    def _score_route(self, vehicle: int, customers: list) -> tuple:
+        """
+        Chấm 1 tuyến, cùng công thức với SplitDecoder.evaluate.
+        Trả về (km, phút, kg, m3, cost, violation) theo ROUTE_FIELDS.
+        """
+        v = self._veh
+        k = max(vehicle, 0)
+        n_nodes = self._n_nodes
+        node, clock = v["start"][k], v["open"][k]
+        dist = minutes = weight = volume = late = 0.0
+        for c in customers:
+            idx = node * n_nodes + self._node[c]
+            travel = self._t(idx)
+            dist += self._d(idx)
+            arrival = max(self._ready[c], clock + travel)
+            late += max(arrival - self._due[c], 0.0)
+            clock = arrival + self._service[c]
+            minutes += travel + self._service[c]
+            weight += self._weight[c]
+            volume += self._volume[c]
+            node = self._node[c]
+        idx = node * n_nodes + v["end"][k]
+        dist += self._d(idx)
+        minutes += self._t(idx)
+        late += max(clock + self._t(idx) - v["close"][k], 0.0)
+        violation = (
+            max(weight - v["cap_w"][k], 0.0) + max(volume - v["cap_v"][k], 0.0)
+            + max(dist - v["max_d"][k], 0.0) + max(minutes - v["max_m"][k], 0.0)
+            + late + (weight if vehicle < 0 else 0.0)
+        )
+        return dist, minutes, weight, volume, v["fixed"][k] + v["var"][k] * dist, violation
+
+    # ---------- trạng thái lời giải ----------
+
+    def _refresh(self, route: _Route):
+        """Tính lại prefix / suffix của tuyến sau khi đổi (O(độ dài tuyến))."""
+        start, end = self._depots(route.vehicle)
+        fwd = [start]
+        for c in route.customers:
+            fwd.append(self._concat(fwd[-1], self._single[c]))
+        bwd = [None] * (len(route.customers) + 2)
+        for i in range(len(route.customers), 0, -1):
+            bwd[i] = self._concat(self._single[route.customers[i - 1]], bwd[i + 1])
+        route.fwd, route.bwd = fwd, bwd
+        route.screen = self._screen(route.vehicle, self._concat(fwd[-1], end))
+        route.exact = self._exact(route.vehicle, route.customers)
+        for i, c in enumerate(route.customers, start=1):
+            self._where[c] = (route, i)
+
+    def _full(self, route: _Route, *pieces):
+        """Segment tuyến hoàn chỉnh (depot cuối của xe của route) từ các mảnh."""
+        seg = None
+        for piece in pieces:
+            seg = self._concat(seg, piece)
+        return self._concat(seg, self._depots(route.vehicle)[1])
+
+    def _try(self, changes: list, screen_new: float) -> bool:
+        """
+        changes: [(route, khách mới)]. Nhận move nếu chi phí ước lượng giảm và chi phí
+        chính xác cũng giảm; cập nhật tuyến khi nhận.
+        """
+        routes = [route for route, _ in changes]
+        if screen_new >= sum(route.screen for route in routes) - _EPS:
+            return False
+        exact_new = sum(self._exact(route.vehicle, customers) for route, customers in changes)
+        if exact_new >= sum(route.exact for route in routes) - _EPS:
+            return False
+        for route, customers in changes:
+            route.customers = customers
+            self._refresh(route)
+        self.moves += 1
+        return True
+
+    # ---------- các move (u, v: khách, v thuộc neighbour list của u) ----------
+
+    def _relocate(self, u, v) -> bool:
+        """Chuyển u (kèm 0–2 khách sau nó: Or-opt) tới ngay sau v."""
+        r1, i = self._where[u]
+        r2, j = self._where[v]
+        for length in (1, 2, 3):
+            if i + length - 1 > len(r1.customers):
+                break
+            moved = r1.customers[i - 1:i - 1 + length]
+            if v in moved:
+                break
+            if r1 is r2:
+                rest = [c for c in r1.customers if c not in moved]
+                at = rest.index(v) + 1
+                new = rest[:at] + moved + rest[at:]
+                if new == r1.customers:
+                    continue
+                if self._try([(r1, new)], self._screen(r1.vehicle, self._full(r1, self._chain(new, r1.fwd[0])))):
+                    return True
+                continue
+            seg = r1.bwd[i] if i + length - 1 == len(r1.customers) else self._chain(moved)
+            screen = (
+                self._screen(r1.vehicle, self._full(r1, r1.fwd[i - 1], r1.bwd[i + length]))
+                + self._screen(r2.vehicle, self._full(r2, r2.fwd[j], seg, r2.bwd[j + 1]))
+            )
+            new1 = r1.customers[:i - 1] + r1.customers[i - 1 + length:]
+            new2 = r2.customers[:j] + moved + r2.customers[j:]
+            if self._try([(r1, new1), (r2, new2)], screen):
+                return True
+        return False
+
+    def _swap(self, u, v) -> bool:
+        r1, i = self._where[u]
+        r2, j = self._where[v]
+        if r1 is r2:
+            new = list(r1.customers)
+            new[i - 1], new[j - 1] = v, u
+            return self._try([(r1, new)], self._screen(r1.vehicle, self._full(r1, self._chain(new, r1.fwd[0]))))
+        screen = (
+            self._screen(r1.vehicle, self._full(r1, r1.fwd[i - 1], self._single[v], r1.bwd[i + 1]))
+            + self._screen(r2.vehicle, self._full(r2, r2.fwd[j - 1], self._single[u], r2.bwd[j + 1]))
+        )
+        new1 = r1.customers[:i - 1] + [v] + r1.customers[i:]
+        new2 = r2.customers[:j - 1] + [u] + r2.customers[j:]
+        return self._try([(r1, new1), (r2, new2)], screen)
+
+    def _two_opt(self, u, v) -> bool:
+        """
+        Cùng tuyến: đảo đoạn sau u tới v (u -> v thành cạnh mới).
+        Khác tuyến (2-opt*): tuyến u giữ đầu tới u rồi nối đuôi sau v, và ngược lại.
+        """
+        r1, i = self._where[u]
+        r2, j = self._where[v]
+        if r1 is r2:
+            if j <= i + 1:
+                return False
+            new = r1.customers[:i] + r1.customers[i:j][::-1] + r1.customers[j:]
+            return self._try([(r1, new)], self._screen(r1.vehicle, self._full(r1, self._chain(new, r1.fwd[0]))))
+        screen = (
+            self._screen(r1.vehicle, self._full(r1, r1.fwd[i], r2.bwd[j]))
+            + self._screen(r2.vehicle, self._full(r2, r2.fwd[j - 1], r1.bwd[i + 1]))
+        )
+        new1 = r1.customers[:i] + r2.customers[j - 1:]
+        new2 = r2.customers[:j - 1] + r1.customers[i:]
+        return self._try([(r1, new1), (r2, new2)], screen)
+
+    def _best_insert(self, customers: list, c: int, start: int, end: int) -> list:
+        """Chèn c vào vị trí tăng km ít nhất của dãy khách (giữa depot start / end)."""
+        n_nodes = self._n_nodes
+        nodes = [start] + [self._node[x] for x in customers] + [end]
+        x = self._node[c]
+        best, at = float("inf"), 0
+        for pos in range(len(nodes) - 1):
+            a, b = nodes[pos], nodes[pos + 1]
+            delta = self._d(a * n_nodes + x) + self._d(x * n_nodes + b) - self._d(a * n_nodes + b)
+            if delta < best:
+                best, at = delta, pos
+        return customers[:at] + [c] + customers[at:]
+
+    def _swap_star(self, u, v) -> bool:
+        """SWAP*: bỏ u khỏi tuyến 1, v khỏi tuyến 2, chèn mỗi khách vào vị trí tốt nhất của tuyến kia."""
+        r1, i = self._where[u]
+        r2, j = self._where[v]
+        if r1 is r2:
+            return False
+        v1, v2 = max(r1.vehicle, 0), max(r2.vehicle, 0)
+        veh = self._veh
+        new1 = self._best_insert(r1.customers[:i - 1] + r1.customers[i:], v, veh["start"][v1], veh["end"][v1])
+        new2 = self._best_insert(r2.customers[:j - 1] + r2.customers[j:], u, veh["start"][v2], veh["end"][v2])
+        screen = (
+            self._screen(r1.vehicle, self._full(r1, self._chain(new1, r1.fwd[0])))
+            + self._screen(r2.vehicle, self._full(r2, self._chain(new2, r2.fwd[0])))
+        )
+        return self._try([(r1, new1), (r2, new2)], screen)
+
+    def _reassign_idle(self, routes: list):
+        """Xe rảnh (tuyến đã bị làm rỗng) nhận tuyến chưa có xe nếu chi phí giảm."""
+        used = {route.vehicle for route in routes if route.customers}
+        idle = [k for k in range(self.problem.n_vehicles) if k not in used]
+        pending = [route for route in routes if route.vehicle < 0 and route.customers]
+        for route in sorted(pending, key=lambda r: -r.fwd[-1][_W]):
+            if not idle:
+                break
+            scores = [self._exact(k, route.customers) for k in idle]
+            best = int(np.argmin(scores))
+            if scores[best] < route.exact - _EPS:
+                route.vehicle = idle.pop(best)
+                self._refresh(route)
+        for route in routes:
+            if not route.customers and route.vehicle >= 0:
+                route.vehicle = -1
+
+    # ---------- chạy ----------
+
+    def run(self, decoded: Decoded, rng: np.random.Generator) -> Decoded:
+        """
+        First-improvement trên mọi move tới khi không còn move tốt, hết time_limit giây
+        hoặc đã xét max_evaluations cặp (u, v) (None = không giới hạn).
+        Trả về Decoded mới (chấm lại bằng decoder.evaluate); không cải thiện thì trả lại decoded.
+        """
+        deadline = None if self.time_limit is None else time.perf_counter() + self.time_limit
+        budget = self.max_evaluations
+        self._where = [None] * self.problem.n_customers
+        self.moves = 0
+        self.evaluations = 0
+        routes = []
+        for r, vehicle in enumerate(decoded.vehicles.tolist()):
+            route = _Route(vehicle, decoded.tour[decoded.bounds[r]:decoded.bounds[r + 1]].tolist())
+            self._refresh(route)
+            routes.append(route)
+
+        def exhausted():
+            return (
+                (deadline is not None and time.perf_counter() >= deadline)
+                or (budget is not None and self.evaluations >= budget)
+            )
+
+        operators = (self._relocate, self._swap, self._two_opt, self._swap_star)
+        improved = True
+        while improved and not exhausted():
+            improved = False
+            for u in rng.permutation(self.problem.n_customers).tolist():
+                if exhausted():
+                    break
+                for v in self.neighbours[u]:
+                    self.evaluations += 1
+                    if any(move(u, v) for move in operators):
+                        improved = True
+                        break
+            self._reassign_idle(routes)
+
+        if not self.moves:
+            return decoded
+        routes = [route for route in routes if route.customers]
+        tour = np.array([c for route in routes for c in route.customers], dtype=np.int64)
+        bounds = np.concatenate([[0], np.cumsum([len(route.customers) for route in routes])])
+        vehicles = np.array([route.vehicle for route in routes], dtype=np.int64)
+        cost, violation, _ = self.decoder.evaluate(tour, bounds, vehicles)
+        fitness = cost + self.decoder.penalty * violation
+        if fitness >= decoded.fitness:
+            return decoded
+        return Decoded(tour, bounds, vehicles, fitness, cost, violation)
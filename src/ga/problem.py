@@ -0,0 +1,139 @@
+# src/ga/problem.py
+
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from src.preprocessing.matrix_store import RegionMatrices, load_region_matrices
+from src.utils.config import (
+    CUSTOMERS_CLEAN,
+    DEPOTS_CLEAN,
+    NODES_FINAL,
+    VEHICLES_REGION,
+    region_file,
+)
+
+
+@dataclass
+class RegionProblem:
+    """
+    Dữ liệu 1 bài toán VRP của 1 region, dạng mảng NumPy cho GA.
+
+    - Khách được đánh số 0..n_customers-1 (thứ tự trong nodes_final_{region}.csv);
+      customer_nodes[c] là node_index (hàng/cột ma trận) của khách c.
+    - Xe đánh số 0..n_vehicles-1 (thứ tự trong vehicles_{region}.csv);
+      start_nodes / end_nodes là node_index của depot đầu / cuối.
+    - distance (km) / time (phút): ma trận node_index x node_index.
+    """
+
+    region: str
+    node_ids: np.ndarray
+    customer_ids: np.ndarray
+    customer_nodes: np.ndarray
+    demand_weight: np.ndarray
+    demand_volume: np.ndarray
+    service_time: np.ndarray
+    ready_time: np.ndarray
+    due_time: np.ndarray
+    vehicle_ids: np.ndarray
+    vehicle_types: np.ndarray
+    capacity_weight: np.ndarray
+    capacity_volume: np.ndarray
+    fixed_cost: np.ndarray
+    variable_cost: np.ndarray
+    max_distance: np.ndarray
+    max_minutes: np.ndarray
+    start_nodes: np.ndarray
+    end_nodes: np.ndarray
+    depot_open: np.ndarray
+    depot_close: np.ndarray
+    distance: np.ndarray
+    time: np.ndarray
+
+    @property
+    def n_customers(self) -> int:
+        return len(self.customer_nodes)
+
+    @property
+    def n_vehicles(self) -> int:
+        return len(self.vehicle_ids)
+
+
+def _column(df: pd.DataFrame, col: str, default: float) -> np.ndarray:
+    """Cột số dạng float64, thiếu cột / thiếu giá trị -> default."""
+    if col not in df.columns:
+        return np.full(len(df), default, dtype=np.float64)
+    return df[col].astype("float64").fillna(default).to_numpy()
+
+
+def load_region_problem(region: str, mmap: bool = False, oracle=None) -> RegionProblem:
+    """
+    Ghép output Giai đoạn 6 (nodes_final / vehicles / ma trận) với thông tin
+    khách (customers_clean.csv) và giờ mở cửa depot (depots_clean.csv).
+
+    mmap=False: đọc hẳn ma trận vào RAM (gather ngẫu nhiên trong GA nhanh hơn mmap).
+    oracle (DistanceOracle của region): lấy ma trận từ oracle theo thứ tự nodes_final
+    thay vì ma trận Stage 5 (vd. khách thêm trong ngày, chưa chạy lại Stage 5).
+    """
+    nodes = pd.read_csv(region_file(NODES_FINAL, region), dtype={"node_id": str})
+    vehicles = pd.read_csv(region_file(VEHICLES_REGION, region))
+    customers = pd.read_csv(CUSTOMERS_CLEAN, dtype={"customer_id": str})
+    depots = pd.read_csv(DEPOTS_CLEAN, dtype={"depot_id": str})
+
+    node_index = dict(zip(nodes["node_id"], nodes["node_index"]))
+    node_order = nodes.sort_values("node_index")["node_id"].tolist()
+    if oracle is not None:
+        matrices = RegionMatrices(node_order, *oracle.table(node_order))
+    else:
+        matrices = load_region_matrices(region, mmap=mmap)
+    if list(matrices.node_ids) != node_order:
+        raise ValueError(f"nodes_final_{region}.csv không khớp thứ tự ma trận, chạy lại Giai đoạn 6")
+
+    # khách: theo thứ tự node_index
+    cust = nodes[nodes["node_type"] == "customer"].sort_values("node_index")
+    cust = cust[["node_id", "node_index"]].merge(
+        customers, left_on="node_id", right_on="customer_id", how="left"
+    )
+
+    # xe: bỏ xe có depot không nằm trong ma trận của region
+    has_depot = (
+        vehicles["start_depot_id"].isin(node_index.keys())
+        & vehicles["end_depot_id"].isin(node_index.keys())
+    )
+    if not has_depot.all():
+        print(f"  ⚠ {int((~has_depot).sum())} xe có depot ngoài region {region}, bỏ qua.")
+        vehicles = vehicles[has_depot].reset_index(drop=True)
+
+    # giờ mở / đóng cửa của depot xuất phát (mỗi xe)
+    depot_hours = depots.set_index("depot_id")[["open_time_min", "close_time_min"]]
+    hours = depot_hours.reindex(vehicles["start_depot_id"]).reset_index(drop=True)
+
+    distance = np.asarray(matrices.distance, dtype=np.float32)
+    time = np.asarray(matrices.time, dtype=np.float32)
+
+    return RegionProblem(
+        region=region,
+        node_ids=np.asarray(matrices.node_ids, dtype=object),
+        customer_ids=cust["node_id"].to_numpy(dtype=object),
+        customer_nodes=cust["node_index"].to_numpy(dtype=np.int64),
+        demand_weight=_column(cust, "demand_weight", 0.0),
+        demand_volume=_column(cust, "demand_volume", 0.0),
+        service_time=_column(cust, "service_time", 0.0),
+        ready_time=_column(cust, "ready_time_min", 0.0),
+        due_time=_column(cust, "due_time_min", np.inf),
+        vehicle_ids=vehicles["vehicle_id"].to_numpy(dtype=object),
+        vehicle_types=vehicles["vehicle_type"].to_numpy(dtype=object),
+        capacity_weight=_column(vehicles, "capacity_weight", np.inf),
+        capacity_volume=_column(vehicles, "capacity_volume", np.inf),
+        fixed_cost=_column(vehicles, "fixed_cost", 0.0),
+        variable_cost=_column(vehicles, "variable_cost", 1.0),
+        max_distance=_column(vehicles, "max_distance_km", np.inf),
+        max_minutes=_column(vehicles, "max_working_hours", np.inf) * 60,
+        start_nodes=vehicles["start_depot_id"].map(node_index).to_numpy(dtype=np.int64),
+        end_nodes=vehicles["end_depot_id"].map(node_index).to_numpy(dtype=np.int64),
+        depot_open=_column(hours, "open_time_min", 0.0),
+        depot_close=_column(hours, "close_time_min", np.inf),
+        distance=distance,
+        time=time,
+    )
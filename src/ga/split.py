@@ -0,0 +1,337 @@
+# src/ga/split.py
+"""
+Decoder giant tour -> tuyến xe (Split) cho GA.
+
+Giant tour là hoán vị của khách (0..n_customers-1). Split cắt nó thành các đoạn
+liên tiếp, mỗi đoạn là 1 tuyến, sao cho tổng chi phí nhỏ nhất:
+
+1. Split tuyến tính (Vidal 2016) trên prefix sum dọc tour + 1 hàng đợi đơn điệu
+   cho mỗi loại xe (vehicle_type) -> O(n * số loại xe), không quét bậc hai.
+   Mỗi loại xe dùng ràng buộc "an toàn" (nhỏ nhất trong loại) cho capacity_weight,
+   capacity_volume, max_distance_km, max_working_hours; chặng depot lấy depot gần
+   nhất trong các xe của loại đó.
+2. Gán xe thật cho từng tuyến (đội xe không đồng nhất, số xe có hạn).
+3. Chấm điểm chính xác mọi tuyến 1 lượt bằng NumPy: km, phút, tải, time window
+   (ready_time_min / due_time_min / service_time, giờ mở/đóng cửa depot).
+"""
+
+from collections import deque, namedtuple
+
+import numpy as np
+
+from src.ga.problem import RegionProblem
+from src.utils.config import GA_PENALTY
+
+# Kết quả decode 1 giant tour
+#   tour: hoán vị khách; bounds: tuyến r = tour[bounds[r]:bounds[r+1]]
+#   vehicles: xe (chỉ số trong RegionProblem) của từng tuyến
+Decoded = namedtuple(
+    "Decoded", ["tour", "bounds", "vehicles", "fitness", "cost", "violation"]
+)
+
+# Hằng số cho maximum.accumulate theo từng tuyến (xem _arrival_times)
+_ROUTE_OFFSET = 1e7
+
+
+# ============================================================
+#  LOẠI XE (CHO SPLIT)
+# ============================================================
+
+def fleet_classes(problem: RegionProblem) -> dict:
+    """
+    Gom xe theo vehicle_type. Mỗi loại: danh sách xe, ràng buộc nhỏ nhất trong loại,
+    chi phí trung bình, và chặng depot -> khách / khách -> depot ngắn nhất (km).
+    """
+    types, inverse = np.unique(problem.vehicle_types.astype(str), return_inverse=True)
+    members = [np.flatnonzero(inverse == k) for k in range(len(types))]
+    cust = problem.customer_nodes
+
+    def reduce(values, fn):
+        return np.array([fn(values[m]) for m in members])
+
+    start_leg = np.array([problem.distance[np.ix_(problem.start_nodes[m], cust)].min(axis=0) for m in members])
+    end_leg = np.array([problem.distance[np.ix_(cust, problem.end_nodes[m])].min(axis=1) for m in members])
+    return {
+        "types": types,
+        "members": members,
+        "capacity_weight": reduce(problem.capacity_weight, np.min),
+        "capacity_volume": reduce(problem.capacity_volume, np.min),
+        "max_distance": reduce(problem.max_distance, np.min),
+        "max_minutes": reduce(problem.max_minutes, np.min),
+        "fixed_cost": reduce(problem.fixed_cost, np.mean),
+        "variable_cost": reduce(problem.variable_cost, np.mean),
+        "start_leg": start_leg.astype(np.float64),
+        "end_leg": end_leg.astype(np.float64),
+    }
+
+
+# ============================================================
+#  DECODER
+# ============================================================
+
+class SplitDecoder:
+    """
+    Decoder dùng lại cho mọi cá thể của 1 region (bảng loại xe tính 1 lần).
+
+        decoder = SplitDecoder(problem)
+        result = decoder.decode(tour)   # -> Decoded
+    """
+
+    def __init__(self, problem: RegionProblem, penalty: float = GA_PENALTY):
+        self.problem = problem
+        self.penalty = penalty
+        self.classes = fleet_classes(problem)
+        self._dist_flat = problem.distance.ravel()
+        self._time_flat = problem.time.ravel()
+        self._n_nodes = problem.distance.shape[0]
+
+    # ---------- 1. Split tuyến tính ----------
+
+    def _tour_prefix(self, tour: np.ndarray) -> dict:
+        """Prefix sum dọc tour (chỉ số 1..n = vị trí trong tour, phần tử 0 = trước tour)."""
+        p = self.problem
+        nodes = p.customer_nodes[tour]
+        legs = np.zeros(len(tour) + 1)
+        legs[2:] = self._dist_flat.take(nodes[:-1] * self._n_nodes + nodes[1:])
+        travel = np.zeros(len(tour) + 1)
+        travel[2:] = self._time_flat.take(nodes[:-1] * self._n_nodes + nodes[1:])
+
+        def prefix(values):
+            out = np.zeros(len(tour) + 1)
+            out[1:] = values
+            return np.cumsum(out)
+
+        return {
+            "dist": np.cumsum(legs),
+            "travel": np.cumsum(travel),
+            "service": prefix(p.service_time[tour]),
+            "weight": prefix(p.demand_weight[tour]),
+            "volume": prefix(p.demand_volume[tour]),
+        }
+
+    def _windows(self, pre: dict, k: int) -> np.ndarray:
+        """
+        lo[t] = predecessor nhỏ nhất i sao cho tuyến (i, t] còn trong giới hạn của loại k
+        (tải, km, phút trong tuyến). Các prefix đều không giảm nên tìm bằng searchsorted.
+        Luôn có lo[t] <= t-1 (tuyến 1 khách luôn được phép).
+        """
+        c = self.classes
+        D, T, S = pre["dist"], pre["travel"], pre["service"]
+        W, V = pre["weight"], pre["volume"]
+        n = len(D) - 1
+        # duration tuyến (i, t] = (T[t] - T[i+1]) + (S[t] - S[i]) -> so U[i] = T[i+1] + S[i]
+        U = T[1:] + S[:-1]
+
+        lo = np.maximum.reduce([
+            np.searchsorted(W, W - c["capacity_weight"][k]),
+            np.searchsorted(V, V - c["capacity_volume"][k]),
+            np.searchsorted(D, D - c["max_distance"][k]) - 1,
+            np.searchsorted(U, T + S - c["max_minutes"][k]),
+        ])
+        return np.minimum(np.maximum(lo, 0), np.arange(n + 1) - 1)
+
+    def split(self, tour: np.ndarray):
+        """
+        Cắt tour tối ưu theo chi phí ước lượng của từng loại xe.
+        Trả về (bounds, route_class): tuyến r = tour[bounds[r]:bounds[r+1]], loại xe route_class[r].
+
+        Với mỗi loại k, chi phí tuyến (i, t] (khách i+1..t):
+            fixed_k + var_k * (start_k[s_{i+1}] + D[t] - D[i+1] + end_k[s_t])
+          = p[i] + a_k[i] + g_k[t]
+        -> p[t] = min_k (min_{lo_k[t] <= i < t} (p[i] + a_k[i]) + g_k[t]).
+        lo_k[t] không giảm theo t nên mỗi loại giữ 1 hàng đợi đơn điệu theo key
+        p[i] + a_k[i]: min trong O(1) khấu hao -> tổng O(n * số loại xe).
+        """
+        c = self.classes
+        n = len(tour)
+        pre = self._tour_prefix(tour)
+        D = pre["dist"]
+        n_cls = len(c["types"])
+
+        a, g, lo = [], [], []
+        for k in range(n_cls):
+            var = c["variable_cost"][k]
+            a.append((var * (c["start_leg"][k][tour] - D[1:])).tolist())
+            g_k = np.zeros(n + 1)
+            g_k[1:] = var * (D[1:] + c["end_leg"][k][tour]) + c["fixed_cost"][k]
+            g.append(g_k.tolist())
+            lo.append(self._windows(pre, k).tolist())
+
+        p = [0.0] * (n + 1)
+        pred = [0] * (n + 1)
+        pred_cls = [0] * (n + 1)
+        queues = [deque() for _ in range(n_cls)]
+        classes = list(zip(range(n_cls), queues, a, g, lo))
+
+        for t in range(1, n + 1):
+            best, best_i, best_k = float("inf"), t - 1, 0
+            p_prev = p[t - 1]
+            for k, q, a_k, g_k, lo_k in classes:
+                # predecessor mới i = t-1: bỏ các i cũ có key lớn hơn (bị trội)
+                key = p_prev + a_k[t - 1]
+                while q and q[-1][0] >= key:
+                    q.pop()
+                q.append((key, t - 1))
+                # bỏ predecessor không còn chứa nổi khách i+1..t
+                lo_t = lo_k[t]
+                while q[0][1] < lo_t:
+                    q.popleft()
+                cand = q[0][0] + g_k[t]
+                if cand < best:
+                    best, best_i, best_k = cand, q[0][1], k
+            p[t], pred[t], pred_cls[t] = best, best_i, best_k
+
+        bounds, route_class = [n], []
+        t = n
+        while t > 0:
+            route_class.append(pred_cls[t])
+            t = pred[t]
+            bounds.append(t)
+        return np.array(bounds[::-1]), np.array(route_class[::-1])
+
+    # ---------- 2. Gán xe thật ----------
+
+    def assign_vehicles(self, tour: np.ndarray, bounds: np.ndarray, route_class: np.ndarray) -> np.ndarray:
+        """
+        Gán xe cho từng tuyến, tuyến tải nặng trước:
+            - ưu tiên xe còn trống cùng loại, depot gần khách đầu/cuối nhất;
+            - hết xe cùng loại: xe còn trống có capacity_weight vừa đủ nhỏ nhất;
+            - hết xe: -1 (tuyến thừa, bị phạt khi chấm điểm).
+        """
+        p = self.problem
+        weight = np.add.reduceat(p.demand_weight[tour], bounds[:-1]) if len(tour) else np.zeros(0)
+        first = p.customer_nodes[tour[bounds[:-1]]]
+        last = p.customer_nodes[tour[bounds[1:] - 1]]
+        free = np.ones(p.n_vehicles, dtype=bool)
+        vehicles = np.full(len(route_class), -1, dtype=np.int64)
+
+        for r in np.argsort(-weight, kind="stable"):
+            same = self.classes["members"][route_class[r]]
+            cand = same[free[same]]
+            if not len(cand):
+                others = np.flatnonzero(free)
+                fits = others[p.capacity_weight[others] >= weight[r]]
+                cand = fits[[np.argmin(p.capacity_weight[fits])]] if len(fits) else others[:1]
+            if not len(cand):
+                continue
+            legs = p.distance[p.start_nodes[cand], first[r]] + p.distance[last[r], p.end_nodes[cand]]
+            v = cand[np.argmin(legs)]
+            vehicles[r] = v
+            free[v] = False
+        return vehicles
+
+    # ---------- 3. Chấm điểm chính xác ----------
+
+    def evaluate(self, tour: np.ndarray, bounds: np.ndarray, vehicles: np.ndarray):
+        """
+        (cost, violation, per_route) cho bộ tuyến, tính 1 lượt bằng NumPy.
+
+        violation = Σ phần vượt capacity_weight / capacity_volume / max_distance_km /
+        max_working_hours + Σ phút trễ due_time_min của khách + trễ giờ đóng cửa depot
+        + tổng tải của tuyến không có xe (vehicles = -1).
+        """
+        p = self.problem
+        n_routes = len(vehicles)
+        lengths = np.diff(bounds)
+        route_of = np.repeat(np.arange(n_routes), lengths)
+        is_first = np.zeros(len(tour), dtype=bool)
+        is_first[bounds[:-1]] = True
+
+        # tuyến thừa (không có xe) chấm như xe 0 để tính km, tải của nó bị phạt riêng
+        veh = np.where(vehicles >= 0, vehicles, 0)
+        veh_of = veh[route_of]
+        nodes = p.customer_nodes[tour]
+        prev = np.where(is_first, p.start_nodes[veh_of], np.roll(nodes, 1))
+        leg = prev * self._n_nodes + nodes
+        back = nodes[bounds[1:] - 1] * self._n_nodes + p.end_nodes[veh]
+
+        leg_dist = self._dist_flat.take(leg).astype(np.float64)
+        leg_time = self._time_flat.take(leg).astype(np.float64)
+        back_dist = self._dist_flat.take(back).astype(np.float64)
+        back_time = self._time_flat.take(back).astype(np.float64)
+
+        service = p.service_time[tour]
+        starts = bounds[:-1]
+        dist = np.add.reduceat(leg_dist, starts) + back_dist
+        travel = np.add.reduceat(leg_time, starts) + back_time
+        weight = np.add.reduceat(p.demand_weight[tour], starts)
+        volume = np.add.reduceat(p.demand_volume[tour], starts)
+        minutes = travel + np.add.reduceat(service, starts)
+
+        arrival = _arrival_times(
+            leg_time, service, p.ready_time[tour], p.depot_open[veh_of], is_first, route_of
+        )
+        late = np.maximum(arrival - p.due_time[tour], 0.0)
+        back_at = arrival[bounds[1:] - 1] + service[bounds[1:] - 1] + back_time
+        depot_late = np.maximum(back_at - p.depot_close[veh], 0.0)
+
+        cost = p.fixed_cost[veh] + p.variable_cost[veh] * dist
+        violation = (
+            np.maximum(weight - p.capacity_weight[veh], 0.0)
+            + np.maximum(volume - p.capacity_volume[veh], 0.0)
+            + np.maximum(dist - p.max_distance[veh], 0.0)
+            + np.maximum(minutes - p.max_minutes[veh], 0.0)
+            + np.add.reduceat(late, starts)
+            + depot_late
+            + np.where(vehicles < 0, weight, 0.0)
+        )
+        per_route = {
+            "distance": dist, "minutes": minutes, "weight": weight,
+            "volume": volume, "cost": cost, "violation": violation,
+        }
+        return float(cost.sum()), float(violation.sum()), per_route
+
+    # ---------- tất cả ----------
+
+    def decode(self, tour: np.ndarray) -> Decoded:
+        tour = np.asarray(tour, dtype=np.int64)
+        bounds, route_class = self.split(tour)
+        vehicles = self.assign_vehicles(tour, bounds, route_class)
+        cost, violation, _ = self.evaluate(tour, bounds, vehicles)
+        return Decoded(tour, bounds, vehicles, cost + self.penalty * violation, cost, violation)
+
+    def routes(self, decoded: Decoded) -> list:
+        """Decoded -> list tuyến đọc được: vehicle_id, customer_ids, km, phút, kg, vi phạm."""
+        p = self.problem
+        _, _, per_route = self.evaluate(decoded.tour, decoded.bounds, decoded.vehicles)
+        out = []
+        for r, v in enumerate(decoded.vehicles):
+            stops = decoded.tour[decoded.bounds[r]:decoded.bounds[r + 1]]
+            out.append({
+                "vehicle_id": p.vehicle_ids[v] if v >= 0 else None,
+                "customer_ids": p.customer_ids[stops].tolist(),
+                "distance_km": float(per_route["distance"][r]),
+                "minutes": float(per_route["minutes"][r]),
+                "load_weight": float(per_route["weight"][r]),
+                "violation": float(per_route["violation"][r]),
+            })
+        return out
+
+
+def _arrival_times(leg_time, service, ready, depart, is_first, route_of) -> np.ndarray:
+    """
+    Giờ đến từng khách (phút trong ngày), xe rời depot lúc mở cửa:
+        a_k = max(ready_k, a_{k-1} + service_{k-1} + t_k)
+    Đặt inc_k = t_k + (depart nếu k đầu tuyến, không thì service_{k-1}), S = cumsum(inc)
+    trong tuyến -> a_k = S_k + max(0, max_{m<=k}(ready_m - S_m)).
+    Max tích luỹ theo từng tuyến: cộng route_index * _ROUTE_OFFSET để tuyến sau
+    luôn lớn hơn tuyến trước rồi dùng 1 lần np.maximum.accumulate.
+    Chặng không tới được (inf / nan) không đi vào cumsum chung: khách từ chặng đó tới
+    cuối tuyến có giờ đến inf, các tuyến khác không bị ảnh hưởng.
+    """
+    prev_service = np.roll(service, 1)
+    inc = leg_time + np.where(is_first, depart, prev_service)
+    broken = ~np.isfinite(inc)
+    inc = np.where(broken, 0.0, inc)
+    total = np.cumsum(inc)
+    start_total = (total - inc)[is_first]
+    s = total - start_total[route_of]
+
+    # số chặng hỏng từ đầu tuyến tới k (cumsum cũng bắt đầu lại ở mỗi tuyến)
+    n_broken = np.cumsum(broken)
+    start_broken = (n_broken - broken)[is_first]
+    s = np.where(n_broken - start_broken[route_of] > 0, np.inf, s)
+
+    offset = route_of * _ROUTE_OFFSET
+    best = np.maximum.accumulate(np.maximum(ready - s, 0.0) + offset) - offset
+    return s + best
@@ -1,207 +1,654 @@
 # src/preprocessing/build_matrix.py
 
+import math
+import multiprocessing as mp
+import os
+import time
+
+import numpy as np
 import pandas as pd
-import heapq
-from math import inf
 
 from src.utils.config import (
     NODES_MASTER,
     EDGES_MASTER,
-    DATA_PROCESSED,
     VEHICLES_CLEAN,
+    MATRIX_MODE,
+    MATRIX_PRIMARY_WEIGHT,
+    MATRIX_CHUNK_SIZE,
+    MATRIX_WORKERS,
+    MATRIX_DTYPE,
+    EXPORT_MATRIX_CSV,
+    MATRIX_INCREMENTAL,
+    MATRIX_STORAGE,
+    MATRIX_KNN_K,
+    MATRIX_KNN_RADIUS,
+    MATRIX_ENGINE,
+    EDGES_REGION,
+    NODES_FINAL,
+    EDGES_FINAL,
+    VEHICLES_REGION,
+    EXPORT_EDGES_CSV,
+    EDGES_CROSS_REGION,
+    REGION_SPLIT_WORKERS,
+    region_file,
+)
+from src.preprocessing.contraction import hierarchy_table, region_hierarchies
+from src.preprocessing.edge_store import (
+    edge_table_exists,
+    load_edge_table,
+    node_codes,
+    save_edge_table,
+)
+from src.preprocessing.graph_engine import (
+    EDGE_COLUMNS,
+    build_region_graph,
+    nearest_targets,
+    shortest_path_pair,
+)
+from src.preprocessing.matrix_incremental import (
+    patch_region_matrices,
+    plan_region_update,
+    region_fingerprint,
 )
+from src.preprocessing.matrix_store import (
+    load_matrix_nodes,
+    load_region_matrices,
+    load_region_state,
+    region_knn_exists,
+    region_matrices_exist,
+    save_region_knn,
+    save_region_matrices,
+    save_region_state,
+)
+from src.preprocessing.sharding import SHARD_COLUMN, attach_shards
+from src.utils.perf import emit, track
 
 # ============================================================
-#  GIAI ĐOẠN 4 – BUILD GRAPH THEO REGION (edges_{region}.csv)
+#  GIAI ĐOẠN 4 – BUILD GRAPH THEO REGION (edges_{region}.npz)
 # ============================================================
 
-def build_graphs_by_region():
+_SPLIT_STATE = {}
+
+
+def _init_split_worker(edges: pd.DataFrame, order: np.ndarray):
+    _SPLIT_STATE["edges"] = edges
+    _SPLIT_STATE["order"] = order
+
+
+def _write_partition_task(task):
+    """Ghi 1 phần (hàng order[start:stop] của bảng edge) ra path (chạy trong worker)."""
+    label, path, start, stop = task
+    t0 = time.perf_counter()
+    part = _SPLIT_STATE["edges"].iloc[_SPLIT_STATE["order"][start:stop]]
+    save_edge_table(part, path, write_csv=EXPORT_EDGES_CSV)
+    return label, path, stop - start, time.perf_counter() - t0
+
+
+def _partition_edges(edges: pd.DataFrame, nodes: pd.DataFrame, regions: list, column: str):
+    """
+    Chia bảng edge theo region (giá trị cột `column` của node) trong 1 lượt.
+
+    - node -> region tra 1 lần cho từng mã node (từ điển node của bảng có kiểu)
+    - khoá phần của cạnh: i (cả 2 đầu thuộc regions[i]), len(regions) (2 đầu khác
+      region = cạnh liên vùng), len(regions) + 1 (có đầu không thuộc region nào)
+    - 1 lần argsort ổn định theo khoá -> phần i là order[bounds[i]:bounds[i + 1]],
+      trong mỗi phần giữ thứ tự dòng gốc
+
+    Trả về (order, bounds, origin_region, destination_region).
+    """
+    vocab, origin, destination = node_codes(edges)
+    lookup = nodes.drop_duplicates("node_id")
+    position = pd.Index(lookup["node_id"]).get_indexer(vocab)
+    node_region = np.where(
+        position >= 0, pd.Index(regions).get_indexer(lookup[column])[position], -1
+    )
+    origin_region = node_region[origin]
+    destination_region = node_region[destination]
+
+    n_regions = len(regions)
+    key = np.where(origin_region == destination_region, origin_region, n_regions)
+    key[(origin_region < 0) | (destination_region < 0)] = n_regions + 1
+
+    order = np.argsort(key, kind="stable")
+    bounds = np.zeros(n_regions + 3, dtype=np.int64)
+    np.cumsum(np.bincount(key, minlength=n_regions + 2), out=bounds[1:])
+    return order, bounds, origin_region, destination_region
+
+
+def build_graphs_by_region(workers: int = None):
     """
     GIAI ĐOẠN 4 – BUILD GRAPH THEO REGION
 
-    - Đọc nodes_master.csv để lấy danh sách node + region_id.
-    - Đọc edges_master.csv (mạng đường toàn quốc).
-    - Với mỗi region:
-        + Lấy danh sách node thuộc region đó.
-        + Lọc edges sao cho origin & destination đều thuộc tập node này.
-        + Ghi ra edges_{region}.csv để dùng cho Dijkstra & ma trận ở Giai đoạn 5.
+    - Đọc nodes_master.csv để lấy danh sách node + region_id
+      (region đã chia shard ở cuối Giai đoạn 3 -> theo shard_id, mỗi shard như 1 region).
+    - Đọc edges_master.npz (mạng đường toàn quốc, bảng có kiểu).
+    - Chia edges theo region của 2 đầu cạnh trong 1 lượt (_partition_edges),
+      chi phí không tăng theo số region.
+    - Ghi song song (process pool, workers -> REGION_SPLIT_WORKERS):
+        + edges_{region}.npz: cạnh có 2 đầu cùng region, dùng cho Dijkstra & ma trận ở Giai đoạn 5.
+        + edges_cross_region.npz: cạnh nối 2 region khác nhau (trung chuyển liên vùng),
+          trước đây bị bỏ không báo.
     """
 
-    nodes = pd.read_csv(NODES_MASTER)
-    edges = pd.read_csv(EDGES_MASTER)
+    nodes = attach_shards(pd.read_csv(NODES_MASTER, dtype={"node_id": str}))
+    edges = load_edge_table(EDGES_MASTER)
 
-    regions = nodes["region_id"].dropna().unique().tolist()
+    column = SHARD_COLUMN
+    regions = nodes[column].dropna().unique().tolist()
     print(f"✔ GIAI ĐOẠN 4 – Tìm thấy các region: {regions}")
 
     if not regions:
         print("⚠ Không có region_id trong nodes_master.csv, kiểm tra lại Stage 1–2.")
         return
 
-    summary = []
-    for region in regions:
-        print(f"\n=== Region: {region} ===")
-
-        # node thuộc region này
-        nodes_region = nodes[nodes["region_id"] == region]["node_id"].tolist()
-        num_nodes = len(nodes_region)
-        print(f"  - Số node trong region: {num_nodes}")
-
-        if num_nodes == 0:
-            print("  ⚠ Không có node, bỏ qua region này.")
-            continue
-
-        # edges kết nối các node trong region
-        edges_region = edges[
-            edges["origin_id"].isin(nodes_region)
-            & edges["destination_id"].isin(nodes_region)
-        ].copy()
-
-        num_edges = len(edges_region)
-        if num_edges == 0:
-            print("  ⚠ Không có edge nối các node trong region, kiểm tra lại dữ liệu roads.")
-        else:
-            out_path = DATA_PROCESSED / f"edges_{region}.csv"
-            edges_region.to_csv(out_path, index=False)
-            print(f"  - Số edges: {num_edges}")
-            print(f"  → Đã lưu edges cho region tại: {out_path}")
+    order, bounds, origin_region, destination_region = _partition_edges(edges, nodes, regions, column)
+    node_counts = nodes[column].value_counts()
 
+    summary, tasks = [], []
+    for code, region in enumerate(regions):
+        num_nodes = int(node_counts.get(region, 0))
+        num_edges = int(bounds[code + 1] - bounds[code])
         summary.append((region, num_nodes, num_edges))
+        if num_edges == 0:
+            print(f"  ⚠ Region {region}: không có edge nối các node trong region, "
+                  "kiểm tra lại dữ liệu roads.")
+            continue
+        tasks.append((region, region_file(EDGES_REGION, region), bounds[code], bounds[code + 1]))
+
+    n_regions = len(regions)
+    cross = slice(bounds[n_regions], bounds[n_regions + 1])
+    tasks.append(("liên vùng", EDGES_CROSS_REGION, cross.start, cross.stop))
+
+    workers = REGION_SPLIT_WORKERS if workers is None else workers
+    workers = max(1, min(len(tasks), int(workers or os.cpu_count() or 1)))
+    if workers > 1:
+        methods = mp.get_all_start_methods()
+        ctx = mp.get_context("fork" if "fork" in methods else None)
+        pool = ctx.Pool(workers, initializer=_init_split_worker, initargs=(edges, order))
+        results = pool.imap_unordered(_write_partition_task, tasks)
+    else:
+        pool = None
+        _init_split_worker(edges, order)
+        results = map(_write_partition_task, tasks)
+
+    try:
+        for label, path, n_rows, secs in results:
+            print(f"  → {label}: {n_rows} edges -> {path} ({secs:.2f}s)")
+            emit({"label": f"Stage 4 – {label}", "stage": 4, "region": label,
+                  "seconds": round(secs, 4), "rows_out": n_rows})
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+    # cạnh liên vùng theo cặp (region đi -> region đến)
+    rows = order[cross]
+    if len(rows):
+        pairs = pd.Series(
+            np.asarray(regions, dtype=object)[origin_region[rows]]
+        ).str.cat(np.asarray(regions, dtype=object)[destination_region[rows]], sep=" -> ")
+        print(f"  ⚠ {len(rows)} edges liên vùng (không vào edges_{{region}}):")
+        for pair, count in pairs.value_counts().items():
+            print(f"    · {pair}: {count}")
+
+    unassigned = int(bounds[n_regions + 2] - bounds[n_regions + 1])
+    if unassigned:
+        print(f"  ⚠ {unassigned} edges có node không thuộc region nào, bỏ qua.")
 
     print("\n===== TỔNG KẾT GIAI ĐOẠN 4 – BUILD GRAPH THEO REGION =====")
     for region, n_nodes, n_edges in summary:
         print(f"Region {region}: {n_nodes} nodes, {n_edges} edges")
+    print(f"Liên vùng: {len(rows)} edges")
 
 
 # ============================================================
 #  GIAI ĐOẠN 5 – DIJKSTRA & MA TRẬN (BẢN TỐI ƯU)
 # ============================================================
 
-def _dijkstra_source_to_all(adjacency: dict, source: str) -> dict:
-    """
-    Dijkstra từ 1 source đến tất cả node trong graph (adjacency).
-    adjacency: dict[node] = list[(neighbor, weight)]
-    Trả về: dict[node] = distance (float hoặc inf)
+def _compute_region_matrices(
+    graph,
+    active_nodes: list,
+    mode: str,
+    primary: str,
+    chunk_size: int = None,
+    stats: dict = None,
+):
     """
-    dist = {n: inf for n in adjacency.keys()}
-    dist[source] = 0.0
-    pq = [(0.0, source)]
+    Tính ma trận distance/time (active x active) cho 1 region.
 
-    while pq:
-        d, u = heapq.heappop(pq)
-        if d > dist[u]:
-            continue
-        for v, w in adjacency.get(u, []):
-            nd = d + w
-            if nd < dist[v]:
-                dist[v] = nd
-                heapq.heappush(pq, (nd, v))
-    return dist
+    - Buffer NumPy (MATRIX_DTYPE) được cấp phát 1 lần.
+    - col_index: active node thứ j -> chỉ số node trong CSR graph (tính trước 1 lần).
+    - Mỗi block chunk_size source ghi nguyên các hàng của buffer trong 1 phép gán.
+    - stats (vd. dict của track): cộng dồn "nodes_settled" của Dijkstra.
+    """
+    chunk_size = chunk_size or MATRIX_CHUNK_SIZE
+    col_index = graph.encode(active_nodes)
+    n = len(col_index)
+
+    dist_buf = np.empty((n, n), dtype=MATRIX_DTYPE)
+    time_buf = np.empty((n, n), dtype=MATRIX_DTYPE)
+
+    for start in range(0, n, chunk_size):
+        stop = min(start + chunk_size, n)
+        print(f"  · Dijkstra {start + 1}-{stop}/{n}")
+        dist_buf[start:stop], time_buf[start:stop] = shortest_path_pair(
+            graph, col_index[start:stop], col_index,
+            primary=primary, mode=mode, dtype=MATRIX_DTYPE, stats=stats,
+        )
 
+    return dist_buf, time_buf
+
+
+def _merge_knn_blocks(blocks: list):
+    """Ghép các block CSR (theo thứ tự source) thành 1 CSR (indptr, indices, distance, time)."""
+    indptr = [np.zeros(1, dtype=np.int64)]
+    offset = 0
+    for block_indptr, *_ in blocks:
+        indptr.append(block_indptr[1:] + offset)
+        offset += block_indptr[-1]
+    return (
+        np.concatenate(indptr),
+        *(np.concatenate([block[field] for block in blocks]) for field in (1, 2, 3)),
+    )
+
+
+def _compute_region_knn(
+    graph,
+    active_nodes: list,
+    mode: str,
+    primary: str,
+    k: int,
+    radius: float,
+    chunk_size: int = None,
+):
+    """
+    Bản thưa của 1 region: k active node gần nhất / source, không cấp phát N x N.
+    Bộ nhớ tạm chỉ là khối chunk_size x (số node graph) của Dijkstra.
+    """
+    chunk_size = chunk_size or MATRIX_CHUNK_SIZE
+    col_index = graph.encode(active_nodes)
+    n = len(col_index)
+
+    blocks = []
+    for start in range(0, n, chunk_size):
+        stop = min(start + chunk_size, n)
+        print(f"  · Dijkstra (k={k}) {start + 1}-{stop}/{n}")
+        blocks.append(nearest_targets(
+            graph, col_index[start:stop], col_index, k,
+            primary=primary, mode=mode, radius=radius, dtype=MATRIX_DTYPE,
+        ))
+    return _merge_knn_blocks(blocks)
+
+
+# ---------- chạy song song (process pool) ----------
+
+# Graph của các region cho worker: set 1 lần qua initializer.
+# Với start method "fork" worker thừa hưởng bộ nhớ của process cha (copy-on-write),
+# không pickle graph theo từng task; task chỉ gồm (region, start, stop).
+_WORKER_STATE = {}
+
+
+def _resolve_workers(workers: int = None) -> int:
+    """workers -> MATRIX_WORKERS -> os.cpu_count() (tối thiểu 1)."""
+    if workers is None:
+        workers = MATRIX_WORKERS
+    if workers is None:
+        workers = os.cpu_count() or 1
+    return max(1, int(workers))
+
+
+def _init_matrix_worker(shared: dict, mode: str, primary: str, knn: tuple = None):
+    _WORKER_STATE["shared"] = shared
+    _WORKER_STATE["mode"] = mode
+    _WORKER_STATE["primary"] = primary
+    _WORKER_STATE["knn"] = knn
+
+
+def _matrix_chunk_task(task):
+    """Worker: Dijkstra cho các source [start, stop) của 1 region."""
+    region, start, stop = task
+    graph, col_index = _WORKER_STATE["shared"][region]
+
+    t0 = time.perf_counter()
+    stats = {"nodes_settled": 0}
+    dist_block, time_block = shortest_path_pair(
+        graph, col_index[start:stop], col_index,
+        primary=_WORKER_STATE["primary"], mode=_WORKER_STATE["mode"],
+        dtype=MATRIX_DTYPE, stats=stats,
+    )
+    return (region, start, stop, dist_block, time_block, stats["nodes_settled"],
+            os.getpid(), time.perf_counter() - t0)
+
+
+def _knn_chunk_task(task):
+    """Worker: k láng giềng gần nhất cho các source [start, stop) của 1 region."""
+    region, start, stop = task
+    graph, col_index = _WORKER_STATE["shared"][region]
+    k, radius = _WORKER_STATE["knn"]
+
+    t0 = time.perf_counter()
+    block = nearest_targets(
+        graph, col_index[start:stop], col_index, k,
+        primary=_WORKER_STATE["primary"], mode=_WORKER_STATE["mode"],
+        radius=radius, dtype=MATRIX_DTYPE,
+    )
+    return region, start, stop, block, os.getpid(), time.perf_counter() - t0
+
+
+def _compute_matrices_parallel(
+    prepared: dict,
+    mode: str,
+    primary: str,
+    workers: int,
+    chunk_size: int = None,
+    stats: dict = None,
+) -> dict:
+    """
+    Tính ma trận cho NHIỀU region cùng lúc trên process pool.
 
-def build_matrices_by_region():
+    - prepared: region -> (graph, active_nodes)
+    - Công việc chia theo (region, block source); block được ghi vào buffer của region
+      theo đúng vị trí hàng -> kết quả không phụ thuộc thứ tự worker hoàn thành.
+    - In tiến độ theo từng worker (pid) + tổng kết cuối.
+    - stats: cộng dồn "nodes_settled" do các worker trả về.
+    """
+    chunk_size = chunk_size or MATRIX_CHUNK_SIZE
+    shared = {
+        region: (graph, graph.encode(active_nodes))
+        for region, (graph, active_nodes) in prepared.items()
+    }
+
+    # block đủ nhỏ để mỗi worker nhận vài task (cân bằng tải), không vượt chunk_size
+    total_rows = sum(len(col_index) for _, col_index in shared.values())
+    chunk = max(1, min(chunk_size, math.ceil(total_rows / (workers * 4))))
+
+    buffers, tasks = {}, []
+    for region, (_, col_index) in shared.items():
+        n = len(col_index)
+        buffers[region] = (
+            np.empty((n, n), dtype=MATRIX_DTYPE),
+            np.empty((n, n), dtype=MATRIX_DTYPE),
+        )
+        tasks.extend((region, start, min(start + chunk, n)) for start in range(0, n, chunk))
+
+    print(f"  · {len(tasks)} task (block {chunk} sources) trên {workers} workers")
+
+    methods = mp.get_all_start_methods()
+    ctx = mp.get_context("fork" if "fork" in methods else None)
+    per_worker = {}
+    done_rows = 0
+    with ctx.Pool(
+        processes=workers,
+        initializer=_init_matrix_worker,
+        initargs=(shared, mode, primary),
+    ) as pool:
+        for region, start, stop, dist_block, time_block, settled, pid, secs in pool.imap_unordered(
+            _matrix_chunk_task, tasks
+        ):
+            if stats is not None:
+                stats["nodes_settled"] = stats.get("nodes_settled", 0) + settled
+            dist_buf, time_buf = buffers[region]
+            dist_buf[start:stop] = dist_block
+            time_buf[start:stop] = time_block
+
+            n_tasks, n_rows, busy = per_worker.get(pid, (0, 0, 0.0))
+            per_worker[pid] = (n_tasks + 1, n_rows + stop - start, busy + secs)
+            done_rows += stop - start
+            print(
+                f"  · worker {pid}: {region} rows {start + 1}-{stop} "
+                f"({secs:.2f}s) – tổng {done_rows}/{total_rows}"
+            )
+
+    for pid, (n_tasks, n_rows, busy) in sorted(per_worker.items()):
+        print(f"  - worker {pid}: {n_tasks} task, {n_rows} sources, {busy:.2f}s")
+
+    return buffers
+
+
+def _compute_knn_parallel(
+    prepared: dict,
+    mode: str,
+    primary: str,
+    workers: int,
+    k: int,
+    radius: float,
+    chunk_size: int = None,
+) -> dict:
+    """
+    Như _compute_matrices_parallel nhưng cho bản thưa: block CSR của từng task
+    được ghép lại theo vị trí source (không phụ thuộc thứ tự hoàn thành).
+    Trả về region -> (indptr, indices, distance, time).
+    """
+    chunk_size = chunk_size or MATRIX_CHUNK_SIZE
+    shared = {
+        region: (graph, graph.encode(active_nodes))
+        for region, (graph, active_nodes) in prepared.items()
+    }
+    total_rows = sum(len(col_index) for _, col_index in shared.values())
+    chunk = max(1, min(chunk_size, math.ceil(total_rows / (workers * 4))))
+
+    blocks, tasks = {}, []
+    for region, (_, col_index) in shared.items():
+        n = len(col_index)
+        blocks[region] = {}
+        tasks.extend((region, start, min(start + chunk, n)) for start in range(0, n, chunk))
+
+    print(f"  · {len(tasks)} task (block {chunk} sources, k={k}) trên {workers} workers")
+
+    methods = mp.get_all_start_methods()
+    ctx = mp.get_context("fork" if "fork" in methods else None)
+    done_rows = 0
+    with ctx.Pool(
+        processes=workers,
+        initializer=_init_matrix_worker,
+        initargs=(shared, mode, primary, (k, radius)),
+    ) as pool:
+        for region, start, stop, block, pid, secs in pool.imap_unordered(_knn_chunk_task, tasks):
+            blocks[region][start] = block
+            done_rows += stop - start
+            print(
+                f"  · worker {pid}: {region} rows {start + 1}-{stop} "
+                f"({secs:.2f}s) – tổng {done_rows}/{total_rows}"
+            )
+
+    return {
+        region: _merge_knn_blocks([parts[start] for start in sorted(parts)])
+        for region, parts in blocks.items()
+    }
+
+
+def _prepare_region(nodes: pd.DataFrame, region: str):
+    """
+    Đọc dữ liệu 1 region (hoặc shard) cho Stage 5.
+    Trả về (graph, active_nodes, active_df, edges_region) hoặc None nếu region không đủ dữ liệu.
+    """
+    # 1. Node trong region
+    nodes_region_df = nodes[nodes[SHARD_COLUMN] == region].copy()
+    if nodes_region_df.empty:
+        print("  ⚠ Không có node, skip.")
+        return None
+
+    # 2. Active nodes = depot + customer
+    if "node_type" in nodes_region_df.columns:
+        active_df = nodes_region_df[
+            nodes_region_df["node_type"].isin(["depot", "customer"])
+        ].copy()
+    else:
+        # fallback: nếu thiếu cột node_type thì xem mọi node đều là active
+        active_df = nodes_region_df.copy()
+
+    active_nodes = active_df["node_id"].tolist()
+    if len(active_nodes) == 0:
+        print("  ⚠ Region không có depot/customer, skip.")
+        return None
+
+    print(f"  - Tổng node trong region: {len(nodes_region_df)}")
+    print(f"  - Active nodes (depot + customer): {len(active_nodes)}")
+
+    # 3. Đọc edges_{region}.npz để build graph (mã node có sẵn, không parse chuỗi)
+    edges_path = region_file(EDGES_REGION, region)
+    if not edge_table_exists(edges_path):
+        print(f"  ⚠ Không có {edges_path}, skip.")
+        return None
+
+    edges_region = load_edge_table(edges_path, columns=EDGE_COLUMNS)
+    if edges_region.empty:
+        print("  ⚠ edges rỗng, skip.")
+        return None
+
+    # 4. Build CSR graph (mã hoá node_id -> int một lần, không iterrows)
+    graph = build_region_graph(edges_region, extra_nodes=active_nodes)
+    print(f"  - CSR graph: {graph.num_nodes} nodes, {graph.num_edges} edges")
+    return graph, active_nodes, active_df, edges_region
+
+
+def build_matrices_by_region(
+    mode: str = None,
+    primary: str = None,
+    workers: int = None,
+    write_csv: bool = None,
+    incremental: bool = None,
+    storage: str = None,
+    k: int = None,
+    engine: str = None,
+):
     """
     GIAI ĐOẠN 5 (BẢN TỐI ƯU)
     - Chỉ tính ma trận cho DEPOT + CUSTOMER (active nodes).
     - Graph vẫn dùng tất cả node/edge trong region, nhưng chỉ lưu
       khoảng cách giữa các node thực sự tham gia bài toán (depot+customer).
+    - Graph dựng dạng CSR (graph_engine), Dijkstra nhiều nguồn chạy trên mảng NumPy.
+    - mode / primary (mặc định lấy từ config MATRIX_MODE / MATRIX_PRIMARY_WEIGHT):
+        + "path": 1 lần Dijkstra / source theo primary, trọng số kia cộng dọc tuyến đã chọn
+        + "independent": distance và time là 2 tối ưu độc lập
+    - workers (mặc định MATRIX_WORKERS, None = số core): > 1 thì chia việc theo
+      (region, block source) cho process pool, tất cả region chạy cùng lúc.
+    - Ma trận lưu dạng .npy (matrix_store); write_csv (mặc định EXPORT_MATRIX_CSV)
+      ghi thêm bản CSV N x N để tương thích.
+    - incremental (mặc định MATRIX_INCREMENTAL): so hash node/edge với lần trước,
+      chỉ chạy Dijkstra cho node mới/đổi và vá vào ma trận cũ; edge cũ đổi -> tính lại cả region.
+    - storage (mặc định MATRIX_STORAGE): "knn" -> chỉ lưu k (mặc định MATRIX_KNN_K) active node
+      gần nhất / source vào knn_matrix_{region}.npz (Dijkstra giới hạn bán kính, không có
+      buffer N x N, không incremental); cặp thiếu tính lại khi đọc (matrix_sparse).
+    - engine (mặc định MATRIX_ENGINE): "ch" -> ma trận dày tính bằng contraction hierarchies
+      (index ch_{region}_{weight}.npz, chỉ build lại khi edges_{region} đổi), tuần tự từng region.
     """
-
-    nodes = pd.read_csv(NODES_MASTER)
-    regions = nodes["region_id"].dropna().unique().tolist()
+    mode = mode or MATRIX_MODE
+    storage = storage or MATRIX_STORAGE
+    if storage not in ("dense", "knn"):
+        raise ValueError(f"storage phải là 'dense' hoặc 'knn', nhận: {storage}")
+    k = k or MATRIX_KNN_K
+    engine = engine or MATRIX_ENGINE
+    if engine not in ("dijkstra", "ch"):
+        raise ValueError(f"engine phải là 'dijkstra' hoặc 'ch', nhận: {engine}")
+    incremental = (MATRIX_INCREMENTAL if incremental is None else incremental) and storage == "dense"
+    write_csv = EXPORT_MATRIX_CSV if write_csv is None else write_csv
+    primary = primary or MATRIX_PRIMARY_WEIGHT
+    workers = _resolve_workers(workers)
+
+    nodes = attach_shards(pd.read_csv(NODES_MASTER, dtype={"node_id": str}))
+    regions = nodes[SHARD_COLUMN].dropna().unique().tolist()
     print(f"✔ GIAI ĐOẠN 5 (tối ưu) – regions: {regions}")
+    print(f"  - Chế độ ma trận: mode={mode}, primary={primary}, workers={workers}, engine={engine}")
+    if storage == "knn":
+        print(f"  - Lưu dạng thưa: k={k} láng giềng / source")
 
+    # 1-4. Đọc dữ liệu + build graph cho từng region
+    prepared, fingerprints, patched, region_edges = {}, {}, {}, {}
     for region in regions:
         print(f"\n=== REGION {region} ===")
-
-        # 1. Node trong region
-        nodes_region_df = nodes[nodes["region_id"] == region].copy()
-        if nodes_region_df.empty:
-            print("  ⚠ Không có node, skip.")
-            continue
-
-        # 2. Active nodes = depot + customer
-        if "node_type" in nodes_region_df.columns:
-            active_df = nodes_region_df[
-                nodes_region_df["node_type"].isin(["depot", "customer"])
-            ].copy()
-        else:
-            # fallback: nếu thiếu cột node_type thì xem mọi node đều là active
-            active_df = nodes_region_df.copy()
-
-        active_nodes = active_df["node_id"].tolist()
-        if len(active_nodes) == 0:
-            print("  ⚠ Region không có depot/customer, skip.")
+        result = _prepare_region(nodes, region)
+        if result is None:
             continue
-
-        print(f"  - Tổng node trong region: {len(nodes_region_df)}")
-        print(f"  - Active nodes (depot + customer): {len(active_nodes)}")
-
-        # 3. Đọc edges_{region}.csv để build graph
-        edges_path = DATA_PROCESSED / f"edges_{region}.csv"
-        if not edges_path.exists():
-            print(f"  ⚠ Không có {edges_path}, skip.")
-            continue
-
-        edges_region = pd.read_csv(edges_path)
-        if edges_region.empty:
-            print("  ⚠ edges rỗng, skip.")
-            continue
-
-        # 4. Build adjacency list cho distance & time
-        all_nodes_in_edges = set(edges_region["origin_id"]).union(
-            set(edges_region["destination_id"])
+        graph, active_nodes, active_df, edges_region = result
+        fingerprints[region] = region_fingerprint(
+            active_df, edges_region, graph, mode, primary
         )
-        adjacency_dist = {n: [] for n in all_nodes_in_edges}
-        adjacency_time = {n: [] for n in all_nodes_in_edges}
-
-        for _, row in edges_region.iterrows():
-            u = row["origin_id"]
-            v = row["destination_id"]
-            d = row.get("distance_km", None)
-            t = row.get("travel_time_min", None)
-
-            if pd.isna(d) or pd.isna(t):
-                continue
 
-            # đảm bảo node nằm trong graph
-            if u not in adjacency_dist or v not in adjacency_dist:
-                continue
-
-            adjacency_dist[u].append((v, float(d)))
-            adjacency_time[u].append((v, float(t)))
-
-        # 5. Chuẩn bị ma trận cho active_nodes
-        dist_matrix = pd.DataFrame(
-            index=active_nodes, columns=active_nodes, dtype=float
-        )
-        time_matrix = pd.DataFrame(
-            index=active_nodes, columns=active_nodes, dtype=float
-        )
-
-        # 6. Chạy Dijkstra CHỈ TỪ active_nodes
-        total_sources = len(active_nodes)
-        for idx, src in enumerate(active_nodes, start=1):
-            if idx % 50 == 1 or idx == total_sources:
-                print(f"  · Dijkstra {idx}/{total_sources} từ node {src}")
-
-            dist_res = _dijkstra_source_to_all(adjacency_dist, src)
-            time_res = _dijkstra_source_to_all(adjacency_time, src)
-
-            for dst in active_nodes:
-                d_val = dist_res.get(dst, inf)
-                t_val = time_res.get(dst, inf)
-                dist_matrix.loc[src, dst] = None if d_val == inf else d_val
-                time_matrix.loc[src, dst] = None if t_val == inf else t_val
-
-        # 7. Lưu ma trận theo region
-        dist_path = DATA_PROCESSED / f"distance_matrix_{region}.csv"
-        time_path = DATA_PROCESSED / f"time_matrix_{region}.csv"
+        # Incremental: vá ma trận cũ nếu graph cũ không đổi
+        if incremental and region_matrices_exist(region):
+            plan, reason = plan_region_update(
+                load_region_state(region), fingerprints[region], edges_region
+            )
+            if plan is not None:
+                print(
+                    f"  - Incremental: {len(plan['patch_nodes'])} node mới/đổi, "
+                    f"{len(plan['via_nodes'])} node graph mới"
+                )
+                with track(f"Stage 5 – vá region {region}", stage=5, region=region, step="patch",
+                           rows_in=len(edges_region), patched_nodes=len(plan["patch_nodes"])):
+                    patched[region] = patch_region_matrices(
+                        graph, active_nodes, load_region_matrices(region),
+                        plan, mode, primary,
+                    )
+            else:
+                print(f"  - Tính lại toàn bộ region: {reason}")
+
+        prepared[region] = (graph, active_nodes)
+        region_edges[region] = edges_region
+
+    if not prepared:
+        print("⚠ Không có region nào đủ dữ liệu để tính ma trận.")
+        return
 
-        dist_matrix.to_csv(dist_path)
-        time_matrix.to_csv(time_path)
+    # 5-6. Dijkstra cho region cần tính lại toàn bộ:
+    #      song song trên tất cả region, hoặc tuần tự từng region
+    buffers = dict(patched)
+    full = {r: v for r, v in prepared.items() if r not in patched}
+    if workers > 1 and full and not (engine == "ch" and storage == "dense"):
+        print(f"\n=== DIJKSTRA SONG SONG ({workers} workers) ===")
+        with track(f"Stage 5 – Dijkstra {len(full)} regions", stage=5, workers=workers) as stats:
+            if storage == "knn":
+                buffers.update(_compute_knn_parallel(
+                    full, mode, primary, workers, k, MATRIX_KNN_RADIUS
+                ))
+            else:
+                buffers.update(_compute_matrices_parallel(full, mode, primary, workers, stats=stats))
+
+    for region, (graph, active_nodes) in prepared.items():
+        print(f"\n=== REGION {region} – MA TRẬN ===")
+        if storage == "knn":
+            with track(f"Stage 5 – region {region} (knn)", stage=5, region=region,
+                       rows_in=len(region_edges[region])) as stats:
+                if region in buffers:
+                    indptr, indices, dist_vals, time_vals = buffers.pop(region)
+                else:
+                    indptr, indices, dist_vals, time_vals = _compute_region_knn(
+                        graph, active_nodes, mode, primary, k, MATRIX_KNN_RADIUS
+                    )
+                paths = save_region_knn(
+                    region, active_nodes, indptr, indices, dist_vals, time_vals, mode, primary
+                )
+                stats["rows_out"] = len(indices)
+                print(
+                    f"  → Saved knn_matrix_{region}.npz ({len(indices)} cặp, "
+                    f"{paths['knn'].stat().st_size / 1024 ** 2:.1f} MB) tại {paths['knn']}"
+                )
+            continue
 
-        print(f"  → Saved distance_matrix_{region}.csv tại {dist_path}")
-        print(f"  → Saved time_matrix_{region}.csv tại {time_path}")
+        with track(f"Stage 5 – region {region}", stage=5, region=region,
+                   rows_in=len(region_edges[region])) as stats:
+            if region in buffers:
+                dist_buf, time_buf = buffers.pop(region)
+            elif engine == "ch":
+                hierarchies = region_hierarchies(region, region_edges.pop(region), mode, primary)
+                dist_buf, time_buf = hierarchy_table(hierarchies, active_nodes, active_nodes)
+            else:
+                # Dijkstra nhiều nguồn CHỈ TỪ active_nodes, ghi thẳng vào buffer
+                dist_buf, time_buf = _compute_region_matrices(
+                    graph, active_nodes, mode=mode, primary=primary, stats=stats
+                )
+            stats["rows_out"] = int(dist_buf.size)
+
+            # 7. Lưu ma trận theo region (.npy + sidecar node, CSV nếu bật)
+            paths = save_region_matrices(
+                region, active_nodes, dist_buf, time_buf, write_csv=write_csv
+            )
+            save_region_state(region, fingerprints[region])
+            print(f"  → Saved distance_matrix_{region}.npy tại {paths['distance']}")
+            print(f"  → Saved time_matrix_{region}.npy tại {paths['time']}")
+            if write_csv:
+                print(f"  → Saved bản CSV: {paths['distance_csv'].name}, {paths['time_csv'].name}")
 
     print("\n===== HOÀN TẤT GIAI ĐOẠN 5 (TỐI ƯU) =====")
 
@@ -217,9 +664,9 @@ def export_ga_ready_data():
     Đầu vào:
         - nodes_master.csv
         - vehicles_clean.csv
-        - edges_{region}.csv
-        - distance_matrix_{region}.csv
-        - time_matrix_{region}.csv
+        - edges_{region}.npz
+        - distance_matrix_{region}.npy / time_matrix_{region}.npy
+          + matrix_nodes_{region}.csv (hoặc bản CSV N x N cũ, hoặc knn_matrix_{region}.npz)
 
     Đầu ra cho mỗi region (có ma trận):
         - nodes_final_{region}.csv
@@ -233,99 +680,111 @@ def export_ga_ready_data():
             + distance_km, travel_time_min
             + traffic_level, road_restrictions
         - vehicles_{region}.csv
-            + các xe có region_id = region
+            + các xe có region_id = region (shard: các xe có start depot thuộc shard)
         - giữ nguyên:
-            + distance_matrix_{region}.csv
-            + time_matrix_{region}.csv
+            + distance_matrix_{region}.npy, time_matrix_{region}.npy
+            + matrix_nodes_{region}.csv
     """
 
-    nodes = pd.read_csv(NODES_MASTER)
+    nodes = pd.read_csv(NODES_MASTER, dtype={"node_id": str})
     vehicles = pd.read_csv(VEHICLES_CLEAN)
 
-    regions = nodes["region_id"].dropna().unique().tolist()
+    nodes = attach_shards(nodes)
+    column = SHARD_COLUMN
+    regions = nodes[column].dropna().unique().tolist()
     print(f"✔ GIAI ĐOẠN 6 – Regions: {regions}")
 
+    # đơn vị của xe = đơn vị (region / shard) của start depot
+    vehicle_unit = None
+    if "region_id" in vehicles.columns:
+        vehicle_unit = vehicles["region_id"]
+        if "start_depot_id" in vehicles.columns:
+            depot_unit = nodes[nodes["node_type"] == "depot"].set_index("node_id")[column]
+            vehicle_unit = vehicles["start_depot_id"].map(depot_unit).fillna(vehicle_unit)
+
     for region in regions:
         print(f"\n=== REGION {region} (GA-READY) ===")
 
-        dist_path = DATA_PROCESSED / f"distance_matrix_{region}.csv"
-        time_path = DATA_PROCESSED / f"time_matrix_{region}.csv"
-        edges_path = DATA_PROCESSED / f"edges_{region}.csv"
+        edges_path = region_file(EDGES_REGION, region)
 
-        if not dist_path.exists() or not time_path.exists():
+        if not (region_matrices_exist(region) or region_knn_exists(region)):
             print("  ⚠ Không thấy distance/time matrix, region này chưa được tính Stage 5. Skip.")
             continue
 
-        if not edges_path.exists():
-            print(f"  ⚠ Không có edges_{region}.csv, skip.")
+        if not edge_table_exists(edges_path):
+            print(f"  ⚠ Không có {edges_path.name}, skip.")
             continue
 
-        # 1. Đọc ma trận để lấy THỨ TỰ node dùng cho GA
-        dist_mat = pd.read_csv(dist_path, index_col=0)
-        node_ids_order = list(dist_mat.index)  # thứ tự node trong matrix
-
-        # 2. Mapping node_id -> node_index
-        id_to_index = {nid: idx for idx, nid in enumerate(node_ids_order)}
-
-        # 3. nodes_final_{region}.csv
-        nodes_region = nodes[nodes["node_id"].isin(node_ids_order)].copy()
-        nodes_region["node_index"] = nodes_region["node_id"].map(id_to_index)
-        nodes_region = nodes_region.sort_values("node_index")
-
-        node_cols = [
-            "node_index",
-            "node_id",
-            "node_type",
-            "lat",
-            "lon",
-            "city",
-            "region_id",
-        ]
-        for col in node_cols:
-            if col not in nodes_region.columns:
-                nodes_region[col] = None
-
-        nodes_final_path = DATA_PROCESSED / f"nodes_final_{region}.csv"
-        nodes_region[node_cols].to_csv(nodes_final_path, index=False)
-        print(f"  → nodes_final_{region}.csv: {nodes_final_path}")
-
-        # 4. edges_final_{region}.csv
-        edges_region = pd.read_csv(edges_path)
-        edges_region["origin_index"] = edges_region["origin_id"].map(id_to_index)
-        edges_region["destination_index"] = edges_region["destination_id"].map(id_to_index)
-
-        edges_region = edges_region.dropna(subset=["origin_index", "destination_index"])
-        edges_region["origin_index"] = edges_region["origin_index"].astype(int)
-        edges_region["destination_index"] = edges_region["destination_index"].astype(int)
-
-        edges_final_cols = [
-            "origin_index",
-            "destination_index",
-            "origin_id",
-            "destination_id",
-            "distance_km",
-            "travel_time_min",
-            "traffic_level",
-            "road_restrictions",
-        ]
-        for col in edges_final_cols:
-            if col not in edges_region.columns:
-                edges_region[col] = None
-
-        edges_final_path = DATA_PROCESSED / f"edges_final_{region}.csv"
-        edges_region[edges_final_cols].to_csv(edges_final_path, index=False)
-        print(f"  → edges_final_{region}.csv: {edges_final_path}")
-
-        # 5. vehicles_{region}.csv
-        if "region_id" in vehicles.columns:
-            vehicles_region = vehicles[vehicles["region_id"] == region].copy()
-        else:
-            vehicles_region = vehicles.copy()
-            vehicles_region["region_id"] = None
-
-        vehicles_path = DATA_PROCESSED / f"vehicles_{region}.csv"
-        vehicles_region.to_csv(vehicles_path, index=False)
-        print(f"  → vehicles_{region}.csv: {vehicles_path}")
+        with track(f"Stage 6 – region {region}", stage=6, region=region) as stats:
+            # 1. Lấy THỨ TỰ node dùng cho GA (sidecar của ma trận, không đọc cả ma trận)
+            node_ids_order = load_matrix_nodes(region)
+
+            # 2. Mapping node_id -> node_index
+            id_to_index = {nid: idx for idx, nid in enumerate(node_ids_order)}
+
+            # 3. nodes_final_{region}.csv
+            nodes_region = nodes[nodes["node_id"].isin(node_ids_order)].copy()
+            nodes_region["node_index"] = nodes_region["node_id"].map(id_to_index)
+            nodes_region = nodes_region.sort_values("node_index")
+
+            node_cols = [
+                "node_index",
+                "node_id",
+                "node_type",
+                "lat",
+                "lon",
+                "city",
+                "region_id",
+            ]
+            for col in node_cols:
+                if col not in nodes_region.columns:
+                    nodes_region[col] = None
+
+            nodes_final_path = region_file(NODES_FINAL, region)
+            nodes_region[node_cols].to_csv(nodes_final_path, index=False)
+            print(f"  → nodes_final_{region}.csv: {nodes_final_path}")
+
+            # 4. edges_final_{region}.csv (mã node -> node_index: tra mảng theo từ điển node)
+            edges_region = load_edge_table(edges_path)
+            stats["rows_in"] = len(edges_region)
+            vocab, origin, destination = node_codes(edges_region)
+            vocab_index = pd.Index(node_ids_order).get_indexer(vocab)
+            edges_region["origin_index"] = vocab_index[origin]
+            edges_region["destination_index"] = vocab_index[destination]
+
+            edges_region = edges_region[
+                (edges_region["origin_index"] >= 0) & (edges_region["destination_index"] >= 0)
+            ]
+
+            edges_final_cols = [
+                "origin_index",
+                "destination_index",
+                "origin_id",
+                "destination_id",
+                "distance_km",
+                "travel_time_min",
+                "traffic_level",
+                "road_restrictions",
+            ]
+            for col in edges_final_cols:
+                if col not in edges_region.columns:
+                    edges_region[col] = None
+
+            edges_final_path = region_file(EDGES_FINAL, region)
+            edges_region[edges_final_cols].to_csv(edges_final_path, index=False)
+            print(f"  → edges_final_{region}.csv: {edges_final_path}")
+
+            # 5. vehicles_{region}.csv
+            if vehicle_unit is not None:
+                vehicles_region = vehicles[vehicle_unit == region].copy()
+            else:
+                vehicles_region = vehicles.copy()
+                vehicles_region["region_id"] = None
+
+            vehicles_path = region_file(VEHICLES_REGION, region)
+            vehicles_region.to_csv(vehicles_path, index=False)
+            print(f"  → vehicles_{region}.csv: {vehicles_path}")
+            stats["rows_out"] = len(nodes_region) + len(edges_region) + len(vehicles_region)
 
     print("\n===== HOÀN TẤT GIAI ĐOẠN 6 – EXPORT GA-READY DATA =====")
 
@@ -1,8 +1,11 @@
 # src/preprocessing/build_road_graph.py
 
-import pandas as pd
+import multiprocessing as mp
+import os
 from pathlib import Path
 
+import pandas as pd
+
 from src.utils.config import (
     DATA_RAW,
     CUSTOMERS_CLEAN,
@@ -10,22 +13,12 @@ from src.utils.config import (
     NODES_MASTER,
     EDGES_MASTER,
     DATA_PROCESSED,
+    ROADS_CHUNKSIZE,
+    ROADS_WORKERS,
+    EXPORT_EDGES_CSV,
 )
-
-
-# =======================
-#  HÀM HỖ TRỢ
-# =======================
-
-def parse_number(x):
-    """Chuyển về float, xử lý luôn trường hợp có dấu phẩy."""
-    if pd.isna(x):
-        return None
-    s = str(x).strip().replace(",", ".")
-    try:
-        return float(s)
-    except ValueError:
-        return None
+from src.preprocessing.edge_store import save_edge_table, to_edge_table
+from src.utils.parsing import parse_number
 
 
 # =======================
@@ -101,37 +94,53 @@ def build_nodes():
 #  GIAI ĐOẠN 3: BUILD EDGES (ROADS)
 # =======================
 
-def _load_single_roads_file(path: Path, valid_nodes: set) -> pd.DataFrame:
+ROAD_COLUMNS = {
+    "Origin_Node_ID": "origin_id",
+    "Destination_Node_ID": "destination_id",
+    "Distance_km": "distance_km",
+    "Travel_Time_min": "travel_time_min",
+    "Traffic_Level": "traffic_level",
+    "Road_Restrictions": "road_restrictions",
+}
+# id / text đọc thẳng dạng str; distance/time để pandas tự nhận
+# (cột có dấu phẩy thập phân sẽ là object, parse_number xử lý sau)
+ROAD_DTYPES = {
+    "Origin_Node_ID": str,
+    "Destination_Node_ID": str,
+    "Traffic_Level": str,
+    "Road_Restrictions": str,
+}
+EDGE_KEY = ["origin_id", "destination_id"]
+EDGE_OUTPUT_COLUMNS = [
+    "origin_id", "destination_id",
+    "distance_km", "travel_time_min",
+    "traffic_level", "road_restrictions",
+    "source_file",
+]
+# Thứ tự ưu tiên khi trùng (origin, destination): distance, time nhỏ nhất,
+# hoà thì giữ edge xuất hiện trước theo thứ tự gộp của bản cũ:
+# (edge gốc trước edge đảo chiều, file trước, dòng trước)
+_SORT_KEYS = EDGE_KEY + ["distance_km", "travel_time_min", "_reverse", "_file", "_row"]
+
+# valid_nodes cho worker (set 1 lần qua initializer, fork -> không pickle lại)
+_WORKER_VALID_NODES = set()
+
+
+def _clean_roads_chunk(df: pd.DataFrame, valid_nodes: set) -> pd.DataFrame:
     """
-    Đọc một file roads_*.csv, chuẩn hoá cột và làm sạch cơ bản.
+    Chuẩn hoá cột và làm sạch cơ bản 1 khối dòng của file roads_*.csv.
     Chỉ giữ những dòng có origin & destination nằm trong tập valid_nodes.
     """
-    df = pd.read_csv(path)
-
     # chuẩn tên cột, bỏ khoảng trắng dư
     df.columns = [c.strip() for c in df.columns]
 
-    # đổi tên cột về chuẩn
-    df = df.rename(columns={
-        "Origin_Node_ID": "origin_id",
-        "Destination_Node_ID": "destination_id",
-        "Distance_km": "distance_km",
-        "Travel_Time_min": "travel_time_min",
-        "Traffic_Level": "traffic_level",
-        "Road_Restrictions": "road_restrictions",
-    })
-
-    # giữ các cột quan trọng
-    keep_cols = [
-        "origin_id", "destination_id",
-        "distance_km", "travel_time_min",
-        "traffic_level", "road_restrictions",
-    ]
-    df = df[keep_cols]
+    # đổi tên cột về chuẩn + giữ các cột quan trọng
+    df = df.rename(columns=ROAD_COLUMNS)
+    df = df[list(ROAD_COLUMNS.values())].copy()
 
     # ép kiểu số
-    df["distance_km"] = df["distance_km"].apply(parse_number)
-    df["travel_time_min"] = df["travel_time_min"].apply(parse_number)
+    df["distance_km"] = parse_number(df["distance_km"])
+    df["travel_time_min"] = parse_number(df["travel_time_min"])
 
     # bỏ dòng thiếu id hoặc số <= 0
     df = df.dropna(subset=["origin_id", "destination_id",
@@ -146,26 +155,117 @@ def _load_single_roads_file(path: Path, valid_nodes: set) -> pd.DataFrame:
     df["traffic_level"] = df["traffic_level"].fillna("Unknown")
     df["road_restrictions"] = df["road_restrictions"].fillna("None")
 
-    # thêm cột ghi lại nguồn gốc file (để debug nếu cần)
-    df["source_file"] = path.name
-
     return df
 
 
-def build_edges():
+def _with_reverse_edges(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Thêm edge ngược lại cho đường hai chiều.
+    Quy ước: nếu road_restrictions chứa 'One-Way' (không phân biệt hoa thường)
+    thì xem là một chiều, ngược lại là hai chiều.
+    """
+    mask_two_way = ~df["road_restrictions"].str.contains(
+        "one-way", case=False, na=False
+    )
+    # đảo origin <-> destination
+    reverse = df[mask_two_way].rename(
+        columns={"origin_id": "destination_id",
+                 "destination_id": "origin_id"}
+    )
+    reverse["_reverse"] = 1
+    return pd.concat([df, reverse], ignore_index=True)
+
+
+def _reduce_min_edges(df: pd.DataFrame) -> pd.DataFrame:
+    """Mỗi (origin_id, destination_id) chỉ giữ 1 edge: distance_km (rồi time) nhỏ nhất."""
+    df = df.sort_values(by=_SORT_KEYS, kind="stable")
+    return df.drop_duplicates(subset=EDGE_KEY, keep="first")
+
+
+class _MinEdgeAccumulator:
+    """
+    Gộp dần các khối edge đã rút gọn.
+    Chỉ rút gọn lại khi phần chờ gộp >= phần đã gộp (chi phí khấu hao tuyến tính),
+    nên bộ nhớ tối đa ~2 x số edge duy nhất + 1 khối.
+    """
+
+    def __init__(self, min_batch: int = 0):
+        self.reduced = None
+        self.pending = []
+        self.pending_rows = 0
+        self.min_batch = min_batch
+
+    def add(self, df: pd.DataFrame):
+        if df is None or df.empty:
+            return
+        self.pending.append(df)
+        self.pending_rows += len(df)
+        done_rows = 0 if self.reduced is None else len(self.reduced)
+        if self.pending_rows >= max(done_rows, self.min_batch):
+            self._compact()
+
+    def _compact(self):
+        parts = ([] if self.reduced is None else [self.reduced]) + self.pending
+        if parts:
+            self.reduced = _reduce_min_edges(pd.concat(parts, ignore_index=True))
+        self.pending = []
+        self.pending_rows = 0
+
+    def result(self):
+        self._compact()
+        return self.reduced
+
+
+def _stream_roads_file(path: Path, file_order: int, valid_nodes: set, chunksize: int):
+    """
+    Đọc 1 file roads theo từng khối chunksize dòng (dtype cố định).
+    Mỗi khối: làm sạch, lọc valid_nodes, thêm edge ngược, rút gọn về min theo
+    (origin, destination) rồi gộp vào kết quả của file
+    -> bộ nhớ tỉ lệ với số edge duy nhất, không phải số dòng thô.
+    """
+    acc = _MinEdgeAccumulator()
+    for chunk in pd.read_csv(path, dtype=ROAD_DTYPES, chunksize=chunksize):
+        # index của khối = số dòng trong file (RangeIndex chạy tiếp giữa các khối)
+        chunk = _clean_roads_chunk(chunk, valid_nodes)
+        if chunk.empty:
+            continue
+        chunk["_reverse"] = 0
+        chunk["_file"] = file_order
+        chunk["_row"] = chunk.index.to_numpy()
+        acc.add(_reduce_min_edges(_with_reverse_edges(chunk)))
+    return acc.result()
+
+
+def _init_roads_worker(valid_nodes: set):
+    global _WORKER_VALID_NODES
+    _WORKER_VALID_NODES = valid_nodes
+
+
+def _stream_roads_task(task):
+    path, file_order, chunksize = task
+    return path, _stream_roads_file(path, file_order, _WORKER_VALID_NODES, chunksize)
+
+
+def build_edges(workers: int = None, chunksize: int = None):
     """
     GIAI ĐOẠN 3 – Tiền xử lý toàn bộ mạng lưới đường.
 
     - Duyệt qua tất cả folder roads_* trong data_raw/
-    - Đọc từng file .csv, chuẩn hoá cột, làm sạch distance/time
+    - Đọc từng file .csv THEO KHỐI (chunksize dòng), chuẩn hoá cột, làm sạch distance/time
     - Giữ lại chỉ những edge nối giữa các node có trong nodes_master.csv
     - Nếu đường KHÔNG phải One-Way -> tạo thêm edge ngược lại (hai chiều)
-    - Loại bỏ edge trùng (origin, destination giống nhau) – giữ edge ngắn nhất
-    - Ghi ra edges_master.csv
+    - Loại bỏ edge trùng (origin, destination giống nhau) – giữ edge ngắn nhất,
+      làm ngay trên từng khối nên bộ nhớ chỉ phụ thuộc số edge duy nhất
+    - workers > 1: đọc nhiều file song song (process pool)
+    - Ghi ra edges_master.npz (bảng có kiểu, mã node theo thứ tự nodes_master;
+      EXPORT_EDGES_CSV -> thêm bản edges_master.csv)
     """
+    workers = ROADS_WORKERS if workers is None else workers
+    workers = max(1, int(workers or os.cpu_count() or 1))
+    chunksize = chunksize or ROADS_CHUNKSIZE
 
     # 0. Đọc danh sách node hợp lệ
-    nodes = pd.read_csv(NODES_MASTER)
+    nodes = pd.read_csv(NODES_MASTER, dtype={"node_id": str})
     valid_nodes = set(nodes["node_id"].unique())
 
     # 1. Tìm tất cả file roads_*.csv trong data_raw/
@@ -178,55 +278,52 @@ def build_edges():
         print("⚠ Không tìm thấy file roads_*.csv trong data_raw/")
         return
 
-    print(f"👉 Tìm thấy {len(road_files)} file roads .csv")
-
-    # 2. Đọc và làm sạch từng file
-    all_edges = []
-    for fp in road_files:
-        df = _load_single_roads_file(fp, valid_nodes)
-        if not df.empty:
-            all_edges.append(df)
-        else:
-            print(f"  - File {fp.name}: không có edge hợp lệ, bỏ qua.")
-
-    if not all_edges:
+    print(f"👉 Tìm thấy {len(road_files)} file roads .csv "
+          f"(chunksize={chunksize}, workers={workers})")
+
+    # 2-4. Đọc + làm sạch + nhân hai chiều + loại trùng theo từng khối / từng file
+    tasks = [(fp, order, chunksize) for order, fp in enumerate(road_files)]
+    if workers > 1:
+        methods = mp.get_all_start_methods()
+        ctx = mp.get_context("fork" if "fork" in methods else None)
+        pool = ctx.Pool(workers, initializer=_init_roads_worker, initargs=(valid_nodes,))
+        results = pool.imap(_stream_roads_task, tasks)
+    else:
+        pool = None
+        results = (
+            (fp, _stream_roads_file(fp, order, valid_nodes, size))
+            for fp, order, size in tasks
+        )
+
+    acc = _MinEdgeAccumulator(min_batch=chunksize)
+    try:
+        for fp, reduced in results:
+            if reduced is None or reduced.empty:
+                print(f"  - File {fp.name}: không có edge hợp lệ, bỏ qua.")
+                continue
+            acc.add(reduced)
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+    edges_full = acc.result()
+    if edges_full is None:
         print("⚠ Không có edge nào sau khi làm sạch.")
         return
 
-    edges = pd.concat(all_edges, ignore_index=True)
-
-    # 3. Tạo thêm edge ngược lại cho đường hai chiều
-    #    Quy ước: nếu road_restrictions chứa 'One-Way' (không phân biệt hoa thường)
-    #    thì xem là một chiều, ngược lại là hai chiều.
-    mask_two_way = ~edges["road_restrictions"].str.contains(
-        "one-way", case=False, na=False
-    )
-    edges_two_way = edges[mask_two_way].copy()
-    # đảo origin <-> destination
-    edges_two_way = edges_two_way.rename(
-        columns={"origin_id": "destination_id",
-                 "destination_id": "origin_id"}
-    )
-
-    # gộp edge gốc + edge đảo chiều
-    edges_full = pd.concat([edges, edges_two_way], ignore_index=True)
-
-    # 4. Loại bỏ trùng: nếu (origin_id, destination_id) trùng nhau
-    #    giữ edge có distance_km nhỏ nhất
-    edges_full.sort_values(
-        by=["origin_id", "destination_id", "distance_km", "travel_time_min"],
-        inplace=True,
-    )
-    edges_full = edges_full.drop_duplicates(
-        subset=["origin_id", "destination_id"],
-        keep="first",
-    )
+    # cột ghi lại nguồn gốc file (để debug nếu cần): trong lúc gộp chỉ giữ
+    # số thứ tự file (_file) cho nhẹ bộ nhớ, gắn tên file ở bước cuối
+    file_names = pd.Series([fp.name for fp in road_files])
+    edges_full["source_file"] = file_names.to_numpy()[edges_full["_file"].to_numpy()]
+    edges_full = edges_full[EDGE_OUTPUT_COLUMNS]
 
-    # 5. Lưu edges_master.csv
+    # 5. Lưu edges_master.npz (bảng có kiểu)
     DATA_PROCESSED.mkdir(exist_ok=True)
-    edges_full.to_csv(EDGES_MASTER, index=False)
+    table = to_edge_table(edges_full, node_ids=nodes["node_id"])
+    save_edge_table(table, EDGES_MASTER, write_csv=EXPORT_EDGES_CSV)
 
-    print("✔ GIAI ĐOẠN 3: Build edges_master.csv DONE")
+    print("✔ GIAI ĐOẠN 3: Build edges_master DONE")
     print(f"  - Số edges (sau khi nhân hai chiều + loại trùng): {len(edges_full)}")
     print(f"  → Đã lưu tại: {EDGES_MASTER}")
 
@@ -0,0 +1,497 @@
+# src/preprocessing/contraction.py
+"""
+Contraction hierarchies (CH) cho graph của 1 region.
+
+Graph đường theo region chỉ đổi khi dữ liệu roads đổi, nên thứ tự contract + các
+shortcut được tính 1 lần, lưu cạnh file edges (ch_{region}_{weight}.npz), và chỉ
+build lại khi nội dung edges_{region} đổi (so hash cạnh).
+
+Truy vấn many-to-many theo bucket:
+    - backward search "đi lên" từ mỗi target t -> bucket[v] += (t, d(v, t))
+    - forward search "đi lên" từ mỗi source s, với mỗi v đã gặp:
+      d(s, t) = min_v d(s, v) + d(v, t) trên các (t, .) trong bucket[v]
+Không gian tìm kiếm đi lên rất nhỏ (vài chục node) so với Dijkstra cả graph. Hai
+search chạy bằng scipy Dijkstra trên graph đi lên (RegionGraph), phần ghép bucket
+vector hoá theo từng node v.
+"""
+
+import hashlib
+import heapq
+import math
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from src.preprocessing.graph_engine import (
+    EDGE_COLUMNS,
+    WEIGHTS,
+    RegionGraph,
+    TIE_RTOL,
+    as_matrix_dtype,
+    build_region_graph,
+    lex_improves,
+    shortest_path_pair,
+)
+from src.utils.config import (
+    CH_INDEX,
+    CH_WITNESS_EDGES,
+    DATA_PROCESSED,
+    MATRIX_CHUNK_SIZE,
+    MATRIX_DTYPE,
+)
+
+
+# Bucket có >= 1/_DENSE_BUCKET số target -> lưu dạng mảng dày theo target
+_DENSE_BUCKET = 8
+
+
+def ch_path(region: str, weight: str):
+    """Đường dẫn index CH của region theo trọng số primary (nằm cạnh edges_{region}.npz)."""
+    return DATA_PROCESSED / CH_INDEX.format(region=region, weight=weight)
+
+
+def edges_digest(edges: pd.DataFrame) -> str:
+    """Hash nội dung cạnh (không phụ thuộc thứ tự dòng / định dạng CSV)."""
+    edges = edges.dropna(subset=EDGE_COLUMNS)
+    rows = pd.util.hash_pandas_object(edges[EDGE_COLUMNS], index=False).to_numpy(dtype=np.uint64)
+    return hashlib.blake2b(np.sort(rows).tobytes(), digest_size=16).hexdigest()
+
+
+# ============================================================
+#  INDEX
+# ============================================================
+
+@dataclass
+class ContractionHierarchy:
+    """
+    Index CH theo trọng số `primary` (trọng số kia cộng dọc đúng tuyến, như mode "path").
+
+    - rank[i]: thứ tự contract của node i (node_ids như graph gốc)
+    - up: RegionGraph các cạnh u -> v có rank[v] > rank[u] (cạnh gốc + shortcut)
+    - down: RegionGraph các cạnh v -> u với cạnh gốc/shortcut u -> v, rank[u] > rank[v]
+      (search đi lên từ target trên graph đảo chiều)
+    """
+
+    primary: str
+    digest: str
+    rank: np.ndarray
+    up: RegionGraph
+    down: RegionGraph
+    shortcuts: int = 0
+
+    @property
+    def node_ids(self) -> np.ndarray:
+        return self.up.node_ids
+
+    @property
+    def node_index(self) -> dict:
+        return self.up.node_index
+
+    def _buckets(self, targets: np.ndarray, chunk_size: int):
+        """
+        Search đi lên từ các target -> bucket theo node v.
+
+        Trả về (sparse, dense):
+            - sparse[v] = (vị trí target, primary, secondary) cho bucket nhỏ
+            - dense[v] = (primary, secondary) dạng mảng len(targets) (inf nếu target không gặp v)
+              cho node "hub" mà phần lớn target đều đi qua (vd. depot)
+        """
+        columns, rows, first, second = [], [], [], []
+        for start in range(0, len(targets), chunk_size):
+            block = targets[start:start + chunk_size]
+            best, carried = _upward(self.down, block, self.primary)
+            r, v = np.nonzero(np.isfinite(best))
+            columns.append(v)
+            rows.append(r + start)
+            first.append(best[r, v])
+            second.append(carried[r, v])
+        v = np.concatenate(columns)
+        order = np.argsort(v, kind="stable")
+        v = v[order]
+        rows, first, second = (np.concatenate(a)[order] for a in (rows, first, second))
+
+        starts = np.flatnonzero(np.r_[True, v[1:] != v[:-1]]) if len(v) else np.empty(0, dtype=np.int64)
+        bounds = np.r_[starts, len(v)]
+        sparse, dense = {}, {}
+        for b in range(len(starts)):
+            lo, hi = bounds[b], bounds[b + 1]
+            if (hi - lo) * _DENSE_BUCKET >= len(targets):
+                row_first = np.full(len(targets), np.inf)
+                row_second = np.full(len(targets), np.inf)
+                row_first[rows[lo:hi]] = first[lo:hi]
+                row_second[rows[lo:hi]] = second[lo:hi]
+                dense[int(v[lo])] = (row_first, row_second)
+            else:
+                sparse[int(v[lo])] = (rows[lo:hi], first[lo:hi], second[lo:hi])
+        return sparse, dense
+
+    def table(self, sources, targets, chunk_size: int = None, dtype=MATRIX_DTYPE):
+        """
+        Ma trận (distance, time) len(sources) x len(targets) (chỉ số node), không tới được = inf.
+        Ghép bucket: với mỗi node v, min(ma trận con, d(s, v) + d(v, t)) của các s, t gặp v;
+        secondary đổi theo lex_improves (hoà primary -> secondary nhỏ hơn), primary luôn lấy
+        min như Dijkstra. Bucket hub ghép trên cả block (copyto where=, không gather/scatter).
+        """
+        chunk_size = chunk_size or MATRIX_CHUNK_SIZE
+        sources = np.asarray(sources, dtype=np.int32)
+        targets = np.asarray(targets, dtype=np.int32)
+        sparse, dense = self._buckets(targets, chunk_size)
+
+        first = np.full((len(sources), len(targets)), np.inf)
+        second = np.full((len(sources), len(targets)), np.inf)
+        for start in range(0, len(sources), chunk_size):
+            stop = min(start + chunk_size, len(sources))
+            best, carried = _upward(self.up, sources[start:stop], self.primary)
+            reached = np.isfinite(best)
+            block_first, block_second = first[start:stop], second[start:stop]
+            for v in np.flatnonzero(reached.any(axis=0)).tolist():
+                if v in dense:
+                    down_first, down_second = dense[v]
+                    cand = best[:, v, None] + down_first[None, :]
+                    cand_second = carried[:, v, None] + down_second[None, :]
+                    better = lex_improves(cand, cand_second, block_first, block_second)
+                    np.minimum(block_first, cand, out=block_first)
+                    np.copyto(block_second, cand_second, where=better)
+                    continue
+                bucket = sparse.get(v)
+                if bucket is None:
+                    continue
+                cols, down_first, down_second = bucket
+                rs = np.flatnonzero(reached[:, v])
+                cand = best[rs, v][:, None] + down_first[None, :]
+                cand_second = carried[rs, v][:, None] + down_second[None, :]
+                grid = np.ix_(rs, cols)
+                current, current_second = block_first[grid], block_second[grid]
+                better = lex_improves(cand, cand_second, current, current_second)
+                if not better.any():
+                    continue
+                block_first[grid] = np.minimum(current, cand)
+                block_second[grid] = np.where(better, cand_second, current_second)
+
+        first, second = as_matrix_dtype(first, dtype), as_matrix_dtype(second, dtype)
+        if self.primary == "distance":
+            return first, second
+        return second, first
+
+    def table_ids(self, source_ids, target_ids, chunk_size: int = None, dtype=MATRIX_DTYPE):
+        """
+        Như table nhưng theo node_id. Node không có cạnh nào (không nằm trong index)
+        -> inf, trừ ô của chính nó = 0 (như Dijkstra trên graph Stage 5).
+        """
+        source_ids, target_ids = list(source_ids), list(target_ids)
+        src = np.array([self.node_index.get(x, -1) for x in source_ids], dtype=np.int64)
+        dst = np.array([self.node_index.get(x, -1) for x in target_ids], dtype=np.int64)
+        rs, cs = np.flatnonzero(src >= 0), np.flatnonzero(dst >= 0)
+
+        shape = (len(source_ids), len(target_ids))
+        dist, time = np.full(shape, np.inf, dtype=dtype), np.full(shape, np.inf, dtype=dtype)
+        if len(rs) and len(cs):
+            sub_dist, sub_time = self.table(src[rs], dst[cs], chunk_size, dtype)
+            dist[np.ix_(rs, cs)] = sub_dist
+            time[np.ix_(rs, cs)] = sub_time
+
+        position = {nid: j for j, nid in enumerate(target_ids)}
+        for i, nid in enumerate(source_ids):
+            j = position.get(nid)
+            if j is not None:
+                dist[i, j] = time[i, j] = 0
+        return dist, time
+
+    # ---------- lưu / đọc ----------
+
+    def save(self, path):
+        tmp = path.with_name(path.name + ".tmp")
+        with open(tmp, "wb") as f:
+            np.savez(
+                f,
+                primary=np.array(self.primary),
+                digest=np.array(self.digest),
+                shortcuts=np.array(self.shortcuts),
+                node_ids=self.node_ids.astype(str),
+                rank=self.rank,
+                **{f"up_{k}": v for k, v in _csr_arrays(self.up).items()},
+                **{f"down_{k}": v for k, v in _csr_arrays(self.down).items()},
+            )
+        tmp.replace(path)
+
+    @classmethod
+    def load(cls, path) -> "ContractionHierarchy":
+        with np.load(path, allow_pickle=False) as data:
+            arrays = {key: data[key] for key in data.files}
+        node_ids = arrays["node_ids"].astype(object)
+        node_index = {nid: i for i, nid in enumerate(node_ids)}
+
+        def graph(prefix):
+            return RegionGraph(
+                node_ids=node_ids, node_index=node_index,
+                **{k: arrays[f"{prefix}_{k}"] for k in ("indptr", "indices", "distance", "time")},
+            )
+
+        return cls(
+            str(arrays["primary"]), str(arrays["digest"]), arrays["rank"],
+            graph("up"), graph("down"), int(arrays["shortcuts"]),
+        )
+
+
+def _csr_arrays(graph: RegionGraph) -> dict:
+    return {
+        "indptr": graph.indptr, "indices": graph.indices,
+        "distance": graph.distance, "time": graph.time,
+    }
+
+
+def _upward(graph: RegionGraph, sources: np.ndarray, primary: str):
+    """Dijkstra trên graph đi lên, trả (primary, secondary) float64 dạng (len(sources) x N)."""
+    dist, time = shortest_path_pair(graph, sources, None, primary=primary, mode="path", dtype=np.float64)
+    return (dist, time) if primary == "distance" else (time, dist)
+
+
+# ============================================================
+#  PREPROCESSING (CONTRACT TỪNG NODE)
+# ============================================================
+
+def _lex_less(a1: float, a2: float, b1: float, b2: float) -> bool:
+    """(a1, a2) tốt hơn (b1, b2) theo thứ tự của mode "path" (như graph_engine.lex_improves)."""
+    tol = TIE_RTOL * max(1.0, abs(b1)) if b1 != math.inf else 0.0
+    return a1 < b1 - tol or (a1 <= b1 + tol and a2 < b2)
+
+
+def _tied(a1: float, b1: float) -> bool:
+    return b1 != math.inf and abs(a1 - b1) <= TIE_RTOL * max(1.0, abs(b1))
+
+
+def _merge(via: tuple, existing: tuple) -> tuple:
+    """
+    Cạnh u -> w sau khi có thêm đường qua v: hoà primary -> (min primary, min secondary)
+    như gộp cạnh song song trong build_region_graph (Dijkstra trên graph gốc cũng cho
+    primary nhỏ nhất + secondary nhỏ nhất trong các đường hoà); không hoà -> cặp tốt hơn.
+    """
+    if _tied(via[0], existing[0]):
+        return min(via[0], existing[0]), min(via[1], existing[1])
+    return via if via[0] < existing[0] else existing
+
+
+def _dominates(witness: tuple, via: tuple) -> bool:
+    """Witness thay được đường qua v: primary không dài hơn, hoà thì secondary không lớn hơn."""
+    if witness[0] > via[0]:
+        return False
+    return not _tied(witness[0], via[0]) or witness[1] <= via[1]
+
+
+def _witness(out: list, source: int, skip: int, goals: set, limit: float, max_edges: int) -> dict:
+    """
+    Dijkstra cục bộ từ source không đi qua `skip` trên cặp (primary, secondary), dừng khi
+    đã settle mọi goal, nhãn vượt limit, hoặc đã duyệt quá max_edges cạnh. Trả về nhãn
+    đã biết (nhãn tạm cũng là 1 đường thật); goal không có nhãn tốt bằng via -> thêm
+    shortcut (vẫn đúng, chỉ thừa cạnh). Nhãn hoà primary nhưng secondary nhỏ hơn vẫn
+    được duyệt lại (label-correcting) để shortcut giữ đúng tie-break của Dijkstra.
+    """
+    best = {source: (0.0, 0.0)}
+    remaining = set(goals)
+    heap = [(0.0, 0.0, source)]
+    budget = max_edges
+    stop = limit + TIE_RTOL * max(1.0, limit)
+    while heap and remaining:
+        g, c, u = heapq.heappop(heap)
+        if best[u] != (g, c):
+            continue  # nhãn cũ, đã có nhãn tốt hơn
+        if g > stop:
+            break
+        remaining.discard(u)
+        edges = out[u]
+        budget -= len(edges)
+        if budget < 0:
+            break  # node hub (depot nối hàng nghìn khách): không đáng duyệt hết
+        for w, (weight, other) in edges.items():
+            if w == skip:
+                continue
+            g_w, c_w = g + weight, c + other
+            if _lex_less(g_w, c_w, *best.get(w, (math.inf, math.inf))):
+                best[w] = (g_w, c_w)
+                heapq.heappush(heap, (g_w, c_w, w))
+    return best
+
+
+def _priority(v: int, out: list, inn: list, contracted_neighbours: list) -> float:
+    """Edge difference (ước lượng: cặp chưa có cạnh trực tiếp) + số láng giềng đã contract."""
+    n_in, n_out = len(inn[v]), len(out[v])
+    if n_in * n_out > 4096:
+        missing = n_in * n_out  # node hub (depot): để contract sau cùng, không đếm từng cặp
+    else:
+        missing = sum(
+            1 for u in inn[v] for w in out[v] if w != u and w not in out[u]
+        )
+    return missing - n_in - n_out + contracted_neighbours[v]
+
+
+def build_contraction_hierarchy(
+    graph: RegionGraph,
+    primary: str = "distance",
+    digest: str = "",
+    witness_edges: int = None,
+) -> ContractionHierarchy:
+    """
+    Contract lần lượt các node theo edge difference (cập nhật lazy).
+
+    Contract v: với mỗi cặp u -> v -> w còn lại, nếu u -> w đã có cạnh thì chỉ hạ trọng
+    số khi đi qua v tốt hơn; chưa có thì witness search (giới hạn witness_edges cạnh)
+    tìm đường khác không qua v, không thấy đường tốt bằng (_dominates) thì thêm shortcut.
+    So sánh theo cặp (primary, secondary) với tie-break như Dijkstra, secondary cộng dọc
+    shortcut nên bảng CH trùng ma trận mode "path" của Stage 5.
+    """
+    if primary not in WEIGHTS:
+        raise ValueError(f"primary phải là một trong {list(WEIGHTS)}, nhận: {primary}")
+    witness_edges = witness_edges or CH_WITNESS_EDGES
+    secondary = "time" if primary == "distance" else "distance"
+    n = graph.num_nodes
+
+    out = [dict() for _ in range(n)]
+    inn = [dict() for _ in range(n)]
+    tails = np.repeat(np.arange(n), np.diff(graph.indptr)).tolist()
+    for u, w, a, b in zip(
+        tails, graph.indices.tolist(),
+        graph.weights(primary).tolist(), graph.weights(secondary).tolist(),
+    ):
+        if u != w:
+            out[u][w] = inn[w][u] = (a, b)
+
+    contracted_neighbours = [0] * n
+    heap = [(_priority(v, out, inn, contracted_neighbours), v) for v in range(n)]
+    heapq.heapify(heap)
+    rank = np.full(n, -1, dtype=np.int64)
+    up_edges, down_edges = [], []
+    shortcuts = 0
+    level = 0
+
+    while heap:
+        prio, v = heapq.heappop(heap)
+        if rank[v] >= 0:
+            continue
+        current = _priority(v, out, inn, contracted_neighbours)
+        if heap and current > heap[0][0]:
+            heapq.heappush(heap, (current, v))
+            continue
+
+        # thêm / hạ shortcut u -> w thay cho u -> v -> w
+        for u, (a1, a2) in inn[v].items():
+            pending = []
+            for w, (b1, b2) in out[v].items():
+                if w == u:
+                    continue
+                via = a1 + b1
+                existing = out[u].get(w)
+                if existing is None:
+                    pending.append((w, via, a2 + b2))
+                else:
+                    out[u][w] = inn[w][u] = _merge((via, a2 + b2), existing)
+            if not pending:
+                continue
+            found = _witness(
+                out, u, v, {w for w, _, _ in pending},
+                max(via for _, via, _ in pending), witness_edges,
+            )
+            for w, via, carried in pending:
+                if not _dominates(found.get(w, (math.inf, math.inf)), (via, carried)):
+                    out[u][w] = inn[w][u] = (via, carried)
+                    shortcuts += 1
+
+        # cạnh còn lại của v đều tới node contract sau (rank cao hơn)
+        for w, (b1, b2) in out[v].items():
+            up_edges.append((v, w, b1, b2))
+            del inn[w][v]
+            contracted_neighbours[w] += 1
+        for u, (a1, a2) in inn[v].items():
+            down_edges.append((v, u, a1, a2))
+            del out[u][v]
+            contracted_neighbours[u] += 1
+        out[v], inn[v] = {}, {}
+        rank[v] = level
+        level += 1
+
+    return ContractionHierarchy(
+        primary=primary,
+        digest=digest,
+        rank=rank,
+        up=_edge_graph(graph, up_edges, primary),
+        down=_edge_graph(graph, down_edges, primary),
+        shortcuts=shortcuts,
+    )
+
+
+def _edge_graph(graph: RegionGraph, edges: list, primary: str) -> RegionGraph:
+    """Danh sách (tail, head, primary, secondary) -> RegionGraph (CSR, cùng node_ids)."""
+    n = graph.num_nodes
+    if edges:
+        tails, heads, first, second = (np.array(col) for col in zip(*edges))
+    else:
+        tails = heads = np.empty(0, dtype=np.int64)
+        first = second = np.empty(0, dtype=np.float64)
+    order = np.lexsort((heads, tails))
+    tails, heads = tails[order].astype(np.int64), heads[order].astype(np.int32)
+    first, second = first[order].astype(np.float64), second[order].astype(np.float64)
+
+    indptr = np.zeros(n + 1, dtype=np.int32)
+    np.cumsum(np.bincount(tails, minlength=n), out=indptr[1:])
+    distance, time = (first, second) if primary == "distance" else (second, first)
+    return RegionGraph(
+        node_ids=graph.node_ids,
+        node_index=graph.node_index,
+        indptr=indptr,
+        indices=heads,
+        distance=distance,
+        time=time,
+    )
+
+
+# ============================================================
+#  ĐỌC / BUILD THEO REGION
+# ============================================================
+
+def load_or_build_ch(
+    region: str,
+    edges: pd.DataFrame,
+    primary: str = "distance",
+) -> ContractionHierarchy:
+    """
+    Index CH của region: dùng bản đã lưu nếu hash cạnh trùng edges hiện tại,
+    ngược lại build lại rồi lưu. Index dựng trên graph chỉ gồm node có cạnh
+    (thứ tự node không phụ thuộc tập active node của Stage 5) -> tra bằng node_id.
+    """
+    digest = edges_digest(edges)
+    path = ch_path(region, primary)
+    if path.exists():
+        ch = ContractionHierarchy.load(path)
+        if ch.digest == digest:
+            print(f"  - CH index: dùng lại {path.name}")
+            return ch
+        print(f"  - CH index: edges_{region} đã đổi, build lại")
+
+    ch = build_contraction_hierarchy(build_region_graph(edges), primary, digest)
+    ch.save(path)
+    print(
+        f"  - CH index: {ch.up.num_edges + ch.down.num_edges} cạnh "
+        f"({ch.shortcuts} shortcut) -> {path.name}"
+    )
+    return ch
+
+
+def region_hierarchies(region: str, edges: pd.DataFrame, mode: str, primary: str) -> dict:
+    """
+    Index cần cho 1 cách tính ma trận: mode "path" -> 1 index theo primary,
+    "independent" -> 2 index (distance, time), mỗi ma trận là tối ưu riêng.
+    """
+    if mode not in ("path", "independent"):
+        raise ValueError(f"mode phải là 'path' hoặc 'independent', nhận: {mode}")
+    weights = [primary] if mode == "path" else list(WEIGHTS)
+    return {weight: load_or_build_ch(region, edges, weight) for weight in weights}
+
+
+def hierarchy_table(hierarchies: dict, source_ids, target_ids, dtype=MATRIX_DTYPE):
+    """(distance, time) len(sources) x len(targets) theo node_id từ region_hierarchies."""
+    if len(hierarchies) == 1:
+        (ch,) = hierarchies.values()
+        return ch.table_ids(source_ids, target_ids, dtype=dtype)
+    dist, _ = hierarchies["distance"].table_ids(source_ids, target_ids, dtype=dtype)
+    _, time = hierarchies["time"].table_ids(source_ids, target_ids, dtype=dtype)
+    return dist, time
@@ -0,0 +1,241 @@
+# src/preprocessing/distance_oracle.py
+"""
+Oracle đường đi ngắn nhất theo yêu cầu (không tính trước cả ma trận).
+
+Dùng khi cần khoảng cách của 1 vài source mà không muốn chờ Stage 5 chạy lại:
+khách thêm trong ngày, cặp ngoài bản thưa k láng giềng (matrix_sparse), tra cứu lẻ.
+Dijkstra chỉ chạy cho source được hỏi; hàng kết quả (tới MỌI node của graph)
+giữ trong LRU giới hạn theo MB. Truy vấn điểm-điểm / ít target (đổi tuyến 1 xe,
+chèn 1 khách gấp) dùng A* với cận dưới haversine nếu có toạ độ node, không tính cả hàng.
+
+    oracle = DistanceOracle.for_region("HCM")
+    d, t = oracle.dist("C000123", "D0004")                 # 1 cặp (node_id), A*
+    dist_row, time_row = oracle.row("C000123")             # 1 hàng, theo oracle.node_ids
+    dist, time = oracle.table(new_customers, all_active)   # nhiều cặp, 1 lượt Dijkstra (hoặc CH)
+"""
+
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from src.preprocessing.contraction import hierarchy_table, region_hierarchies
+from src.preprocessing.edge_store import load_edge_table
+from src.preprocessing.graph_engine import (
+    EDGE_COLUMNS,
+    AStarSearch,
+    as_matrix_dtype,
+    build_region_graph,
+    node_coordinates,
+    shortest_path_pair,
+)
+from src.preprocessing.matrix_store import load_matrix_nodes, matrix_paths
+from src.utils.config import (
+    EDGES_REGION,
+    MATRIX_CHUNK_SIZE,
+    MATRIX_DTYPE,
+    MATRIX_MODE,
+    MATRIX_PRIMARY_WEIGHT,
+    NODES_MASTER,
+    ORACLE_ASTAR_MAX_TARGETS,
+    ORACLE_CACHE_MB,
+    region_file,
+)
+
+
+class DistanceOracle:
+    """
+    Dijkstra theo yêu cầu trên RegionGraph + LRU các hàng đã tính.
+
+    - Chỉ số nội bộ = chỉ số node trong graph; hàng là (distance, time) tới mọi
+      node của graph (MATRIX_DTYPE), không tới được = inf.
+    - mode / primary như Stage 5 ("path": time cộng dọc tuyến ngắn nhất theo primary).
+    - max_mb: giới hạn bộ nhớ các hàng cache (0 / None -> không cache).
+    - Truy vấn nhiều source (rows / table) gom các source chưa có trong cache thành
+      các block Dijkstra nhiều nguồn (MATRIX_CHUNK_SIZE source / block).
+    - coords = (lat, lon) theo chỉ số graph: dist / dists tới <= astar_max_targets target
+      của source chưa cache chạy A* (dừng khi target settle), không lưu vào cache.
+    - hierarchies (contraction.region_hierarchies): table / dists nhiều target tính bằng
+      bucket CH, không chạy Dijkstra cả graph.
+    """
+
+    def __init__(
+        self,
+        graph,
+        mode: str = None,
+        primary: str = None,
+        max_mb: float = ORACLE_CACHE_MB,
+        chunk_size: int = None,
+        coords: tuple = None,
+        astar_max_targets: int = ORACLE_ASTAR_MAX_TARGETS,
+        hierarchies: dict = None,
+    ):
+        self.graph = graph
+        self.mode = mode or MATRIX_MODE
+        self.primary = primary or MATRIX_PRIMARY_WEIGHT
+        self.chunk_size = chunk_size or MATRIX_CHUNK_SIZE
+        row_bytes = 2 * graph.num_nodes * np.dtype(MATRIX_DTYPE).itemsize
+        self.max_rows = int((max_mb or 0) * 1024 ** 2 // max(1, row_bytes))
+        self._rows = OrderedDict()
+        self.astar = AStarSearch(graph, *coords) if coords is not None else None
+        self.astar_max_targets = astar_max_targets or 0
+        self.hierarchies = hierarchies
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.astar_queries = 0
+
+    @classmethod
+    def for_region(
+        cls,
+        region: str,
+        nodes: list = None,
+        mode: str = None,
+        primary: str = None,
+        max_mb: float = ORACLE_CACHE_MB,
+        astar: bool = True,
+        ch: bool = False,
+    ) -> "DistanceOracle":
+        """
+        Oracle trên edges_{region}.npz.
+
+        nodes (mặc định: thứ tự node của ma trận Stage 5, nếu có) được mã hoá trước
+        -> chỉ số 0..len(nodes)-1 của hàng trùng thứ tự ma trận.
+        astar=True: đọc lat/lon từ nodes_master.csv cho truy vấn A*.
+        ch=True: dùng (hoặc build nếu edges đổi) index contraction hierarchies của region.
+        """
+        if nodes is None and matrix_paths(region)["nodes"].exists():
+            nodes = load_matrix_nodes(region)
+        edges = load_edge_table(region_file(EDGES_REGION, region), columns=EDGE_COLUMNS)
+        graph = build_region_graph(edges, extra_nodes=nodes)
+        coords = None
+        if astar and NODES_MASTER.exists():
+            master = pd.read_csv(NODES_MASTER, usecols=["node_id", "lat", "lon"], dtype={"node_id": str})
+            coords = node_coordinates(graph, master)
+        hierarchies = None
+        if ch:
+            hierarchies = region_hierarchies(
+                region, edges, mode or MATRIX_MODE, primary or MATRIX_PRIMARY_WEIGHT
+            )
+        return cls(
+            graph, mode=mode, primary=primary, max_mb=max_mb,
+            coords=coords, hierarchies=hierarchies,
+        )
+
+    @property
+    def node_ids(self) -> np.ndarray:
+        return self.graph.node_ids
+
+    def index(self, node_ids) -> np.ndarray:
+        """node_id -> chỉ số graph (KeyError nếu node không có trong graph)."""
+        if isinstance(node_ids, str):
+            node_ids = [node_ids]
+        return self.graph.encode(list(node_ids))
+
+    # ---------- truy vấn theo chỉ số graph ----------
+
+    def rows_index(self, sources):
+        """(dist, time) dạng (len(sources) x num_nodes) cho các source (chỉ số graph)."""
+        sources = np.asarray(sources, dtype=np.int32)
+        n = self.graph.num_nodes
+        dist = np.empty((len(sources), n), dtype=MATRIX_DTYPE)
+        time = np.empty((len(sources), n), dtype=MATRIX_DTYPE)
+
+        missing = {}
+        for r, u in enumerate(sources.tolist()):
+            cached = self._rows.get(u)
+            if cached is None:
+                missing.setdefault(u, []).append(r)
+                continue
+            self._rows.move_to_end(u)
+            self.hits += 1
+            dist[r], time[r] = cached
+
+        todo = np.fromiter(missing, dtype=np.int32, count=len(missing))
+        self.misses += len(todo)
+        for start in range(0, len(todo), self.chunk_size):
+            block = todo[start:start + self.chunk_size]
+            dist_block, time_block = shortest_path_pair(
+                self.graph, block, None,
+                primary=self.primary, mode=self.mode, dtype=MATRIX_DTYPE,
+            )
+            for j, u in enumerate(block.tolist()):
+                where = missing[u]
+                dist[where], time[where] = dist_block[j], time_block[j]
+                self._store(u, dist_block[j].copy(), time_block[j].copy())
+        return dist, time
+
+    def _store(self, u: int, dist_row: np.ndarray, time_row: np.ndarray):
+        if self.max_rows <= 0:
+            return
+        rows = self._rows
+        rows[u] = (dist_row, time_row)
+        rows.move_to_end(u)
+        while len(rows) > self.max_rows:
+            rows.popitem(last=False)
+            self.evictions += 1
+
+    # ---------- truy vấn theo node_id ----------
+
+    def row(self, node_id: str):
+        """Hàng (distance, time) của node_id tới mọi node (thứ tự self.node_ids)."""
+        dist, time = self.rows_index(self.index(node_id))
+        return dist[0], time[0]
+
+    def rows(self, node_ids):
+        """Nhiều hàng 1 lượt: (dist, time) dạng (len(node_ids) x num_nodes)."""
+        return self.rows_index(self.index(node_ids))
+
+    def dists(self, u: str, targets):
+        """
+        (distance, time) từ u tới vài target (mảng theo thứ tự targets).
+        Hàng của u đã cache -> tra; ít target + có toạ độ -> A*; có index CH -> bucket CH;
+        còn lại -> tính cả hàng.
+        """
+        source = self.graph.node_index[u]
+        cols = self.index(targets)
+        cached = self._rows.get(source)
+        if cached is None and self.astar is not None and len(cols) <= self.astar_max_targets:
+            self.astar_queries += 1
+            dist, time = self.astar.query(source, cols, primary=self.primary, mode=self.mode)
+            return as_matrix_dtype(dist, MATRIX_DTYPE), as_matrix_dtype(time, MATRIX_DTYPE)
+        if cached is None and self.hierarchies is not None:
+            dist, time = hierarchy_table(self.hierarchies, [u], list(targets))
+            return dist[0], time[0]
+        dist_row, time_row = self.rows_index([source])
+        return dist_row[0, cols], time_row[0, cols]
+
+    def dist(self, u: str, v: str):
+        """(distance, time) từ u tới v."""
+        dist, time = self.dists(u, [v])
+        return float(dist[0]), float(time[0])
+
+    def table(self, sources, targets=None):
+        """
+        Ma trận (distance, time) len(sources) x len(targets) theo node_id
+        (targets mặc định = sources, vd. ma trận active node của bài toán trong ngày).
+        """
+        targets = sources if targets is None else targets
+        if self.hierarchies is not None:
+            return hierarchy_table(self.hierarchies, list(sources), list(targets))
+        dist, time = self.rows(sources)
+        cols = self.index(targets)
+        return dist[:, cols], time[:, cols]
+
+    # ---------- cache ----------
+
+    def clear(self):
+        self._rows.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        row_mb = 2 * self.graph.num_nodes * np.dtype(MATRIX_DTYPE).itemsize / 1024 ** 2
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "rows": len(self._rows),
+            "evictions": self.evictions,
+            "approx_mb": len(self._rows) * row_mb,
+            "astar_queries": self.astar_queries,
+        }
@@ -0,0 +1,167 @@
+# src/preprocessing/edge_store.py
+"""
+Bảng edge có kiểu (Stage 3–6): edges_master.npz, edges_{region}.npz.
+
+Bản CSV lưu origin_id / destination_id / traffic_level / road_restrictions /
+source_file dạng chuỗi lặp lại trên từng dòng, mỗi stage phải parse lại thành
+object. Bảng có kiểu lưu theo cột (NumPy .npz, không cần pyarrow):
+    - origin_id / destination_id: mã int32 vào 1 từ điển node chung (node_ids)
+    - distance_km / travel_time_min: float32
+    - traffic_level / road_restrictions / source_file: mã int8/int16 + từ điển
+Khi đọc, các cột chuỗi thành pandas Categorical (Categorical.from_codes, không parse),
+nên lọc / map theo node là phép toán trên mã số nguyên.
+"""
+
+import os
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# Cột node dùng chung 1 từ điển (mã = vị trí trong node_ids)
+NODE_COLUMNS = ["origin_id", "destination_id"]
+FLOAT_COLUMNS = ["distance_km", "travel_time_min"]
+LABEL_COLUMNS = ["traffic_level", "road_restrictions", "source_file"]
+EDGE_TABLE_COLUMNS = NODE_COLUMNS + FLOAT_COLUMNS + LABEL_COLUMNS
+EDGE_FLOAT_DTYPE = np.float32
+# Nhãn coi là thiếu (như pd.read_csv mặc định): bản CSV cũ ghi ô rỗng cho các nhãn này
+MISSING_LABELS = ["None"]
+
+
+# ============================================================
+#  CHUYỂN DATAFRAME -> BẢNG CÓ KIỂU
+# ============================================================
+
+def _is_categorical(series: pd.Series) -> bool:
+    return isinstance(series.dtype, pd.CategoricalDtype)
+
+
+def node_codes(edges: pd.DataFrame):
+    """
+    (node_ids, origin, destination) của bảng edge: từ điển node + mã int64 hai đầu.
+    Bảng có kiểu -> lấy thẳng mã; bảng chuỗi -> factorize 1 lần.
+    """
+    origin, destination = edges["origin_id"], edges["destination_id"]
+    if (
+        _is_categorical(origin) and _is_categorical(destination)
+        and origin.cat.categories.equals(destination.cat.categories)
+    ):
+        return (
+            origin.cat.categories.to_numpy(dtype=object),
+            origin.cat.codes.to_numpy(dtype=np.int64),
+            destination.cat.codes.to_numpy(dtype=np.int64),
+        )
+    codes, uniques = pd.factorize(
+        np.concatenate([origin.to_numpy(dtype=object), destination.to_numpy(dtype=object)])
+    )
+    n = len(edges)
+    return np.asarray(uniques, dtype=object), codes[:n].astype(np.int64), codes[n:].astype(np.int64)
+
+
+def to_edge_table(edges: pd.DataFrame, node_ids=None) -> pd.DataFrame:
+    """
+    DataFrame edge (chuỗi hoặc đã có kiểu) -> bảng có kiểu.
+
+    node_ids: từ điển node (vd. thứ tự nodes_master) để mọi bảng cùng mã;
+    None -> node xuất hiện trong edges. Node ngoài từ điển -> dòng bị bỏ.
+    Cột nhãn thiếu -> bỏ qua (không tạo cột rỗng); nhãn trong MISSING_LABELS -> NaN.
+    """
+    if node_ids is None:
+        vocab, origin, destination = node_codes(edges)
+    else:
+        vocab = pd.Index(pd.unique(np.asarray(node_ids, dtype=object)))
+        origin = vocab.get_indexer(edges["origin_id"].to_numpy(dtype=object))
+        destination = vocab.get_indexer(edges["destination_id"].to_numpy(dtype=object))
+        vocab = vocab.to_numpy(dtype=object)
+
+    keep = (origin >= 0) & (destination >= 0)
+    categories = pd.Index(vocab, dtype=object)
+    table = {
+        "origin_id": pd.Categorical.from_codes(origin[keep].astype(np.int32), categories=categories),
+        "destination_id": pd.Categorical.from_codes(
+            destination[keep].astype(np.int32), categories=categories
+        ),
+    }
+    for col in FLOAT_COLUMNS:
+        table[col] = edges[col].to_numpy(dtype=np.float64)[keep].astype(EDGE_FLOAT_DTYPE)
+    for col in LABEL_COLUMNS:
+        if col in edges.columns:
+            labels = pd.Categorical(edges[col].to_numpy(dtype=object)[keep])
+            table[col] = labels.remove_categories(labels.categories.intersection(MISSING_LABELS))
+    return pd.DataFrame(table)
+
+
+def _compact_nodes(table: pd.DataFrame):
+    """Từ điển node chỉ gồm node có cạnh + mã mới (để bảng theo region không mang cả từ điển toàn quốc)."""
+    vocab, origin, destination = node_codes(table)
+    used = np.unique(np.concatenate([origin, destination]))
+    return (
+        vocab[used].astype(str),
+        np.searchsorted(used, origin).astype(np.int32),
+        np.searchsorted(used, destination).astype(np.int32),
+    )
+
+
+# ============================================================
+#  GHI / ĐỌC
+# ============================================================
+
+def save_edge_table(table: pd.DataFrame, path: Path, write_csv: bool = False) -> Path:
+    """
+    Ghi bảng có kiểu ra .npz (qua file tạm + os.replace).
+    write_csv=True: ghi thêm bản CSV cùng tên (tương thích công cụ cũ).
+    """
+    path = Path(path)
+    if not _is_categorical(table["origin_id"]):
+        table = to_edge_table(table)
+    node_ids, origin, destination = _compact_nodes(table)
+
+    arrays = {"node_ids": node_ids, "origin_id": origin, "destination_id": destination}
+    for col in FLOAT_COLUMNS:
+        arrays[col] = table[col].to_numpy(dtype=EDGE_FLOAT_DTYPE)
+    for col in LABEL_COLUMNS:
+        if col in table.columns:
+            values = table[col] if _is_categorical(table[col]) else table[col].astype("category")
+            arrays[f"{col}__codes"] = values.cat.codes.to_numpy()
+            arrays[f"{col}__categories"] = values.cat.categories.to_numpy(dtype=str)
+
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "wb") as f:
+        np.savez(f, **arrays)
+    os.replace(tmp, path)
+
+    if write_csv:
+        table.to_csv(path.with_suffix(".csv"), index=False)
+    return path
+
+
+def edge_table_exists(path: Path) -> bool:
+    """Có bảng có kiểu, hoặc bản CSV cũ cùng tên."""
+    path = Path(path)
+    return path.exists() or path.with_suffix(".csv").exists()
+
+
+def load_edge_table(path: Path, columns: list = None) -> pd.DataFrame:
+    """
+    Đọc bảng edge có kiểu (chỉ các cột `columns` nếu truyền vào).
+    Chưa có .npz nhưng có bản CSV cũ cùng tên -> đọc CSV rồi chuyển sang bảng có kiểu.
+    """
+    path = Path(path)
+    columns = columns or EDGE_TABLE_COLUMNS
+    if not path.exists() and path.with_suffix(".csv").exists():
+        legacy = pd.read_csv(path.with_suffix(".csv"), dtype={c: str for c in NODE_COLUMNS})
+        return to_edge_table(legacy)[[c for c in columns if c in legacy.columns]]
+
+    table = {}
+    with np.load(path, allow_pickle=False) as data:
+        categories = pd.Index(data["node_ids"].astype(object), dtype=object)
+        for col in columns:
+            if col in NODE_COLUMNS:
+                table[col] = pd.Categorical.from_codes(data[col], categories=categories)
+            elif col in FLOAT_COLUMNS:
+                table[col] = data[col]
+            elif f"{col}__codes" in data.files:
+                table[col] = pd.Categorical.from_codes(
+                    data[f"{col}__codes"], categories=data[f"{col}__categories"].astype(object)
+                )
+    return pd.DataFrame(table)
@@ -0,0 +1,621 @@
+# src/preprocessing/graph_engine.py
+
+import heapq
+import math
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import dijkstra
+
+from src.preprocessing.edge_store import load_edge_table, node_codes
+
+# Cột cần thiết để dựng graph từ edges_{region}.npz
+EDGE_COLUMNS = ["origin_id", "destination_id", "distance_km", "travel_time_min"]
+
+# Tên trọng số -> thuộc tính của RegionGraph
+WEIGHTS = {
+    "distance": "distance",
+    "time": "time",
+}
+
+# Sai số tương đối coi 2 nhãn primary là hoà nhau (mode "path": tie-break theo secondary)
+TIE_RTOL = 1e-6
+
+# Số chữ số thập phân giữ lại khi ép kết quả về kiểu hẹp hơn float64 (MATRIX_DTYPE):
+# cùng 1 tuyến cộng theo thứ tự khác nhau (Dijkstra, CH, vá incremental) lệch ~1e-13,
+# làm tròn trước khi ép kiểu -> mọi engine lưu cùng 1 giá trị
+MATRIX_DECIMALS = 6
+
+
+def as_matrix_dtype(values: np.ndarray, dtype) -> np.ndarray:
+    """Ép kết quả float64 về dtype lưu; dtype hẹp hơn float64 -> làm tròn MATRIX_DECIMALS trước."""
+    dtype = np.dtype(dtype)
+    if dtype.itemsize < 8:
+        values = np.round(values, MATRIX_DECIMALS)
+    return values.astype(dtype, copy=False)
+
+
+# ============================================================
+#  CSR GRAPH CHO 1 REGION
+# ============================================================
+
+@dataclass
+class RegionGraph:
+    """
+    Graph có hướng của 1 region dưới dạng CSR (NumPy).
+
+    - node_ids[i]: node_id (string) của node có chỉ số nguyên i
+    - node_index: dict node_id -> i (mã hoá 1 lần duy nhất)
+    - indptr / indices: cấu trúc CSR, cạnh của node u nằm trong
+      indices[indptr[u]:indptr[u + 1]]
+    - distance / time: trọng số cạnh tương ứng (km / phút)
+    """
+
+    node_ids: np.ndarray
+    node_index: dict
+    indptr: np.ndarray
+    indices: np.ndarray
+    distance: np.ndarray
+    time: np.ndarray
+
+    @property
+    def num_nodes(self) -> int:
+        return len(self.node_ids)
+
+    @property
+    def num_edges(self) -> int:
+        return len(self.indices)
+
+    def encode(self, node_ids) -> np.ndarray:
+        """node_id -> chỉ số nguyên (KeyError nếu node không có trong graph)."""
+        return np.fromiter(
+            (self.node_index[n] for n in node_ids), dtype=np.int32, count=len(node_ids)
+        )
+
+    def weights(self, weight: str) -> np.ndarray:
+        if weight not in WEIGHTS:
+            raise ValueError(f"weight phải là một trong {list(WEIGHTS)}, nhận: {weight}")
+        return getattr(self, WEIGHTS[weight])
+
+    def csr(self, weight: str = "distance") -> csr_matrix:
+        """Ma trận kề scipy (N x N) theo trọng số weight."""
+        n = self.num_nodes
+        return csr_matrix(
+            (self.weights(weight), self.indices, self.indptr), shape=(n, n)
+        )
+
+
+def build_region_graph(edges: pd.DataFrame, extra_nodes=None) -> RegionGraph:
+    """
+    Dựng RegionGraph từ bảng edges (origin_id, destination_id, distance_km, travel_time_min),
+    bảng chuỗi hoặc bảng có kiểu của edge_store (node là Categorical, trọng số float32).
+
+    - Bỏ cạnh thiếu distance/time (giống bản adjacency cũ).
+    - extra_nodes (vd. active nodes) được mã hoá TRƯỚC, theo đúng thứ tự truyền vào,
+      kể cả khi node không có cạnh nào -> chỉ số 0..k-1 trùng thứ tự ma trận.
+    - Cạnh trùng (origin, destination) gộp lại, giữ min cho từng trọng số
+      (tương đương Dijkstra trên adjacency list có nhiều cạnh song song).
+    """
+    edges = edges.dropna(subset=EDGE_COLUMNS)
+
+    # bảng có kiểu (edge_store) -> dùng thẳng mã node, chuỗi -> factorize 1 lần
+    vocab, origin, destination = node_codes(edges)
+    n_edges = len(edges)
+    inverse, used = pd.factorize(np.concatenate([origin, destination]), sort=False)
+    used_ids = vocab[used]
+
+    # extra_nodes giữ chỉ số 0..k-1, node còn lại theo thứ tự xuất hiện trong edges
+    head = pd.Index(pd.unique(np.asarray(
+        [] if extra_nodes is None else list(extra_nodes), dtype=object
+    )), dtype=object)
+    n_head = len(head)
+    position = head.get_indexer(used_ids)
+    new = position < 0
+    position[new] = n_head + np.arange(int(new.sum()))
+    u = position[inverse[:n_edges]].astype(np.int64)
+    v = position[inverse[n_edges:]].astype(np.int64)
+    uniques = np.concatenate([head.to_numpy(dtype=object), used_ids[new]])
+    n_nodes = len(uniques)
+
+    dist = edges["distance_km"].to_numpy(dtype=np.float64)
+    time = edges["travel_time_min"].to_numpy(dtype=np.float64)
+
+    # gộp cạnh song song: min theo từng trọng số
+    key = u * n_nodes + v
+    order = np.argsort(key, kind="stable")
+    key = key[order]
+    first = np.ones(len(key), dtype=bool)
+    first[1:] = key[1:] != key[:-1]
+    starts = np.flatnonzero(first)
+    if len(starts):
+        dist = np.minimum.reduceat(dist[order], starts)
+        time = np.minimum.reduceat(time[order], starts)
+    else:
+        dist = dist[:0]
+        time = time[:0]
+    key = key[starts]
+    u = (key // n_nodes).astype(np.int32)
+    v = (key % n_nodes).astype(np.int32)
+
+    indptr = np.zeros(n_nodes + 1, dtype=np.int32)
+    np.cumsum(np.bincount(u, minlength=n_nodes), out=indptr[1:])
+
+    node_ids = np.asarray(uniques, dtype=object)
+    return RegionGraph(
+        node_ids=node_ids,
+        node_index={nid: i for i, nid in enumerate(node_ids)},
+        indptr=indptr,
+        indices=v,
+        distance=dist,
+        time=time,
+    )
+
+
+def load_region_graph(edges_path: Path, extra_nodes=None) -> RegionGraph:
+    """Đọc edges_{region}.npz (chỉ các cột cần, không parse chuỗi) rồi dựng RegionGraph."""
+    edges = load_edge_table(edges_path, columns=EDGE_COLUMNS)
+    return build_region_graph(edges, extra_nodes=extra_nodes)
+
+
+# ============================================================
+#  DIJKSTRA NHIỀU NGUỒN
+# ============================================================
+
+def shortest_path_matrix(
+    graph: RegionGraph,
+    sources,
+    targets=None,
+    weight: str = "distance",
+    dtype=np.float32,
+    stats: dict = None,
+) -> np.ndarray:
+    """
+    Dijkstra từ nhiều source (chỉ số nguyên) trên CSR graph.
+
+    Trả về ma trận dày (len(sources) x len(targets)), không tới được = inf.
+    Cộng dồn luôn ở float64 rồi mới ép về dtype yêu cầu.
+    stats (dict, tuỳ chọn): cộng dồn "nodes_settled" (count_settled).
+    """
+    sources = np.asarray(sources, dtype=np.int32)
+    if len(sources) == 0:
+        n_cols = graph.num_nodes if targets is None else len(targets)
+        return np.empty((0, n_cols), dtype=dtype)
+
+    dist = dijkstra(graph.csr(weight), directed=True, indices=sources)
+    count_settled(stats, dist)
+    if targets is not None:
+        dist = dist[:, np.asarray(targets, dtype=np.int32)]
+    return as_matrix_dtype(dist, dtype)
+
+
+def count_settled(stats: dict, best: np.ndarray) -> None:
+    """
+    Cộng số node Dijkstra đã settle vào stats["nodes_settled"] (stats = None -> bỏ qua).
+    Dijkstra không giới hạn settle đúng các node tới được -> số nhãn hữu hạn của
+    kết quả ĐẦY ĐỦ (mọi node graph), đếm trước khi cắt theo targets.
+    """
+    if stats is not None:
+        stats["nodes_settled"] = stats.get("nodes_settled", 0) + int(np.isfinite(best).sum())
+
+
+def tie_tolerance(value):
+    """
+    Ngưỡng coi 2 nhãn primary là bằng nhau: TIE_RTOL * max(1, |value|).
+    Lớn hơn sai số cộng dồn float64 và độ phân giải float32 của ma trận đã lưu
+    (bước vá incremental so với ma trận cũ), nhỏ hơn nhiều độ phân giải dữ liệu (1 m).
+    """
+    return TIE_RTOL * np.maximum(1.0, np.abs(value))
+
+
+def lex_improves(cand_first, cand_second, first, second) -> np.ndarray:
+    """
+    Mask ô mà ứng viên (primary, secondary) tốt hơn giá trị hiện tại theo thứ tự của
+    mode "path": primary ngắn hơn hẳn, hoặc hoà primary (tie_tolerance) và secondary nhỏ hơn.
+    Giá trị hiện tại = inf -> mọi ứng viên hữu hạn đều tốt hơn.
+    """
+    tol = tie_tolerance(np.where(np.isfinite(first), first, 0.0))
+    shorter = cand_first < first - tol
+    with np.errstate(invalid="ignore"):  # inf - inf -> nan -> không hoà
+        tie = np.abs(cand_first - first) <= tol
+    return shorter | (tie & (cand_second < second))
+
+
+def _carry_along_ties(
+    graph: RegionGraph,
+    best: np.ndarray,
+    sources: np.ndarray,
+    primary: str,
+    secondary: str,
+    block_cells: int = 1 << 22,
+) -> np.ndarray:
+    """
+    Trọng số `secondary` nhỏ nhất trong các đường ngắn nhất theo `primary`
+    (tie-break theo cặp (primary, secondary)), dạng (len(sources) x N).
+
+    Cạnh u -> v "chặt" với 1 source nếu best[u] + w(u, v) <= best[v] (sai số
+    tie_tolerance); đường ngắn nhất chỉ gồm cạnh chặt. Trên các cạnh chặt, relax lặp
+    (Bellman-Ford vector hoá, số vòng = số cạnh của đường dài nhất) cho secondary nhỏ
+    nhất -> kết quả chỉ phụ thuộc graph, không phụ thuộc đường nào engine (scipy,
+    A*, CH, graph đảo chiều) giữ lại khi 2 đường hoà nhau về primary.
+    Không tới được = inf.
+    """
+    n_src, n = best.shape
+    tails = np.repeat(np.arange(n, dtype=np.int64), np.diff(graph.indptr))
+    heads = graph.indices.astype(np.int64)
+    w_first = graph.weights(primary)
+    w_second = graph.weights(secondary)
+
+    # cặp (hàng, cạnh) chặt; tính theo khối hàng để giới hạn bộ nhớ tạm
+    rows, edges = [], []
+    step = max(1, block_cells // max(1, len(heads)))
+    for start in range(0, n_src, step):
+        block = best[start:start + step]
+        block = np.where(np.isfinite(block), block, np.nan)  # nan: mọi phép so sánh = False
+        reach = np.take(block, tails, axis=1)
+        reach += w_first
+        tight = reach <= np.take(block + tie_tolerance(block), heads, axis=1)
+        r, e = np.nonzero(tight)
+        rows.append(r + start)
+        edges.append(e)
+    rows, edges = np.concatenate(rows), np.concatenate(edges)
+
+    carried = np.full(n_src * n, np.inf)
+    carried[np.arange(n_src) * n + sources] = 0.0
+    if len(edges) == 0:
+        return carried.reshape(n_src, n)
+
+    # gom theo ô đích (hàng, head) -> 1 np.minimum.reduceat / vòng
+    head_cell = rows * n + heads[edges]
+    order = np.argsort(head_cell, kind="stable")
+    head_cell, edges, rows = head_cell[order], edges[order], rows[order]
+    tail_cell = rows * n + tails[edges]
+    step_weight = w_second[edges]
+    starts = np.flatnonzero(np.r_[True, head_cell[1:] != head_cell[:-1]])
+    cells = head_cell[starts]
+
+    while True:
+        incoming = np.minimum.reduceat(carried[tail_cell] + step_weight, starts)
+        improved = incoming < carried[cells]
+        if not improved.any():
+            break
+        carried[cells[improved]] = incoming[improved]
+    return carried.reshape(n_src, n)
+
+
+def shortest_path_pair(
+    graph: RegionGraph,
+    sources,
+    targets=None,
+    primary: str = "distance",
+    mode: str = "path",
+    dtype=np.float32,
+    stats: dict = None,
+):
+    """
+    Tính cả ma trận distance và time cho nhiều source.
+
+    mode:
+        - "path": 1 lần Dijkstra theo trọng số `primary` (distance / time),
+          trọng số còn lại được cộng dọc ĐÚNG đường đã chọn
+          -> ma trận time khớp với tuyến trong ma trận distance (và ngược lại).
+          Nhiều đường hoà nhau về primary -> chọn đường có secondary nhỏ nhất
+          (_carry_along_ties), nên kết quả giống nhau ở mọi engine.
+        - "independent": 2 lần Dijkstra, mỗi ma trận là tối ưu riêng của nó.
+
+    Trả về (dist, time), mỗi ma trận (len(sources) x len(targets)), không tới được = inf.
+    stats (dict, tuỳ chọn): cộng dồn số node settle của các lần Dijkstra ("nodes_settled").
+    """
+    if mode == "independent":
+        dist = shortest_path_matrix(graph, sources, targets, "distance", dtype, stats)
+        time = shortest_path_matrix(graph, sources, targets, "time", dtype, stats)
+        return dist, time
+    if mode != "path":
+        raise ValueError(f"mode phải là 'path' hoặc 'independent', nhận: {mode}")
+
+    secondary = "time" if primary == "distance" else "distance"
+    sources = np.asarray(sources, dtype=np.int32)
+    if len(sources) == 0:
+        n_cols = graph.num_nodes if targets is None else len(targets)
+        empty = np.empty((0, n_cols), dtype=dtype)
+        return empty, empty.copy()
+
+    best = dijkstra(graph.csr(primary), directed=True, indices=sources)
+    count_settled(stats, best)
+    carried = _carry_along_ties(graph, best, sources, primary, secondary)
+
+    if targets is not None:
+        targets = np.asarray(targets, dtype=np.int32)
+        best = best[:, targets]
+        carried = carried[:, targets]
+
+    best = as_matrix_dtype(best, dtype)
+    carried = as_matrix_dtype(carried, dtype)
+    if primary == "distance":
+        return best, carried
+    return carried, best
+
+
+# ============================================================
+#  K TARGET GẦN NHẤT (MA TRẬN THƯA)
+# ============================================================
+
+def nearest_targets(
+    graph: RegionGraph,
+    sources,
+    targets,
+    k: int,
+    primary: str = "distance",
+    mode: str = "path",
+    radius: float = 1.0,
+    dtype=np.float32,
+):
+    """
+    k target gần nhất (theo `primary`) của từng source, không tính chính source.
+
+    Dijkstra có giới hạn bán kính (tham số `limit` của scipy: dừng khi nhãn vượt
+    radius). Source chưa thấy đủ k target thì chạy lại với bán kính gấp đôi, tới khi
+    bán kính vượt tổng trọng số mọi cạnh (đã thấy hết target tới được).
+
+    Trả về (indptr, indices, dist, time) dạng CSR theo source:
+        hàng r = indices[indptr[r]:indptr[r + 1]] (vị trí trong `targets`), sắp theo primary.
+    mode như shortest_path_pair ("independent": trọng số kia là Dijkstra riêng, không giới hạn).
+    """
+    if mode not in ("path", "independent"):
+        raise ValueError(f"mode phải là 'path' hoặc 'independent', nhận: {mode}")
+    sources = np.asarray(sources, dtype=np.int32)
+    targets = np.asarray(targets, dtype=np.int32)
+    secondary = "time" if primary == "distance" else "distance"
+    weights = graph.csr(primary)
+    ceiling = float(graph.weights(primary).sum())
+
+    position = np.full(graph.num_nodes, -1, dtype=np.int64)
+    position[targets] = np.arange(len(targets))
+
+    rows = [None] * len(sources)
+    pending = np.arange(len(sources))
+    radius = float(radius)
+    while len(pending):
+        last_round = radius >= ceiling
+        best = dijkstra(
+            weights, directed=True, indices=sources[pending],
+            limit=np.inf if last_round else radius,
+        )
+        best_t = best[:, targets]
+        own = position[sources[pending]]
+        is_target = own >= 0
+        best_t[np.flatnonzero(is_target), own[is_target]] = np.inf  # bỏ chính source
+        reached = np.isfinite(best_t).sum(axis=1)
+        done = np.flatnonzero((reached >= k) | last_round)
+
+        if len(done):
+            if mode == "path":
+                carried = _carry_along_ties(
+                    graph, best[done], sources[pending[done]], primary, secondary
+                )[:, targets]
+            else:
+                carried = shortest_path_matrix(
+                    graph, sources[pending[done]], targets, secondary, np.float64
+                )
+            for j, r in enumerate(done):
+                row = best_t[r]
+                take = min(k, int(reached[r]))
+                top = np.argpartition(row, take - 1)[:take] if take else np.empty(0, dtype=np.int64)
+                top = top[np.argsort(row[top], kind="stable")]
+                rows[pending[r]] = (top, row[top], carried[j, top])
+
+        pending = np.delete(pending, done)
+        radius *= 2
+
+    lengths = np.array([len(row[0]) for row in rows], dtype=np.int64)
+    indptr = np.zeros(len(sources) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=indptr[1:])
+
+    def stack(field, out_dtype):
+        if not rows:
+            return np.empty(0, dtype=out_dtype)
+        return as_matrix_dtype(np.concatenate([row[field] for row in rows]), out_dtype)
+
+    indices = stack(0, np.int32)
+    best_values, carried_values = stack(1, dtype), stack(2, dtype)
+    if primary == "distance":
+        return indptr, indices, best_values, carried_values
+    return indptr, indices, carried_values, best_values
+
+
+def reverse_graph(graph: RegionGraph) -> RegionGraph:
+    """
+    Graph đảo chiều (u -> v thành v -> u), giữ nguyên thứ tự/chỉ số node.
+    Dijkstra trên graph đảo chiều từ x cho ra CỘT x (mọi node -> x) của graph gốc.
+    """
+    n = graph.num_nodes
+    tails = np.repeat(np.arange(n, dtype=np.int64), np.diff(graph.indptr))
+    heads = graph.indices.astype(np.int64)
+
+    order = np.argsort(heads * n + tails, kind="stable")
+    indptr = np.zeros(n + 1, dtype=np.int32)
+    np.cumsum(np.bincount(heads, minlength=n), out=indptr[1:])
+
+    return RegionGraph(
+        node_ids=graph.node_ids,
+        node_index=graph.node_index,
+        indptr=indptr,
+        indices=tails[order].astype(np.int32),
+        distance=graph.distance[order],
+        time=graph.time[order],
+    )
+
+
+# ============================================================
+#  A* ĐIỂM -> ĐIỂM (CẬN DƯỚI HAVERSINE)
+# ============================================================
+
+EARTH_RADIUS_KM = 6371.0088
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Khoảng cách đường chim bay (km), nhận độ (vector hoá NumPy)."""
+    lat1, lon1, lat2, lon2 = map(np.radians, (lat1, lon1, lat2, lon2))
+    a = (
+        np.sin((lat2 - lat1) / 2) ** 2
+        + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def node_coordinates(graph: RegionGraph, nodes: pd.DataFrame):
+    """(lat, lon) theo chỉ số node của graph từ bảng node_id/lat/lon (vd. nodes_master); thiếu = nan."""
+    coords = nodes.drop_duplicates("node_id").set_index("node_id")[["lat", "lon"]]
+    coords = coords.reindex(pd.Index(graph.node_ids, dtype=object)).astype("float64")
+    return coords["lat"].to_numpy(), coords["lon"].to_numpy()
+
+
+def bound_factor(graph: RegionGraph, weight: str, lat: np.ndarray, lon: np.ndarray) -> float:
+    """
+    Hệ số c sao cho c * haversine(u, v) <= trọng số của mọi cạnh u -> v.
+
+    - distance: ~1 (đường bộ không ngắn hơn đường chim bay)
+    - time: 1 / tốc độ lớn nhất (phút / km) tính từ distance_km / travel_time_min của cạnh
+    Theo bất đẳng thức tam giác, c * haversine(v, t) là cận dưới nhất quán (consistent)
+    của đường ngắn nhất v -> t. Thiếu toạ độ -> 0 (A* thành Dijkstra).
+    """
+    if not (np.isfinite(lat).all() and np.isfinite(lon).all()):
+        return 0.0
+    tails = np.repeat(np.arange(graph.num_nodes), np.diff(graph.indptr))
+    heads = graph.indices
+    straight = haversine_km(lat[tails], lon[tails], lat[heads], lon[heads])
+    positive = straight > 0
+    if not positive.any():
+        return 0.0
+    factor = float((graph.weights(weight)[positive] / straight[positive]).min())
+    return max(0.0, factor) * (1 - 1e-9)  # chừa sai số làm tròn
+
+
+class AStarSearch:
+    """
+    A* từ 1 source tới 1 vài target trên RegionGraph, dừng khi mọi target đã settle.
+
+    Cận dưới h(v) = c * min_t haversine(v, t) (c từ bound_factor theo trọng số primary),
+    nhất quán nên nhãn của node lấy ra khỏi heap là tối ưu. CSR được chuyển sang list
+    Python 1 lần (vòng lặp heapq trên list nhanh hơn chỉ mục mảng NumPy từng phần tử);
+    h tính vector hoá cho mọi node đầu mỗi query (depot nối tới hàng nghìn khách nên
+    1 lần settle đẩy rất nhiều node vào heap).
+
+        search = AStarSearch(graph, *node_coordinates(graph, nodes_master))
+        dist, time = search.query(u, [v1, v2])       # mảng theo thứ tự targets
+    """
+
+    def __init__(self, graph: RegionGraph, lat: np.ndarray, lon: np.ndarray):
+        self.graph = graph
+        self._lat = np.radians(np.asarray(lat, dtype=np.float64))
+        self._lon = np.radians(np.asarray(lon, dtype=np.float64))
+        self._cos_lat = np.cos(self._lat)
+        self.factors = {w: bound_factor(graph, w, lat, lon) for w in WEIGHTS}
+        self._indptr = graph.indptr.tolist()
+        self._indices = graph.indices.tolist()
+        self._weights = {w: graph.weights(w).tolist() for w in WEIGHTS}
+        self.settled = 0  # số node settle của lần query gần nhất
+
+    def _heuristic(self, factor: float, targets: list) -> list:
+        """h của mọi node (list, tra O(1) trong vòng heap): 1 phép NumPy / target."""
+        if not factor:
+            return [0.0] * self.graph.num_nodes
+        lat, lon = self._lat, self._lon
+        nearest = np.full(self.graph.num_nodes, np.inf)
+        for t in targets:
+            a = (
+                np.sin((lat[t] - lat) / 2) ** 2
+                + self._cos_lat * self._cos_lat[t] * np.sin((lon[t] - lon) / 2) ** 2
+            )
+            np.minimum(nearest, a, out=nearest)
+        return (2 * EARTH_RADIUS_KM * factor * np.arcsin(np.sqrt(np.clip(nearest, 0.0, 1.0)))).tolist()
+
+    def _search(self, source: int, targets: list, primary: str, carry: str = None):
+        """
+        A* theo primary; carry: trọng số cộng dọc tuyến tìm được (mode "path"), hoà
+        primary -> secondary nhỏ nhất như _carry_along_ties.
+        """
+        indptr, indices = self._indptr, self._indices
+        weight = self._weights[primary]
+        h = self._heuristic(self.factors[primary], targets)
+
+        best = {source: 0.0}
+        done = set()
+        remaining = set(targets)
+        bound = math.inf  # nhãn tạm lớn nhất của các target chưa settle (inf nếu còn target chưa chạm)
+        finish = math.inf  # carry: settle tiếp node có f trong ngưỡng hoà của target cuối
+        heap = [(h[source], 0.0, source)]
+        while heap and (remaining or heap[0][0] <= finish):
+            _, g, u = heapq.heappop(heap)
+            if u in done:
+                continue
+            done.add(u)
+            if u in remaining:
+                remaining.discard(u)
+                bound = max((best.get(t, math.inf) for t in remaining), default=math.inf)
+                if not remaining:
+                    if not carry:
+                        break
+                    finish = g + TIE_RTOL * max(1.0, g)
+            for e in range(indptr[u], indptr[u + 1]):
+                v = indices[e]
+                g_v = g + weight[e]
+                f_v = g_v + h[v]
+                # f > bound: không thể rút ngắn (hay hoà) target nào còn lại -> không cần đẩy vào heap
+                if f_v > bound + TIE_RTOL * max(1.0, bound) or v in done or g_v >= best.get(v, math.inf):
+                    continue
+                best[v] = g_v
+                heapq.heappush(heap, (f_v, g_v, v))
+                if v in remaining:
+                    bound = max(best.get(t, math.inf) for t in remaining)
+        self.settled = len(done)
+        along = self._carry_along_ties(source, best, done, weight, self._weights[carry]) if carry else {}
+        return best, along
+
+    def _carry_along_ties(self, source: int, best: dict, done: set, weight: list, carried: list) -> dict:
+        """
+        Secondary nhỏ nhất trên các cạnh chặt giữa các node đã settle, duyệt theo nhãn
+        primary tăng dần. Heuristic nhất quán -> mọi node trên đường ngắn nhất tới
+        target đều đã settle (f <= nhãn của target) trước khi target settle.
+        """
+        indptr, indices = self._indptr, self._indices
+        along = {source: 0.0}
+        for u in sorted(done, key=best.__getitem__):
+            a_u = along.get(u)
+            if a_u is None:
+                continue
+            g_u = best[u]
+            for e in range(indptr[u], indptr[u + 1]):
+                v = indices[e]
+                if v not in done:
+                    continue
+                b_v = best[v]
+                if g_u + weight[e] <= b_v + TIE_RTOL * max(1.0, abs(b_v)):
+                    a_v = a_u + carried[e]
+                    if a_v < along.get(v, math.inf):
+                        along[v] = a_v
+        return along
+
+    def query(self, source: int, targets, primary: str = "distance", mode: str = "path"):
+        """
+        (dist, time) float64 từ source tới từng target (chỉ số graph), không tới được = inf.
+        mode như shortest_path_pair ("independent": 2 lần A*, mỗi trọng số 1 lần).
+        """
+        targets = [int(t) for t in np.atleast_1d(targets)]
+        secondary = "time" if primary == "distance" else "distance"
+        if mode == "path":
+            best, along = self._search(int(source), targets, primary, carry=secondary)
+            first = np.array([best.get(t, math.inf) for t in targets])
+            second = np.array([along.get(t, math.inf) for t in targets])
+        elif mode == "independent":
+            best, _ = self._search(int(source), targets, primary)
+            other, _ = self._search(int(source), targets, secondary)
+            first = np.array([best.get(t, math.inf) for t in targets])
+            second = np.array([other.get(t, math.inf) for t in targets])
+        else:
+            raise ValueError(f"mode phải là 'path' hoặc 'independent', nhận: {mode}")
+        if primary == "distance":
+            return first, second
+        return second, first
@@ -3,11 +3,16 @@ import re
 from src.utils.config import (
     CUSTOMERS_RAW,
     CUSTOMERS_CLEAN,
+    DEPOTS_CLEAN,
     DATA_PROCESSED,
     city_to_region,
     MAX_CUSTOMERS_PER_REGION,
     RANDOM_SEED,
+    REGION_ASSIGNMENT,
 )
+from src.preprocessing.raw_input import read_raw_table
+from src.preprocessing.spatial_index import assign_regions
+from src.utils.parsing import hhmm_to_min, parse_number
 
 def to_snake(s: str) -> str:
     s = s.strip()
@@ -16,23 +21,8 @@ def to_snake(s: str) -> str:
     s = re.sub(r"_+", "_", s)
     return s.lower()
 
-def parse_number(x):
-    try:
-        return float(str(x).strip().replace(",", "."))
-    except:
-        return None
-
-def hhmm_to_min(x):
-    if pd.isna(x):
-        return None
-    s = str(x)
-    m = re.match(r"(\d{1,2}):(\d{2})", s)
-    if not m:
-        return None
-    return int(m.group(1)) * 60 + int(m.group(2))
-
 def load_customers():
-    df = pd.read_excel(CUSTOMERS_RAW)
+    df = read_raw_table(CUSTOMERS_RAW)
     df.columns = [to_snake(c) for c in df.columns]
 
     df = df.rename(columns={
@@ -52,14 +42,23 @@ def load_customers():
 
     # số
     for col in ["demand_weight", "demand_volume", "service_time"]:
-        df[col] = df[col].apply(parse_number)
+        df[col] = parse_number(df[col])
 
     # thời gian → phút
-    df["ready_time_min"] = df["ready_time"].apply(hhmm_to_min)
-    df["due_time_min"] = df["due_time"].apply(hhmm_to_min)
-
-    # region
-    df["region_id"] = df["city"].apply(city_to_region)
+    df["ready_time_min"] = hhmm_to_min(df["ready_time"])
+    df["due_time_min"] = hhmm_to_min(df["due_time"])
+
+    # region: theo depot gần nhất (city chỉ là gợi ý), cần depots_clean.csv
+    if REGION_ASSIGNMENT == "spatial" and DEPOTS_CLEAN.exists():
+        depots = pd.read_csv(DEPOTS_CLEAN, dtype={"depot_id": str})
+        assigned = assign_regions(df, depots)
+        df["region_id"] = assigned["region_id"]
+        df["nearest_depot_id"] = assigned["nearest_depot_id"]
+        df["nearest_depot_km"] = assigned["nearest_depot_km"].round(3)
+    else:
+        if REGION_ASSIGNMENT == "spatial":
+            print("⚠ Chưa có depots_clean.csv -> gán region theo city.")
+        df["region_id"] = df["city"].apply(city_to_region)
 
     # Return TRUE/FALSE → 0/1
     df["is_return"] = df["is_return"].map(
@@ -89,8 +88,11 @@ def load_customers():
                     random_state=RANDOM_SEED
                 )
 
+            # không dùng groupby.apply: pandas >= 3 bỏ cột region_id khỏi từng group
             before = len(df)
-            df = df.groupby("region_id", group_keys=False).apply(_sample_region)
+            df = pd.concat(
+                [_sample_region(group) for _, group in df.groupby("region_id")]
+            )
             after = len(df)
             print(
                 f"✔ Áp dụng giới hạn {MAX_CUSTOMERS_PER_REGION} khách/region: "
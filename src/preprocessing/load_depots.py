@@ -1,6 +1,10 @@
-import pandas as pd
 import re
-from src.utils.config import DEPOTS_RAW, DEPOTS_CLEAN, DATA_PROCESSED, city_to_region
+from src.utils.config import (
+    DEPOTS_RAW, DEPOTS_CLEAN, DATA_PROCESSED, REGION_ASSIGNMENT, city_to_region
+)
+from src.preprocessing.raw_input import read_raw_table
+from src.preprocessing.spatial_index import assign_depot_regions
+from src.utils.parsing import parse_number, split_time_range
 
 def to_snake(s: str) -> str:
     s = s.strip()
@@ -9,24 +13,9 @@ def to_snake(s: str) -> str:
     s = re.sub(r"_+", "_", s)
     return s.lower()
 
-def parse_number(x):
-    try:
-        return float(str(x).strip().replace(",", "."))
-    except:
-        return None
-
-def hhmm_to_min(x):
-    if pd.isna(x):
-        return None
-    s = str(x)
-    m = re.match(r"(\d{1,2}):(\d{2})", s)
-    if not m:
-        return None
-    return int(m.group(1)) * 60 + int(m.group(2))
-
 def load_depots():
     # 1. đọc file
-    df = pd.read_excel(DEPOTS_RAW)
+    df = read_raw_table(DEPOTS_RAW)
     df.columns = [to_snake(c) for c in df.columns]
 
     # 2. chuẩn tên cột
@@ -40,26 +29,17 @@ def load_depots():
     })
 
     # 3. ép kiểu số
-    df["lat"] = df["lat"].apply(parse_number)
-    df["lon"] = df["lon"].apply(parse_number)
-    df["capacity_storage"] = df["capacity_storage"].apply(parse_number)
+    for col in ["lat", "lon", "capacity_storage"]:
+        df[col] = parse_number(df[col])
 
-    # 4. tạo region_id từ city
-    df["region_id"] = df["city"].apply(city_to_region)
+    # 4. tạo region_id từ city (city lạ -> region của depot chuẩn gần nhất)
+    if REGION_ASSIGNMENT == "spatial":
+        df["region_id"] = assign_depot_regions(df)
+    else:
+        df["region_id"] = df["city"].apply(city_to_region)
 
     # 5. tách operating_hours "06:00-22:00" → open / close (phút)
-    open_list, close_list = [], []
-    for val in df["operating_hours"]:
-        if isinstance(val, str) and "-" in val:
-            o, c = val.split("-")
-            open_list.append(hhmm_to_min(o))
-            close_list.append(hhmm_to_min(c))
-        else:
-            open_list.append(None)
-            close_list.append(None)
-
-    df["open_time_min"] = open_list
-    df["close_time_min"] = close_list
+    df["open_time_min"], df["close_time_min"] = split_time_range(df["operating_hours"])
 
     # 6. loại depot thiếu toạ độ
     df = df.dropna(subset=["depot_id", "lat", "lon"])
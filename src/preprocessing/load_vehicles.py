@@ -4,6 +4,8 @@ from src.utils.config import (
     VEHICLES_RAW, VEHICLES_CLEAN, DATA_PROCESSED,
     DEPOTS_CLEAN, city_to_region
 )
+from src.preprocessing.raw_input import read_raw_table
+from src.utils.parsing import extract_leading_number, parse_number
 
 def to_snake(s: str) -> str:
     s = s.strip()
@@ -12,23 +14,8 @@ def to_snake(s: str) -> str:
     s = re.sub(r"_+", "_", s)
     return s.lower()
 
-def parse_number(x):
-    if pd.isna(x):
-        return None
-    x = str(x).strip().replace(",", ".")
-    try:
-        return float(x)
-    except:
-        return None
-
-def extract_leading_number(x):
-    if pd.isna(x):
-        return None
-    m = re.match(r"(\d+(\.\d+)?)", str(x).strip())
-    return float(m.group(1)) if m else None
-
 def load_vehicles():
-    df = pd.read_excel(VEHICLES_RAW)
+    df = read_raw_table(VEHICLES_RAW)
     df.columns = [to_snake(c) for c in df.columns]
 
     df = df.rename(columns={
@@ -47,16 +34,19 @@ def load_vehicles():
     # số
     for col in ["capacity_weight", "capacity_volume",
                 "fixed_cost", "variable_cost", "max_distance_km"]:
-        df[col] = df[col].apply(parse_number)
+        df[col] = parse_number(df[col])
 
-    df["max_working_hours"] = df["max_working_hours"].apply(extract_leading_number)
+    df["max_working_hours"] = extract_leading_number(df["max_working_hours"])
 
-    # region_id cho vehicle = region của start_depot
+    # region_id cho vehicle = region của start_depot (đã gán ở load_depots)
     depots = pd.read_csv(DEPOTS_CLEAN)
-    depot_region = (depots
-                    .set_index("depot_id")["city"]
-                    .map(city_to_region)
-                    .to_dict())
+    if "region_id" in depots.columns:
+        depot_region = depots.set_index("depot_id")["region_id"].to_dict()
+    else:
+        depot_region = (depots
+                        .set_index("depot_id")["city"]
+                        .map(city_to_region)
+                        .to_dict())
     df["region_id"] = df["start_depot_id"].map(depot_region)
 
     df = df.dropna(subset=["vehicle_id", "capacity_weight"])
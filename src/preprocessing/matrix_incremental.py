@@ -0,0 +1,212 @@
+# src/preprocessing/matrix_incremental.py
+
+import numpy as np
+import pandas as pd
+
+from src.preprocessing.graph_engine import (
+    EDGE_COLUMNS,
+    RegionGraph,
+    as_matrix_dtype,
+    lex_improves,
+    reverse_graph,
+    shortest_path_pair,
+)
+from src.preprocessing.matrix_store import RegionMatrices
+from src.utils.config import INCREMENTAL_MAX_FRACTION, MATRIX_DTYPE
+
+# Cột node dùng để tính hash (đổi 1 trong các cột này = node "đã thay đổi")
+NODE_HASH_COLUMNS = ["node_id", "node_type", "lat", "lon", "city", "region_id"]
+
+# Cách chọn đường khi hoà primary (mode "path"), ghi vào trạng thái ma trận
+TIE_BREAK = "secondary"
+
+
+# ============================================================
+#  FINGERPRINT (hash từng node / từng edge)
+# ============================================================
+
+def region_fingerprint(
+    active_df: pd.DataFrame,
+    edges_region: pd.DataFrame,
+    graph: RegionGraph,
+    mode: str,
+    primary: str,
+) -> dict:
+    """
+    Trạng thái của 1 region lúc tính ma trận, lưu cạnh ma trận (matrix_state_{region}.npz):
+        - node_ids / node_hash: hash nội dung từng active node (theo thứ tự ma trận)
+        - graph_nodes: toàn bộ node của graph (kể cả node không active)
+        - edge_hash: hash từng dòng edge (origin, destination, distance, time), đã sort
+        - config: mode / primary / dtype của ma trận + TIE_BREAK (ma trận cũ tính theo
+          cách chọn đường hoà khác -> không vá, tính lại toàn bộ)
+    """
+    node_cols = [c for c in NODE_HASH_COLUMNS if c in active_df.columns]
+    node_hash = pd.util.hash_pandas_object(active_df[node_cols], index=False)
+    edge_hash = pd.util.hash_pandas_object(edges_region[EDGE_COLUMNS], index=False)
+
+    return {
+        "node_ids": active_df["node_id"].to_numpy(dtype=str),
+        "node_hash": node_hash.to_numpy(dtype=np.uint64),
+        "graph_nodes": graph.node_ids.astype(str),
+        "edge_hash": np.sort(edge_hash.to_numpy(dtype=np.uint64)),
+        "config": np.array([mode, primary, str(np.dtype(MATRIX_DTYPE)), TIE_BREAK]),
+    }
+
+
+# ============================================================
+#  LẬP KẾ HOẠCH: VÁ HAY TÍNH LẠI TOÀN BỘ
+# ============================================================
+
+def plan_region_update(previous: dict, current: dict, edges_region: pd.DataFrame):
+    """
+    So sánh trạng thái lần trước với hiện tại.
+
+    Trả về (plan, lý do):
+        - plan = None: phải tính lại toàn bộ region
+        - plan = dict(patch_nodes, via_nodes): vá ma trận cũ
+            + patch_nodes: active node mới / đổi nội dung -> tính lại hàng + cột
+            + via_nodes: node graph MỚI, đường đi qua chúng có thể làm ngắn cặp cũ
+
+    Quy tắc:
+        - Edge cũ bị xoá / đổi trọng số -> đường có thể dài ra hoặc ngắn lại: tính lại toàn bộ.
+        - Edge mới nối 2 node cũ -> có thể rút ngắn đường cũ: tính lại toàn bộ.
+        - Edge mới chạm ít nhất 1 node mới -> vá được (min-plus qua via_nodes).
+    """
+    if previous is None:
+        return None, "chưa có ma trận/trạng thái cũ"
+    if not np.array_equal(previous["config"], current["config"]):
+        return None, "cấu hình ma trận (mode/primary/dtype/tie-break) đã đổi"
+
+    old_edges = previous["edge_hash"]
+    new_edges = current["edge_hash"]
+    if not np.isin(old_edges, new_edges).all():
+        return None, "có edge cũ bị xoá hoặc đổi trọng số"
+
+    old_graph_nodes = set(previous["graph_nodes"].tolist())
+    row_hash = pd.util.hash_pandas_object(
+        edges_region[EDGE_COLUMNS], index=False
+    ).to_numpy(dtype=np.uint64)
+    added = edges_region.loc[~np.isin(row_hash, old_edges), ["origin_id", "destination_id"]]
+    touches_new = ~(
+        added["origin_id"].isin(old_graph_nodes)
+        & added["destination_id"].isin(old_graph_nodes)
+    )
+    if not touches_new.all():
+        return None, "có edge mới nối giữa các node cũ"
+
+    old_nodes = dict(zip(previous["node_ids"].tolist(), previous["node_hash"].tolist()))
+    patch_nodes = [
+        nid for nid, h in zip(current["node_ids"].tolist(), current["node_hash"].tolist())
+        if old_nodes.get(nid) != h
+    ]
+    via_nodes = [
+        nid for nid in current["graph_nodes"].tolist() if nid not in old_graph_nodes
+    ]
+
+    n = len(current["node_ids"])
+    if len(set(patch_nodes) | set(via_nodes)) > INCREMENTAL_MAX_FRACTION * n:
+        return None, f"{len(patch_nodes)} node thay đổi, vượt ngưỡng vá"
+    return {"patch_nodes": patch_nodes, "via_nodes": via_nodes}, "ok"
+
+
+# ============================================================
+#  VÁ MA TRẬN
+# ============================================================
+
+def _relax_through(
+    dist: np.ndarray,
+    time: np.ndarray,
+    to_via: tuple,
+    from_via: tuple,
+    mode: str,
+    primary: str,
+):
+    """
+    Cập nhật d(a, b) = min(d(a, b), d(a, x) + d(x, b)) cho từng via node x.
+    to_via: (dist, time) dạng (n x k) = mọi node -> x; from_via: (k x n) = x -> mọi node.
+    mode "path": so sánh theo cặp (primary, secondary) như shortest_path_pair — hoà
+    primary (trong tie_tolerance, đủ rộng cho ma trận cũ lưu float32) -> giữ secondary
+    nhỏ hơn, nên kết quả vá trùng với tính lại toàn bộ.
+    """
+    d_to, t_to = to_via
+    d_from, t_from = from_via
+    first, second = (dist, time) if primary == "distance" else (time, dist)
+    for k in range(d_from.shape[0]):
+        cand_d = d_to[:, k, None] + d_from[None, k, :]
+        cand_t = t_to[:, k, None] + t_from[None, k, :]
+        if mode == "independent":
+            np.minimum(dist, cand_d, out=dist)
+            np.minimum(time, cand_t, out=time)
+            continue
+        cand_first, cand_second = (cand_d, cand_t) if primary == "distance" else (cand_t, cand_d)
+        take = lex_improves(cand_first, cand_second, first, second)
+        np.minimum(first, cand_first, out=first)
+        second[take] = cand_second[take]
+
+
+def patch_region_matrices(
+    graph: RegionGraph,
+    active_nodes: list,
+    old: RegionMatrices,
+    plan: dict,
+    mode: str,
+    primary: str,
+):
+    """
+    Dựng ma trận mới từ ma trận cũ + Dijkstra CHỈ cho node mới / đổi.
+
+    1. Copy khối (node cũ không đổi) x (node cũ không đổi) từ ma trận cũ.
+    2. Dijkstra xuôi (hàng) + Dijkstra trên graph đảo chiều (cột) từ patch/via nodes.
+    3. Min-plus qua via nodes: đường cũ có thể ngắn lại nhờ đi qua node mới.
+    4. Ghi đè hàng/cột của patch nodes bằng kết quả Dijkstra (chính xác).
+    """
+    col_index = graph.encode(active_nodes)
+    n = len(active_nodes)
+    patch_set = set(plan["patch_nodes"])
+
+    old_pos = {nid: i for i, nid in enumerate(old.node_ids)}
+    keep_new = [j for j, nid in enumerate(active_nodes) if nid in old_pos and nid not in patch_set]
+    keep_old = [old_pos[active_nodes[j]] for j in keep_new]
+
+    dist = np.full((n, n), np.inf, dtype=MATRIX_DTYPE)
+    time = np.full((n, n), np.inf, dtype=MATRIX_DTYPE)
+    block = np.ix_(keep_new, keep_new)
+    old_block = np.ix_(keep_old, keep_old)
+    dist[block] = old.distance[old_block]
+    time[block] = old.time[old_block]
+
+    # Dijkstra từ tất cả node cần (patch ∪ via), xuôi và ngược
+    sources = list(dict.fromkeys(list(plan["via_nodes"]) + list(plan["patch_nodes"])))
+    if not sources:
+        return dist, time
+    src_idx = graph.encode(sources)
+    rev = reverse_graph(graph)
+    d_from, t_from = shortest_path_pair(
+        graph, src_idx, col_index, primary=primary, mode=mode, dtype=np.float64
+    )
+    d_to, t_to = shortest_path_pair(
+        rev, src_idx, col_index, primary=primary, mode=mode, dtype=np.float64
+    )
+
+    n_via = len(plan["via_nodes"])
+    if n_via:
+        work_d = dist.astype(np.float64)
+        work_t = time.astype(np.float64)
+        _relax_through(
+            work_d, work_t,
+            (d_to[:n_via].T, t_to[:n_via].T),
+            (d_from[:n_via], t_from[:n_via]),
+            mode, primary,
+        )
+        dist[:] = as_matrix_dtype(work_d, MATRIX_DTYPE)
+        time[:] = as_matrix_dtype(work_t, MATRIX_DTYPE)
+
+    # hàng / cột của patch nodes: ghi đè bằng kết quả Dijkstra
+    row_of = {nid: k for k, nid in enumerate(sources)}
+    pos = [j for j, nid in enumerate(active_nodes) if nid in patch_set]
+    ks = [row_of[active_nodes[j]] for j in pos]
+    dist[pos, :] = as_matrix_dtype(d_from[ks], MATRIX_DTYPE)
+    time[pos, :] = as_matrix_dtype(t_from[ks], MATRIX_DTYPE)
+    dist[:, pos] = as_matrix_dtype(d_to[ks].T, MATRIX_DTYPE)
+    time[:, pos] = as_matrix_dtype(t_to[ks].T, MATRIX_DTYPE)
+    return dist, time
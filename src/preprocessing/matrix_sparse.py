@@ -0,0 +1,121 @@
+# src/preprocessing/matrix_sparse.py
+"""
+Ma trận thưa k láng giềng gần nhất (MATRIX_STORAGE = "knn").
+
+Bản dày N x N của region đầy đủ (không sample khách) cần N^2 ô / ma trận: HCM cỡ
+vài chục GB. Bản thưa chỉ giữ k active node gần nhất của mỗi source (đủ cho các
+bước chỉ xét láng giềng gần: granular local search, chèn khách, gom cụm);
+cặp nằm ngoài k láng giềng được tính lại khi cần qua DistanceOracle
+(Dijkstra 1 source trên graph của region, hàng vừa tính giữ trong LRU).
+
+    knn = load_sparse_matrices("HCM")
+    idx, dist, tt = knn.neighbours(i)     # k láng giềng của i, gần -> xa
+    d, t = knn.pair(i, j)                 # có trong CSR -> tra, không -> Dijkstra
+"""
+
+import numpy as np
+
+from src.preprocessing.distance_oracle import DistanceOracle
+from src.preprocessing.matrix_store import load_matrix_nodes, load_region_knn
+from src.utils.config import ORACLE_CACHE_MB
+
+
+class SparseRegionMatrices:
+    """
+    Bản thưa (CSR theo source) của 1 region, chỉ số = vị trí trong node_ids.
+
+    - hàng i: indices[indptr[i]:indptr[i + 1]], distance / time cùng vị trí
+    - cặp thiếu: DistanceOracle (mode / primary như lúc tính bản thưa) trên
+      edges_{region}.npz, graph chỉ đọc khi lần đầu cần
+    """
+
+    def __init__(
+        self,
+        region: str,
+        node_ids: list,
+        indptr: np.ndarray,
+        indices: np.ndarray,
+        distance: np.ndarray,
+        time: np.ndarray,
+        mode: str = "path",
+        primary: str = "distance",
+        cache_mb: float = ORACLE_CACHE_MB,
+    ):
+        self.region = region
+        self.node_ids = list(node_ids)
+        self.indptr = indptr
+        self.indices = indices
+        self.distance = distance
+        self.time = time
+        self.mode = mode
+        self.primary = primary
+        self.cache_mb = cache_mb
+        self._oracle = None
+        self.hits = 0
+        self.fallbacks = 0
+
+    @property
+    def num_nodes(self) -> int:
+        return len(self.node_ids)
+
+    @property
+    def k(self) -> int:
+        return int(np.diff(self.indptr).max(initial=0))
+
+    def neighbours(self, i: int):
+        """(indices, distance, time) của các láng giềng đã lưu của i, gần -> xa."""
+        lo, hi = self.indptr[i], self.indptr[i + 1]
+        return self.indices[lo:hi], self.distance[lo:hi], self.time[lo:hi]
+
+    def pair(self, i: int, j: int):
+        """(distance, time) từ i tới j; không tới được = inf."""
+        if i == j:
+            return 0.0, 0.0
+        lo, hi = self.indptr[i], self.indptr[i + 1]
+        hit = np.flatnonzero(self.indices[lo:hi] == j)
+        if len(hit):
+            self.hits += 1
+            pos = lo + hit[0]
+            return float(self.distance[pos]), float(self.time[pos])
+        self.fallbacks += 1
+        dist_row, time_row = self.row(i)
+        return float(dist_row[j]), float(time_row[j])
+
+    def row(self, i: int):
+        """Hàng đầy đủ (distance, time) của i tới mọi active node (qua oracle, có LRU)."""
+        dist, time = self.oracle().rows_index([i])
+        return dist[0, :self.num_nodes], time[0, :self.num_nodes]
+
+    def oracle(self) -> DistanceOracle:
+        """Oracle của region; active node mã hoá trước nên chỉ số 0..N-1 trùng node_ids."""
+        if self._oracle is None:
+            self._oracle = DistanceOracle.for_region(
+                self.region, nodes=self.node_ids,
+                mode=self.mode, primary=self.primary, max_mb=self.cache_mb,
+            )
+        return self._oracle
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.fallbacks
+        return {
+            "hits": self.hits,
+            "fallbacks": self.fallbacks,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "oracle": None if self._oracle is None else self._oracle.stats(),
+        }
+
+
+def load_sparse_matrices(region: str, cache_mb: float = ORACLE_CACHE_MB) -> SparseRegionMatrices:
+    """Đọc knn_matrix_{region}.npz + sidecar node thành SparseRegionMatrices."""
+    knn = load_region_knn(region)
+    return SparseRegionMatrices(
+        region,
+        load_matrix_nodes(region),
+        knn["indptr"],
+        knn["indices"],
+        knn["distance"],
+        knn["time"],
+        mode=knn["mode"],
+        primary=knn["primary"],
+        cache_mb=cache_mb,
+    )
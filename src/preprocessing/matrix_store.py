@@ -0,0 +1,220 @@
+# src/preprocessing/matrix_store.py
+
+import os
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+from src.utils.config import (
+    DATA_PROCESSED,
+    DISTANCE_MATRIX,
+    KNN_MATRIX,
+    MATRIX_DTYPE,
+    MATRIX_NODES,
+    MATRIX_STATE,
+    TIME_MATRIX,
+    region_file,
+)
+
+# Bộ ma trận của 1 region: node_ids[i] là node của hàng/cột i
+RegionMatrices = namedtuple("RegionMatrices", ["node_ids", "distance", "time"])
+
+
+# ============================================================
+#  ĐƯỜNG DẪN FILE
+# ============================================================
+
+def matrix_paths(region: str) -> dict:
+    """
+    File ma trận của 1 region trong DATA_PROCESSED:
+        - distance / time: ma trận nhị phân .npy (MATRIX_DTYPE, mmap được)
+        - nodes: sidecar thứ tự node (cột node_id) của hàng/cột ma trận
+        - distance_csv / time_csv: bản CSV tương thích (tuỳ chọn)
+        - state: hash node/edge lúc tính ma trận (cho Stage 5 incremental)
+        - knn: bản thưa k láng giềng gần nhất (MATRIX_STORAGE = "knn")
+    """
+    return {
+        "distance": region_file(DISTANCE_MATRIX, region),
+        "time": region_file(TIME_MATRIX, region),
+        "nodes": region_file(MATRIX_NODES, region),
+        "distance_csv": DATA_PROCESSED / f"distance_matrix_{region}.csv",
+        "time_csv": DATA_PROCESSED / f"time_matrix_{region}.csv",
+        "state": region_file(MATRIX_STATE, region),
+        "knn": region_file(KNN_MATRIX, region),
+    }
+
+
+def region_matrices_exist(region: str) -> bool:
+    """Region đã có ma trận (bản nhị phân, hoặc bản CSV cũ)."""
+    paths = matrix_paths(region)
+    binary = all(paths[k].exists() for k in ("distance", "time", "nodes"))
+    legacy = paths["distance_csv"].exists() and paths["time_csv"].exists()
+    return binary or legacy
+
+
+def region_knn_exists(region: str) -> bool:
+    """Region đã có bản thưa (knn_matrix_{region}.npz)."""
+    return matrix_paths(region)["knn"].exists()
+
+
+def _remove(paths: dict, keys):
+    for key in keys:
+        paths[key].unlink(missing_ok=True)
+
+
+# ============================================================
+#  GHI
+# ============================================================
+
+def _save_matrix_csv(values: np.ndarray, node_ids: list, path):
+    """Ghi ma trận ra CSV (index/cột = node_id); không tới được (inf) -> ô trống."""
+    values = np.where(np.isinf(values), np.nan, values)
+    pd.DataFrame(values, index=node_ids, columns=node_ids).to_csv(path)
+
+
+def _save_npy_atomic(path, values: np.ndarray):
+    """
+    Ghi .npy qua file tạm rồi os.replace: process khác đang mmap bản cũ
+    vẫn đọc được inode cũ, không thấy file ghi dở.
+    """
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "wb") as f:
+        np.save(f, np.asarray(values, dtype=MATRIX_DTYPE))
+    os.replace(tmp, path)
+
+
+def save_region_matrices(
+    region: str,
+    node_ids: list,
+    distance: np.ndarray,
+    time: np.ndarray,
+    write_csv: bool = False,
+) -> dict:
+    """
+    Lưu ma trận distance/time của region dạng .npy (MATRIX_DTYPE) + sidecar node.
+    Không tới được giữ nguyên inf trong bản nhị phân.
+    write_csv=True: ghi thêm bản CSV N x N như trước (tương thích công cụ cũ).
+    """
+    paths = matrix_paths(region)
+    DATA_PROCESSED.mkdir(exist_ok=True)
+
+    _save_npy_atomic(paths["distance"], distance)
+    _save_npy_atomic(paths["time"], time)
+    pd.DataFrame({"node_id": list(node_ids)}).to_csv(paths["nodes"], index=False)
+    _remove(paths, ["knn"])  # mỗi region chỉ giữ 1 kiểu lưu
+
+    if write_csv:
+        _save_matrix_csv(distance, node_ids, paths["distance_csv"])
+        _save_matrix_csv(time, node_ids, paths["time_csv"])
+    return paths
+
+
+def save_region_knn(
+    region: str,
+    node_ids: list,
+    indptr: np.ndarray,
+    indices: np.ndarray,
+    distance: np.ndarray,
+    time: np.ndarray,
+    mode: str,
+    primary: str,
+) -> dict:
+    """
+    Lưu bản thưa (CSR theo source) của region vào knn_matrix_{region}.npz + sidecar node.
+
+    Hàng i = indices[indptr[i]:indptr[i + 1]] (chỉ số active node), sắp tăng theo primary.
+    mode / primary lưu kèm để phần tính lại cặp thiếu dùng đúng cách tính.
+    Bản dày cũ của region (nếu có) bị xoá: không để .npy lệch thứ tự node với sidecar mới.
+    """
+    paths = matrix_paths(region)
+    DATA_PROCESSED.mkdir(exist_ok=True)
+
+    tmp = paths["knn"].with_name(paths["knn"].name + ".tmp")
+    with open(tmp, "wb") as f:
+        np.savez(
+            f,
+            indptr=np.asarray(indptr, dtype=np.int64),
+            indices=np.asarray(indices, dtype=np.int32),
+            distance=np.asarray(distance, dtype=MATRIX_DTYPE),
+            time=np.asarray(time, dtype=MATRIX_DTYPE),
+            mode=np.array(mode),
+            primary=np.array(primary),
+        )
+    os.replace(tmp, paths["knn"])
+    pd.DataFrame({"node_id": list(node_ids)}).to_csv(paths["nodes"], index=False)
+    _remove(paths, ["distance", "time", "distance_csv", "time_csv", "state"])
+    return paths
+
+
+# ============================================================
+#  ĐỌC (dùng chung cho Stage 6 + GA)
+# ============================================================
+
+def load_matrix_nodes(region: str) -> list:
+    """Thứ tự node của hàng/cột ma trận (không phải đọc cả ma trận)."""
+    paths = matrix_paths(region)
+    if paths["nodes"].exists():
+        return pd.read_csv(paths["nodes"], dtype={"node_id": str})["node_id"].tolist()
+    # bản CSV cũ: chỉ đọc cột index
+    return pd.read_csv(paths["distance_csv"], usecols=[0]).iloc[:, 0].tolist()
+
+
+def load_region_matrices(region: str, mmap: bool = True) -> RegionMatrices:
+    """
+    Đọc ma trận của region.
+
+    - Bản .npy: mmap=True -> np.memmap chỉ đọc, không copy (vài ms cho 2000 x 2000).
+    - Nếu chỉ có bản CSV cũ: đọc CSV (chậm), ô trống -> inf.
+    """
+    paths = matrix_paths(region)
+    node_ids = load_matrix_nodes(region)
+
+    if paths["distance"].exists() and paths["time"].exists():
+        mode = "r" if mmap else None
+        distance = np.load(paths["distance"], mmap_mode=mode)
+        time = np.load(paths["time"], mmap_mode=mode)
+    elif paths["distance_csv"].exists() and paths["time_csv"].exists():
+        distance = _load_matrix_csv(paths["distance_csv"])
+        time = _load_matrix_csv(paths["time_csv"])
+    elif paths["knn"].exists():
+        raise FileNotFoundError(
+            f"Region {region} chỉ có bản thưa {paths['knn'].name} (MATRIX_STORAGE='knn'), "
+            "cần ma trận dày: chạy lại Stage 5 với MATRIX_STORAGE='dense'"
+        )
+    else:
+        raise FileNotFoundError(f"Region {region} chưa có ma trận: chạy Stage 5 trước")
+    return RegionMatrices(node_ids, distance, time)
+
+
+def load_region_knn(region: str) -> dict:
+    """Đọc bản thưa của region: indptr, indices, distance, time (+ mode, primary dạng str)."""
+    with np.load(matrix_paths(region)["knn"], allow_pickle=False) as data:
+        knn = {key: data[key] for key in data.files}
+    knn["mode"] = str(knn["mode"])
+    knn["primary"] = str(knn["primary"])
+    return knn
+
+
+def _load_matrix_csv(path) -> np.ndarray:
+    values = pd.read_csv(path, index_col=0).to_numpy(dtype=MATRIX_DTYPE)
+    values[np.isnan(values)] = np.inf
+    return values
+
+
+# ============================================================
+#  TRẠNG THÁI (hash node/edge) CHO STAGE 5 INCREMENTAL
+# ============================================================
+
+def save_region_state(region: str, state: dict):
+    """Lưu dict các mảng NumPy (hash node/edge, cấu hình ma trận) vào matrix_state_{region}.npz."""
+    np.savez(matrix_paths(region)["state"], **state)
+
+
+def load_region_state(region: str):
+    """Đọc trạng thái lần tính trước, None nếu chưa có."""
+    path = matrix_paths(region)["state"]
+    if not path.exists():
+        return None
+    with np.load(path, allow_pickle=False) as data:
+        return {key: data[key] for key in data.files}
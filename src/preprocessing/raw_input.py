@@ -0,0 +1,121 @@
+# src/preprocessing/raw_input.py
+"""
+Đọc file raw của Giai đoạn 1 (customers / depots / vehicles) có cache.
+
+- Upstream thả bản .parquet / .csv cùng tên -> đọc thẳng bản đó (RAW_INPUT_FORMATS).
+- File Excel: parse 1 lần rồi lưu vào RAW_CACHE_DIR (data_processed/raw_cache/):
+    + {tên file}.parquet, hoặc .pkl khi không có pyarrow (RAW_CACHE_FORMAT = "auto")
+    + {tên file}.json: hash blake2b nội dung file nguồn (FileHasher, cache theo
+      size + mtime) + định dạng cache
+  Lần sau hash khớp -> đọc cache, không gọi openpyxl; cache hỏng -> parse lại.
+"""
+
+import importlib.util
+import json
+import os
+from pathlib import Path
+
+import pandas as pd
+
+from src.utils.config import RAW_CACHE_DIR, RAW_CACHE_FORMAT, RAW_INPUT_FORMATS
+from src.utils.pipeline import FileHasher
+
+_EXCEL_SUFFIXES = (".xlsx", ".xls")
+
+
+# ============================================================
+#  CHỌN FILE NGUỒN
+# ============================================================
+
+def raw_source(path: Path) -> Path:
+    """
+    File nguồn thực tế cho 1 file raw (vd. CUSTOMERS_RAW).
+
+    Nếu upstream thả bản export cùng tên với đuôi khác (customers_vietnam.parquet /
+    .csv) thì dùng bản đó, theo thứ tự ưu tiên RAW_INPUT_FORMATS.
+    Không có bản nào -> trả lại path gốc (đọc sẽ báo lỗi như cũ).
+    """
+    path = Path(path)
+    for suffix in RAW_INPUT_FORMATS:
+        candidate = path.with_suffix(suffix)
+        if candidate.exists():
+            return candidate
+    return path
+
+
+def _read_source(path: Path) -> pd.DataFrame:
+    if path.suffix == ".parquet":
+        return pd.read_parquet(path)
+    if path.suffix == ".csv":
+        # round_trip: số thực đọc ra đúng bằng giá trị đã ghi (như khi đọc Excel)
+        return pd.read_csv(path, float_precision="round_trip")
+    return pd.read_excel(path)
+
+
+# ============================================================
+#  CACHE CHO FILE EXCEL
+# ============================================================
+
+def _cache_format():
+    """Định dạng cache: parquet nếu có pyarrow, không thì pickle (giữ nguyên dtype)."""
+    if RAW_CACHE_FORMAT != "auto":
+        return RAW_CACHE_FORMAT
+    return "parquet" if importlib.util.find_spec("pyarrow") else "pickle"
+
+
+def _cache_paths(source: Path, fmt: str):
+    ext = "parquet" if fmt == "parquet" else "pkl"
+    return RAW_CACHE_DIR / f"{source.stem}.{ext}", RAW_CACHE_DIR / f"{source.stem}.json"
+
+
+def _load_meta(meta_path: Path) -> dict:
+    try:
+        return json.loads(meta_path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+
+
+def _read_cache(path: Path, fmt: str) -> pd.DataFrame:
+    return pd.read_parquet(path) if fmt == "parquet" else pd.read_pickle(path)
+
+
+def _write_cache(df: pd.DataFrame, path: Path, fmt: str):
+    tmp = path.with_name(path.name + ".tmp")
+    if fmt == "parquet":
+        df.to_parquet(tmp, index=False)
+    else:
+        df.to_pickle(tmp)
+    os.replace(tmp, path)
+
+
+def read_raw_table(path: Path) -> pd.DataFrame:
+    """
+    Đọc 1 file raw của Giai đoạn 1 thành DataFrame.
+
+    - Có bản .parquet / .csv cùng tên: đọc thẳng bản đó (không cache).
+    - File .xlsx: lần đầu parse bằng openpyxl rồi lưu bản cột (parquet/pickle)
+      vào RAW_CACHE_DIR; các lần sau đọc cache nếu hash nội dung file nguồn
+      không đổi (hash được cache theo size + mtime như pipeline runner).
+    """
+    source = raw_source(path)
+    fmt = _cache_format()
+    if source.suffix not in _EXCEL_SUFFIXES or not fmt:
+        return _read_source(source)
+
+    cache_path, meta_path = _cache_paths(source, fmt)
+    meta = _load_meta(meta_path)
+    digest = FileHasher(meta.setdefault("files", {})).file_digest(source)
+
+    if meta.get("digest") == digest and meta.get("format") == fmt and cache_path.exists():
+        try:
+            return _read_cache(cache_path, fmt)
+        except Exception as e:  # cache hỏng / khác phiên bản pandas -> parse lại
+            print(f"⚠ Cache {cache_path.name} không đọc được ({e}), parse lại {source.name}")
+
+    df = _read_source(source)
+    RAW_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    _write_cache(df, cache_path, fmt)
+    meta.update({"source": str(source), "digest": digest, "format": fmt})
+    meta_path.write_text(json.dumps(meta, indent=2), encoding="utf-8")
+    print(f"  · Cache {source.name} → {cache_path.name}")
+    return df
@@ -0,0 +1,255 @@
+# src/preprocessing/sharding.py
+"""
+Chia region lớn thành các shard cân bằng theo depot (bước cuối Giai đoạn 3).
+
+Mỗi customer thuộc "lãnh thổ" của depot có đường trực tiếp ngắn nhất (edges_master;
+không có cạnh tới depot nào -> depot gần nhất theo haversine); các depot (điểm = toạ độ
+depot, trọng số = tổng demand_weight của lãnh thổ) được chia bằng recursive coordinate
+bisection: cắt theo trục lat / lon trải rộng hơn tại điểm chia đều trọng số.
+Shard = nhóm depot + khách của chúng -> xe (theo start depot) không bao giờ cần
+khách của shard khác, khách luôn có đường tới ít nhất 1 depot trong shard.
+
+Kết quả ghi ra node_shards.csv (node_id, region_id, shard_id; shard_id = region_id nếu
+region không bị chia, "{region}_{i}" nếu có). Giai đoạn 4–6 và GA coi shard là đơn vị:
+edges / ma trận / bài toán theo shard, build + giải song song như các region; cạnh nối
+2 shard vào edges_cross_region.npz. GA ghép kết quả các shard về region
+(ga_improved.merge_shard_results).
+"""
+
+import math
+
+import numpy as np
+import pandas as pd
+
+from src.preprocessing.edge_store import load_edge_table, node_codes
+from src.preprocessing.spatial_index import SpatialIndex
+from src.utils.config import (
+    CUSTOMERS_CLEAN,
+    EDGES_MASTER,
+    NODE_SHARDS,
+    NODES_MASTER,
+    SHARD_MAX_CUSTOMERS,
+    SHARD_MIN_DEPOTS,
+)
+
+SHARD_COLUMN = "shard_id"
+
+
+def attach_shards(nodes: pd.DataFrame) -> pd.DataFrame:
+    """nodes + cột shard_id theo node_shards.csv (chưa có file / node không có trong file -> region_id)."""
+    shard = nodes["region_id"]
+    if NODE_SHARDS.exists():
+        mapping = pd.read_csv(NODE_SHARDS, dtype={"node_id": str})
+        mapping = mapping.drop_duplicates("node_id").set_index("node_id")[SHARD_COLUMN]
+        shard = nodes["node_id"].astype(str).map(mapping).fillna(shard)
+    return nodes.assign(**{SHARD_COLUMN: shard})
+
+
+# ============================================================
+#  RECURSIVE BISECTION
+# ============================================================
+
+def _bisect(xy: np.ndarray, weights: np.ndarray, parts: int, min_size: int = 1) -> np.ndarray:
+    """
+    Nhãn 0..parts-1 cho từng điểm, tổng trọng số mỗi phần gần bằng nhau.
+    Mỗi bước cắt theo trục trải rộng hơn, phần trái nhận parts // 2 phần
+    (mỗi phần luôn còn >= min_size điểm; cần len(xy) >= parts * min_size).
+    """
+    labels = np.zeros(len(xy), dtype=np.int64)
+    if parts <= 1 or len(xy) <= 1:
+        return labels
+
+    axis = int(np.argmax(np.ptp(xy, axis=0)))
+    order = np.argsort(xy[:, axis], kind="stable")
+    left_parts = parts // 2
+    target = weights.sum() * left_parts / parts
+    cum = np.cumsum(weights[order])
+
+    # cắt sau phần tử cut-1, giữ đủ điểm cho mỗi bên
+    lo, hi = left_parts * min_size, len(xy) - (parts - left_parts) * min_size
+    cut = int(np.argmin(np.abs(cum[lo - 1:hi] - target))) + lo
+    left, right = order[:cut], order[cut:]
+    labels[left] = _bisect(xy[left], weights[left], left_parts, min_size)
+    labels[right] = left_parts + _bisect(xy[right], weights[right], parts - left_parts, min_size)
+    return labels
+
+
+def _local_xy(lat: np.ndarray, lon: np.ndarray) -> np.ndarray:
+    """lat/lon -> mặt phẳng (km) quanh tâm vùng, đủ chính xác trong phạm vi 1 region."""
+    lat0 = np.radians(np.mean(lat))
+    return np.column_stack([lat * 111.32, lon * 111.32 * np.cos(lat0)])
+
+
+# ============================================================
+#  GÁN SHARD
+# ============================================================
+
+def road_territories(nodes: pd.DataFrame, edges: pd.DataFrame) -> pd.Series:
+    """
+    customer node_id -> depot cùng region có đường trực tiếp cả 2 chiều (customer -> depot
+    và depot -> customer) với tổng distance_km nhỏ nhất; không có depot nào đủ 2 chiều
+    -> depot có cạnh 1 chiều ngắn nhất.
+    """
+    vocab, origin, destination = node_codes(edges)
+    lookup = nodes.drop_duplicates("node_id").set_index("node_id")
+    node_type = lookup["node_type"].reindex(vocab).to_numpy(dtype=object)
+    region = lookup["region_id"].reindex(vocab).to_numpy(dtype=object)
+    is_depot = node_type == "depot"
+    is_customer = node_type == "customer"
+    distance = edges["distance_km"].to_numpy(dtype=np.float64)
+
+    def _legs(customer, depot, mask):
+        same = mask & (region[customer] == region[depot])
+        legs = pd.DataFrame({"customer": customer[same], "depot": depot[same], "km": distance[same]})
+        return legs.groupby(["customer", "depot"])["km"].min()
+
+    outbound = _legs(origin, destination, is_customer[origin] & is_depot[destination])
+    inbound = _legs(destination, origin, is_depot[origin] & is_customer[destination])
+    pairs = pd.concat([outbound.rename("out"), inbound.rename("in")], axis=1).reset_index()
+    pairs["one_way"] = pairs["out"].isna() | pairs["in"].isna()
+    pairs["km"] = pairs[["out", "in"]].sum(axis=1)
+
+    best = pairs.sort_values(["one_way", "km", "depot"], kind="stable").drop_duplicates("customer")
+    return pd.Series(vocab[best["depot"].to_numpy()], index=vocab[best["customer"].to_numpy()])
+
+
+def shard_region(
+    region: str,
+    depots: pd.DataFrame,
+    customers: pd.DataFrame,
+    max_customers: int,
+    territories: pd.Series = None,
+) -> tuple:
+    """
+    (depot_shard, customer_shard) – Series shard_id theo index của depots / customers
+    của 1 region. Số shard = ceil(số khách / max_customers), mỗi shard >= SHARD_MIN_DEPOTS
+    depot có khách; depot không có khách nào theo shard của depot có khách gần nhất.
+    territories: customer -> depot (road_territories); thiếu -> depot gần nhất theo haversine.
+    """
+    min_depots = max(1, int(SHARD_MIN_DEPOTS or 1))
+    territory = np.full(len(customers), -1, dtype=np.int64)
+    if territories is not None:
+        territory = pd.Index(depots["node_id"]).get_indexer(customers["node_id"].map(territories))
+    missing = territory < 0
+    if missing.any():
+        index = SpatialIndex(np.arange(len(depots)), depots["lat"], depots["lon"])
+        _, nearest = index.query(customers["lat"][missing], customers["lon"][missing])
+        territory[missing] = nearest[:, 0]
+
+    demand = pd.to_numeric(customers["demand_weight"], errors="coerce").fillna(0.0).to_numpy()
+    if demand.sum() <= 0:
+        demand = np.ones(len(customers))
+    weights = np.bincount(territory, weights=demand, minlength=len(depots))
+    served = np.bincount(territory, minlength=len(depots)) > 0
+
+    n_shards = min(int(served.sum()) // min_depots, math.ceil(len(customers) / max_customers))
+    if n_shards <= 1:
+        return (
+            pd.Series(region, index=depots.index, dtype=object),
+            pd.Series(region, index=customers.index, dtype=object),
+        )
+
+    lat = depots["lat"].to_numpy(dtype=np.float64)
+    lon = depots["lon"].to_numpy(dtype=np.float64)
+    labels = np.empty(len(depots), dtype=np.int64)
+    labels[served] = _bisect(_local_xy(lat, lon)[served], weights[served], n_shards, min_depots)
+    if not served.all():
+        hubs = SpatialIndex(np.flatnonzero(served), lat[served], lon[served])
+        _, hub = hubs.query(lat[~served], lon[~served])
+        labels[~served] = labels[hubs.ids[hub[:, 0]].astype(np.int64)]
+
+    names = np.asarray([f"{region}_{i + 1}" for i in range(n_shards)], dtype=object)
+    return (
+        pd.Series(names[labels], index=depots.index, dtype=object),
+        pd.Series(names[labels[territory]], index=customers.index, dtype=object),
+    )
+
+
+def assign_shards(
+    nodes: pd.DataFrame,
+    customers: pd.DataFrame,
+    territories: pd.Series = None,
+    max_customers: int = None,
+) -> pd.Series:
+    """
+    shard_id cho từng node của nodes_master (cùng index với nodes).
+
+    - customers: customers_clean (lấy demand_weight làm trọng số cân bằng)
+    - territories: customer -> depot (road_territories), None -> theo haversine
+    - max_customers (mặc định SHARD_MAX_CUSTOMERS; None -> không chia): region có
+      nhiều khách hơn mới bị chia
+    - node thiếu toạ độ / không có depot trong region -> giữ shard = region_id
+    """
+    max_customers = SHARD_MAX_CUSTOMERS if max_customers is None else max_customers
+    shard = nodes["region_id"].astype(object).copy()
+    if not max_customers:
+        return shard
+
+    demand = customers.drop_duplicates("customer_id").set_index("customer_id")["demand_weight"]
+    located = nodes["lat"].notna() & nodes["lon"].notna()
+    for region, group in nodes[located].groupby("region_id"):
+        depots = group[group["node_type"] == "depot"]
+        cust = group[group["node_type"] == "customer"]
+        if len(cust) <= max_customers or depots.empty:
+            continue
+        cust = cust.assign(demand_weight=cust["node_id"].map(demand).to_numpy())
+        depot_shard, customer_shard = shard_region(region, depots, cust, max_customers, territories)
+
+        sizes = customer_shard.value_counts().sort_index()
+        if len(sizes) <= 1:
+            print(f"  ⚠ Region {region}: {len(cust)} khách nhưng không đủ depot có khách "
+                  f"(>= {SHARD_MIN_DEPOTS} / shard) để chia, giữ nguyên.")
+            continue
+        shard[depot_shard.index] = depot_shard
+        shard[customer_shard.index] = customer_shard
+
+        load = cust["demand_weight"].groupby(customer_shard).sum()
+        print(f"  - Region {region}: {len(cust)} khách -> {len(sizes)} shard")
+        for name, count in sizes.items():
+            flag = f"  ⚠ > {max_customers} khách" if count > max_customers else ""
+            print(
+                f"    · {name}: {count} khách, {int((depot_shard == name).sum())} depot, "
+                f"demand {load.get(name, 0.0):.0f}{flag}"
+            )
+    return shard
+
+
+def build_node_shards(max_customers: int = None):
+    """
+    Bước cuối GIAI ĐOẠN 3 – chia shard.
+
+    - Đọc nodes_master.csv, customers_clean.csv (demand_weight), edges_master.npz
+      (lãnh thổ depot theo đường thật)
+    - Ghi node_shards.csv: node_id, region_id, shard_id
+    """
+    nodes = pd.read_csv(NODES_MASTER, dtype={"node_id": str})
+    customers = pd.read_csv(CUSTOMERS_CLEAN, dtype={"customer_id": str})
+    territories = None
+    if EDGES_MASTER.exists():
+        edges = load_edge_table(EDGES_MASTER, columns=["origin_id", "destination_id", "distance_km"])
+        territories = road_territories(nodes, edges)
+
+    shards = nodes[["node_id", "region_id"]].assign(
+        **{SHARD_COLUMN: assign_shards(nodes, customers, territories, max_customers)}
+    )
+    shards.to_csv(NODE_SHARDS, index=False)
+
+    n_regions = shards["region_id"].nunique()
+    n_shards = shards[SHARD_COLUMN].nunique()
+    print(f"✔ Chia shard: {n_regions} region -> {n_shards} đơn vị cho Giai đoạn 4–6")
+    print(f"  → Đã lưu tại: {NODE_SHARDS}")
+
+
+def region_shards(regions: list = None) -> dict:
+    """region_id -> list shard_id theo node_shards.csv (region chưa chia -> [region])."""
+    if not NODES_MASTER.exists():
+        return {region: [region] for region in regions or []}
+    nodes = attach_shards(pd.read_csv(NODES_MASTER, dtype={"node_id": str}))
+    pairs = nodes[["region_id", SHARD_COLUMN]].dropna().drop_duplicates()
+    groups = {
+        region: group[SHARD_COLUMN].tolist()
+        for region, group in pairs.groupby("region_id", sort=False)
+    }
+    if regions is None:
+        return groups
+    return {region: groups.get(region, [region]) for region in regions}
@@ -0,0 +1,210 @@
+# src/preprocessing/spatial_index.py
+"""
+Index không gian (KD-tree) cho depot / customer theo lat/lon.
+
+Điểm (lat, lon) được đổi sang vector đơn vị 3D; khoảng cách dây cung trên mặt cầu
+đồng biến với khoảng cách haversine nên k láng giềng của KD-tree 3D (scipy cKDTree)
+đúng bằng k láng giềng theo haversine, không sai lệch gần kinh tuyến 180 / cực.
+
+    depots = load_depot_index()
+    km, ids = depots.nearest(lat, lon, k=3)            # mảng (n x 3), gần -> xa
+    region = assign_regions(customers, depots_df)      # Stage 1: region theo depot gần nhất
+"""
+
+import numpy as np
+import pandas as pd
+from scipy.spatial import cKDTree
+
+from src.preprocessing.graph_engine import EARTH_RADIUS_KM
+from src.utils.config import (
+    CUSTOMERS_CLEAN,
+    DEPOTS_CLEAN,
+    REGION_MAP,
+    SPATIAL_K_DEPOTS,
+    SPATIAL_WARN_KM,
+    city_to_region,
+)
+
+
+def _unit_vectors(lat, lon) -> np.ndarray:
+    lat = np.radians(np.asarray(lat, dtype=np.float64))
+    lon = np.radians(np.asarray(lon, dtype=np.float64))
+    cos_lat = np.cos(lat)
+    return np.column_stack([cos_lat * np.cos(lon), cos_lat * np.sin(lon), np.sin(lat)])
+
+
+def _chord_to_km(chord: np.ndarray) -> np.ndarray:
+    return 2.0 * EARTH_RADIUS_KM * np.arcsin(np.clip(chord / 2.0, 0.0, 1.0))
+
+
+def _km_to_chord(km: float) -> float:
+    return 2.0 * np.sin(min(km / (2.0 * EARTH_RADIUS_KM), np.pi / 2))
+
+
+# ============================================================
+#  INDEX
+# ============================================================
+
+class SpatialIndex:
+    """
+    KD-tree trên các điểm (ids[i], lat[i], lon[i]).
+
+    - query / nearest: k điểm gần nhất (haversine, km) cho cả lô toạ độ, 1 lần gọi
+    - within: các điểm trong bán kính radius_km
+    - labels: nhãn tuỳ chọn theo điểm (vd. region_id của depot)
+    """
+
+    def __init__(self, ids, lat, lon, labels=None):
+        self.ids = np.asarray(ids, dtype=object)
+        self.lat = np.asarray(lat, dtype=np.float64)
+        self.lon = np.asarray(lon, dtype=np.float64)
+        self.labels = None if labels is None else np.asarray(labels, dtype=object)
+        self.tree = cKDTree(_unit_vectors(self.lat, self.lon))
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, id_col: str, label_col: str = None) -> "SpatialIndex":
+        """Index từ DataFrame có cột lat / lon (bỏ dòng thiếu toạ độ)."""
+        df = df.dropna(subset=["lat", "lon"])
+        labels = df[label_col] if label_col else None
+        return cls(df[id_col], df["lat"], df["lon"], labels=labels)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def query(self, lat, lon, k: int = 1):
+        """
+        (km, idx) dạng (n x k): khoảng cách haversine + vị trí điểm, gần -> xa.
+        k > số điểm -> cột thừa km = inf, idx = -1.
+        """
+        k = max(1, int(k))
+        chord, idx = self.tree.query(_unit_vectors(lat, lon), k=k)
+        chord, idx = chord.reshape(-1, k), idx.reshape(-1, k)
+        missing = idx >= len(self)
+        idx = np.where(missing, -1, idx)
+        return np.where(missing, np.inf, _chord_to_km(chord)), idx
+
+    def nearest(self, lat, lon, k: int = 1):
+        """(km, ids) dạng (n x k) – như query nhưng trả về id thay cho vị trí."""
+        km, idx = self.query(lat, lon, k=k)
+        ids = self.ids[np.where(idx >= 0, idx, 0)]
+        ids[idx < 0] = None
+        return km, ids
+
+    def within(self, lat: float, lon: float, radius_km: float) -> np.ndarray:
+        """Id các điểm cách (lat, lon) không quá radius_km, gần -> xa."""
+        point = _unit_vectors([lat], [lon])[0]
+        idx = np.asarray(self.tree.query_ball_point(point, _km_to_chord(radius_km)), dtype=np.int64)
+        if len(idx) == 0:
+            return self.ids[:0]
+        chord = np.linalg.norm(self.tree.data[idx] - point, axis=1)
+        return self.ids[idx[np.argsort(chord, kind="stable")]]
+
+
+def load_depot_index(region: str = None) -> SpatialIndex:
+    """Index depot (nhãn = region_id) từ depots_clean.csv, lọc theo region nếu truyền vào."""
+    depots = pd.read_csv(DEPOTS_CLEAN, dtype={"depot_id": str})
+    if region is not None:
+        depots = depots[depots["region_id"] == region]
+    return SpatialIndex.from_frame(depots, "depot_id", label_col="region_id")
+
+
+def load_customer_index(region: str = None) -> SpatialIndex:
+    """Index customer (nhãn = region_id) từ customers_clean.csv, lọc theo region nếu truyền vào."""
+    customers = pd.read_csv(CUSTOMERS_CLEAN, dtype={"customer_id": str})
+    if region is not None:
+        customers = customers[customers["region_id"] == region]
+    return SpatialIndex.from_frame(customers, "customer_id", label_col="region_id")
+
+
+# ============================================================
+#  GÁN REGION (GIAI ĐOẠN 1)
+# ============================================================
+
+def _city_hint(city: pd.Series) -> pd.Series:
+    """Region theo tên city, chỉ khi city có trong REGION_MAP (không fallback viết hoa)."""
+    hint = city.map(city_to_region)
+    known = city.astype(str).str.strip().isin(list(REGION_MAP))
+    return hint.where(known)
+
+
+def assign_depot_regions(depots: pd.DataFrame) -> pd.Series:
+    """
+    region_id cho depot.
+
+    - city có trong REGION_MAP -> region của city (danh sách tay, chuẩn)
+    - city lạ / viết sai -> region của depot có city chuẩn gần nhất
+    - không có depot chuẩn nào -> city_to_region (fallback viết hoa như bản cũ)
+    """
+    region = _city_hint(depots["city"])
+    unknown = region.isna() & depots["lat"].notna() & depots["lon"].notna()
+    reference = depots[region.notna()].assign(region_id=region[region.notna()])
+    if unknown.any() and len(reference):
+        index = SpatialIndex.from_frame(reference, "depot_id", label_col="region_id")
+        km, idx = index.query(depots.loc[unknown, "lat"], depots.loc[unknown, "lon"])
+        region[unknown] = index.labels[idx[:, 0]]
+        print(f"  - {int(unknown.sum())} depot có city ngoài REGION_MAP -> gán theo depot gần nhất "
+              f"(xa nhất {km[:, 0].max():.1f} km)")
+    return region.fillna(depots["city"].map(city_to_region))
+
+
+def nearest_depots(customers: pd.DataFrame, depots: pd.DataFrame, k: int = None):
+    """
+    k depot gần nhất của từng customer (1 lần truy vấn KD-tree cho cả bảng).
+    Trả về (km, depot_ids, depot_regions), mỗi mảng (len(customers) x k), gần -> xa;
+    customer thiếu toạ độ -> km = inf, id / region = None.
+    """
+    k = k or SPATIAL_K_DEPOTS
+    index = SpatialIndex.from_frame(depots, "depot_id", label_col="region_id")
+    n = len(customers)
+    km = np.full((n, k), np.inf)
+    ids = np.full((n, k), None, dtype=object)
+    regions = np.full((n, k), None, dtype=object)
+
+    lat = pd.to_numeric(customers["lat"], errors="coerce").to_numpy(dtype=np.float64)
+    lon = pd.to_numeric(customers["lon"], errors="coerce").to_numpy(dtype=np.float64)
+    ok = np.isfinite(lat) & np.isfinite(lon)
+    if ok.any() and len(index):
+        km_ok, idx = index.query(lat[ok], lon[ok], k=k)
+        found = idx >= 0
+        safe = np.where(found, idx, 0)
+        km[ok] = km_ok
+        ids[ok] = np.where(found, index.ids[safe], None)
+        regions[ok] = np.where(found, index.labels[safe], None)
+    return km, ids, regions
+
+
+def assign_regions(customers: pd.DataFrame, depots: pd.DataFrame, k: int = None) -> pd.DataFrame:
+    """
+    Gán region cho customer theo vị trí, city chỉ là gợi ý.
+
+    - region = region của depot gần nhất
+    - city (có trong REGION_MAP) trùng region của 1 trong k depot gần nhất
+      -> giữ region theo city (khách ở ranh giới 2 region)
+    - thiếu toạ độ -> region theo city như bản cũ
+
+    Trả về DataFrame (cùng index) gồm region_id, nearest_depot_id, nearest_depot_km.
+    """
+    km, ids, regions = nearest_depots(customers, depots, k=k)
+    hint = _city_hint(customers["city"]).to_numpy(dtype=object)
+
+    geo = regions[:, 0]
+    agrees = (regions == hint[:, None]).any(axis=1) & pd.notna(hint)
+    region = np.where(agrees, hint, geo)
+    located = pd.notna(geo)
+    region = np.where(located, region, customers["city"].map(city_to_region).to_numpy(dtype=object))
+
+    moved = located & pd.notna(hint) & ~agrees
+    if moved.any():
+        print(f"  ⚠ {int(moved.sum())} customer có city không khớp vị trí -> gán theo depot gần nhất")
+    far = located & (km[:, 0] > SPATIAL_WARN_KM)
+    if far.any():
+        print(f"  ⚠ {int(far.sum())} customer cách depot gần nhất > {SPATIAL_WARN_KM} km")
+
+    return pd.DataFrame(
+        {
+            "region_id": region,
+            "nearest_depot_id": ids[:, 0],
+            "nearest_depot_km": km[:, 0],
+        },
+        index=customers.index,
+    )
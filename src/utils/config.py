@@ -12,6 +12,14 @@ CUSTOMERS_RAW = DATA_RAW / "customers_vietnam.xlsx"
 DEPOTS_RAW = DATA_RAW / "depots_vietnam.xlsx"
 VEHICLES_RAW = DATA_RAW / "vehicles_vietnam.xlsx"
 
+# --------- CACHE / NGUỒN THAY THẾ CHO FILE RAW ---------
+# File raw có thể được thay bằng bản export CSV / Parquet cùng tên trong DATA_RAW
+# (vd. customers_vietnam.parquet); đuôi nào đứng trước trong list được ưu tiên.
+RAW_INPUT_FORMATS = [".parquet", ".csv", ".xlsx"]
+# Bản đã parse của file .xlsx được cache lại (theo hash nội dung file nguồn)
+RAW_CACHE_DIR = DATA_PROCESSED / "raw_cache"
+RAW_CACHE_FORMAT = "auto"            # "parquet" (cần pyarrow), "pickle", "auto" hoặc None (tắt cache)
+
 # --------- FILE CLEAN (GIAI ĐOẠN 1) ---------
 CUSTOMERS_CLEAN = DATA_PROCESSED / "customers_clean.csv"
 DEPOTS_CLEAN = DATA_PROCESSED / "depots_clean.csv"
@@ -19,7 +27,37 @@ VEHICLES_CLEAN = DATA_PROCESSED / "vehicles_clean.csv"
 
 # --------- FILE GIAI ĐOẠN 2+ ---------
 NODES_MASTER = DATA_PROCESSED / "nodes_master.csv"
-EDGES_MASTER = DATA_PROCESSED / "edges_master.csv"  
+EDGES_MASTER = DATA_PROCESSED / "edges_master.npz"   # bảng edge có kiểu (edge_store)
+EDGES_CROSS_REGION = DATA_PROCESSED / "edges_cross_region.npz"   # cạnh nối 2 region (Stage 4)
+NODE_SHARDS = DATA_PROCESSED / "node_shards.csv"   # node_id -> shard_id (cuối Stage 3)
+
+# --------- FILE THEO REGION (GIAI ĐOẠN 4–6) ---------
+# Tên file mẫu, dùng region_file(TEMPLATE, region) để lấy đường dẫn
+EDGES_REGION = "edges_{region}.npz"
+DISTANCE_MATRIX = "distance_matrix_{region}.npy"
+TIME_MATRIX = "time_matrix_{region}.npy"
+MATRIX_NODES = "matrix_nodes_{region}.csv"
+MATRIX_STATE = "matrix_state_{region}.npz"
+KNN_MATRIX = "knn_matrix_{region}.npz"
+CH_INDEX = "ch_{region}_{weight}.npz"        # weight = trọng số primary của index
+NODES_FINAL = "nodes_final_{region}.csv"
+EDGES_FINAL = "edges_final_{region}.csv"
+VEHICLES_REGION = "vehicles_{region}.csv"
+
+# --------- PIPELINE RUNNER ---------
+PIPELINE_STATE = DATA_PROCESSED / "pipeline_state.json"
+
+# --------- INSTRUMENTATION (src/utils/perf.py) ---------
+PERF_LOG = DATA_PROCESSED / "perf_log.jsonl"        # JSON lines: 1 dòng / stage / region; None = tắt
+PERF_PROMETHEUS = None                               # file .prom cho node_exporter textfile collector; None = tắt
+PERF_PROFILE_DIR = DATA_PROCESSED / "profiles"      # cProfile theo stage (main.py --profile)
+PERF_PROFILE_TOP = 20                                # số hàm in ra sau mỗi stage (theo cumulative time)
+
+
+def region_file(template: str, region: str) -> Path:
+    """Đường dẫn file theo region trong DATA_PROCESSED, vd. region_file(EDGES_REGION, 'HCM')."""
+    return DATA_PROCESSED / template.format(region=region)
+
 
 # --------- REGION CONFIG ---------
 # Map tên city -> Region_ID (tuỳ ý chỉnh)
@@ -61,8 +99,95 @@ def city_to_region(city: str):
         return REGION_MAP[city]
     # fallback: ví dụ 'Vung Tau' -> 'VUNG_TAU'
     return city.upper().replace(" ", "_")
+
+
+# -------- SPATIAL REGION CONFIG (GIAI ĐOẠN 1) --------
+# "spatial" -> customer theo depot gần nhất (KD-tree haversine), city chỉ là gợi ý
+# "city"    -> chỉ theo REGION_MAP / city_to_region (bản cũ)
+REGION_ASSIGNMENT = "spatial"
+SPATIAL_K_DEPOTS = 3                 # số depot gần nhất xét khi so với gợi ý city
+SPATIAL_WARN_KM = 30.0               # cảnh báo customer cách depot gần nhất quá bấy nhiêu km
+
 # -------- SAMPLING CONFIG (giới hạn số khách mỗi region) --------
 # Nếu = None  -> dùng toàn bộ khách
 # Nếu là số   -> mỗi region chỉ giữ tối đa bấy nhiêu khách (sample ngẫu nhiên có kiểm soát)
 MAX_CUSTOMERS_PER_REGION = 2000
 RANDOM_SEED = 42
+
+# -------- SHARDING CONFIG (cuối GIAI ĐOẠN 3) --------
+# Region có nhiều khách hơn SHARD_MAX_CUSTOMERS -> chia thành shard cân bằng theo depot
+# (Giai đoạn 4–6 + GA chạy theo shard).
+# Mặc định vẫn sample (MAX_CUSTOMERS_PER_REGION = 2000 = SHARD_MAX_CUSTOMERS) nên không region
+# nào bị chia: node_shards.csv chỉ có 1 shard / region và kết quả giống hệt khi chưa có sharding.
+# Sharding chỉ có tác dụng khi dùng hết đơn hàng thật (MAX_CUSTOMERS_PER_REGION = None)
+# hoặc khi MAX_CUSTOMERS_PER_REGION > SHARD_MAX_CUSTOMERS.
+SHARD_MAX_CUSTOMERS = 2000           # None -> không chia
+SHARD_MIN_DEPOTS = 2                 # số depot có khách tối thiểu / shard (roads theo depot: 1 depot -> nhiều khách không tới được)
+
+# -------- MATRIX CONFIG (GIAI ĐOẠN 5) --------
+# "path"        -> 1 lần Dijkstra / source theo MATRIX_PRIMARY_WEIGHT,
+#                  trọng số còn lại cộng dọc đúng tuyến đã chọn (ma trận khớp nhau);
+#                  nhiều tuyến hoà primary -> chọn tuyến có trọng số còn lại nhỏ nhất
+# "independent" -> 2 lần Dijkstra, distance & time là 2 tối ưu độc lập (bản cũ)
+MATRIX_MODE = "path"
+MATRIX_PRIMARY_WEIGHT = "distance"   # "distance" hoặc "time"
+MATRIX_CHUNK_SIZE = 256              # số source / block Dijkstra (giới hạn bộ nhớ tạm)
+MATRIX_WORKERS = None                # số process Dijkstra; None -> os.cpu_count(), 1 -> tuần tự
+MATRIX_DTYPE = "float32"             # kiểu lưu ma trận nhị phân (.npy, mmap được)
+EXPORT_MATRIX_CSV = False            # True -> ghi thêm distance/time_matrix_{region}.csv (tương thích)
+MATRIX_INCREMENTAL = True            # chỉ tính lại hàng/cột của node mới/đổi khi graph cũ không đổi
+INCREMENTAL_MAX_FRACTION = 0.25      # node cần vá > tỉ lệ này -> tính lại toàn bộ region
+# "dense" -> ma trận N x N (.npy, GA đọc dạng này)
+# "knn"   -> chỉ lưu k active node gần nhất / source (CSR, knn_matrix_{region}.npz),
+#            cặp thiếu tính lại khi cần (matrix_sparse); dùng với MAX_CUSTOMERS_PER_REGION = None
+MATRIX_STORAGE = "dense"
+MATRIX_KNN_K = 64                    # số láng giềng lưu / source
+MATRIX_KNN_RADIUS = 5.0              # bán kính Dijkstra ban đầu (đơn vị của MATRIX_PRIMARY_WEIGHT), gấp đôi tới khi đủ k
+
+# "dijkstra" -> Dijkstra nhiều nguồn trên cả graph (scipy)
+# "ch"       -> contraction hierarchies: index build 1 lần / region (chỉ build lại khi
+#               edges_{region} đổi), bảng many-to-many theo bucket; kết quả trùng "dijkstra"
+#               (cả mode "path"). Region ~2000 node (CTO, 1 core): bảng CH ~2 s so với
+#               Dijkstra ~3 s (~1.5×) + build index 0.3 s lần đầu -> lợi ít, không phải "nhanh hơn hẳn"
+MATRIX_ENGINE = "dijkstra"
+CH_WITNESS_EDGES = 1000              # số cạnh tối đa duyệt / witness search khi contract (ít -> nhiều shortcut hơn)
+
+# -------- DISTANCE ORACLE (truy vấn theo yêu cầu) --------
+ORACLE_CACHE_MB = 256                # MB tối đa cho các hàng Dijkstra đã tính (LRU); 0 hoặc None = không cache
+ORACLE_ASTAR_MAX_TARGETS = 8         # truy vấn <= bấy nhiêu target (hàng chưa cache) -> A* điểm-điểm; 0 = luôn tính cả hàng
+
+# -------- ROADS CONFIG (GIAI ĐOẠN 3) --------
+ROADS_CHUNKSIZE = 200_000            # số dòng / khối khi đọc mỗi file roads_*.csv
+ROADS_WORKERS = None                 # số process đọc file song song; None -> os.cpu_count()
+EXPORT_EDGES_CSV = False             # True -> ghi thêm edges_master.csv / edges_{region}.csv (tương thích)
+
+# -------- REGION SPLIT CONFIG (GIAI ĐOẠN 4) --------
+REGION_SPLIT_WORKERS = None          # số process ghi edges_{region} song song; None -> os.cpu_count()
+
+# -------- GA CONFIG --------
+GA_POPULATION_SIZE = 200             # số cá thể / quần thể
+GA_GENERATIONS = 300                 # số thế hệ tối đa
+GA_TOURNAMENT_SIZE = 3
+GA_CROSSOVER_RATE = 0.9
+GA_MUTATION_RATE = 0.2
+GA_ELITE_SIZE = 2                    # số cá thể tốt nhất giữ nguyên sang thế hệ sau
+GA_PENALTY = 1000.0                  # phạt / 1 đơn vị vượt (kg, m3, km, phút)
+
+# -------- GA IMPROVED (ISLAND MODEL) --------
+GA_ISLANDS = 4                       # số quần thể con (đảo) / region
+GA_ISLAND_POPULATION = 50            # số cá thể / đảo
+GA_WORKERS = None                    # số process cho các đảo; None -> os.cpu_count()
+GA_MIGRATION_INTERVAL = 10           # số thế hệ giữa 2 lần di cư
+GA_MIGRANTS = 2                      # số cá thể tốt nhất mỗi đảo gửi đi / lần di cư
+GA_MIGRATION_TOPOLOGY = "ring"       # "ring" (đảo i -> i+1) hoặc "random"
+GA_TIME_BUDGET = None                # giây / lần chạy; None -> không giới hạn (kết quả chỉ phụ thuộc seed)
+GA_STAGNATION_GENERATIONS = 60       # dừng region khi best không cải thiện sau bấy nhiêu thế hệ
+
+# -------- GA LOCAL SEARCH (MEMETIC) --------
+GA_LS_RATE = 0.1                     # tỉ lệ con được local search mỗi thế hệ (0 = tắt)
+GA_LS_NEIGHBOURS = 10                # số khách gần nhất xét cho mỗi khách (granular)
+GA_LS_TIME_LIMIT = 0.5               # giây tối đa / 1 lần local search (None = không giới hạn)
+GA_LS_MAX_EVALUATIONS = 20_000       # số cặp (u, v) tối đa / 1 lần local search (None = không giới hạn)
+
+# -------- GA ROUTE CACHE --------
+GA_ROUTE_CACHE_MB = 64               # MB tối đa / cache (mỗi region, mỗi process); 0 hoặc None = tắt cache
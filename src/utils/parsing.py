@@ -0,0 +1,205 @@
+# src/utils/parsing.py
+"""
+Parse số / giờ dạng vector hoá cho các loader (Stage 1, 3).
+
+Thay cho Series.apply(parse_number / hhmm_to_min / extract_leading_number):
+    - cột đã là số: ép kiểu thẳng, không đụng tới chuỗi
+    - cột chuỗi: np.strings + phép tính trên mã ký tự (chạy trong C) cho dạng phổ biến
+    - dòng lạ không khớp dạng phổ biến: parse lại từng dòng bằng đúng quy tắc cũ
+      (thường chỉ vài dòng) -> kết quả giống hệt bản apply cũ.
+
+Không dùng Series.str: khi không có pyarrow, .str chạy vòng lặp Python
+nên còn chậm hơn apply.
+"""
+
+import re
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import is_bool_dtype, is_numeric_dtype
+
+_HHMM = re.compile(r"(\d{1,2}):(\d{2})")
+_LEADING_NUMBER = re.compile(r"(\d+(\.\d+)?)")
+
+# chuỗi chắc chắn không parse được (ô trống / NaN / None) -> khỏi fallback
+_MISSING_TEXT = ["", "nan", "None", "NaN", "<NA>", "NaT"]
+
+_ZERO = ord("0")
+_POW10 = np.array([float(10 ** k) for k in range(16)])
+
+
+# ============================================================
+#  HỖ TRỢ
+# ============================================================
+
+def _as_text(s: pd.Series) -> np.ndarray:
+    """Mảng chuỗi NumPy, mỗi phần tử = str(x) như bản cũ (None -> 'None', NaN -> 'nan')."""
+    return s.to_numpy(dtype=object).astype(str)
+
+
+def _codes(text: np.ndarray) -> np.ndarray:
+    """Mã Unicode từng ký tự: (n x độ dài tối đa), phần đệm = 0."""
+    text = np.ascontiguousarray(text)
+    return text.view(np.uint32).reshape(len(text), text.dtype.itemsize // 4)
+
+
+def _plain_decimal(text: np.ndarray, comma: bool = False):
+    """
+    Đọc các chuỗi dạng [-]digits[.digits] (ASCII, tối đa 15 chữ số) thẳng trên mã ký tự.
+
+    Trả về (ok, values): ok = dòng đúng dạng, values = float64 (NaN nếu không ok).
+    mantissa (< 10^15 < 2^53) và 10^k (k <= 15) đều biểu diễn chính xác,
+    nên 1 phép chia cho ra đúng số float() làm tròn (fast path của Clinger).
+    comma=True: dấu ',' cũng được coi là dấu thập phân.
+    """
+    codes = _codes(text).astype(np.int64)
+    n, width = codes.shape
+    cols = np.arange(width)
+
+    is_digit = (codes >= _ZERO) & (codes <= _ZERO + 9)
+    is_dot = codes == ord(".")
+    if comma:
+        is_dot |= codes == ord(",")
+    negative = codes[:, 0] == ord("-") if width else np.zeros(n, dtype=bool)
+    is_sign = np.zeros_like(is_digit)
+    if width:
+        is_sign[:, 0] = negative
+
+    n_digits = is_digit.sum(axis=1)
+    ok = (
+        ((is_digit | is_dot | is_sign).sum(axis=1) == np.strings.str_len(text))
+        & (is_dot.sum(axis=1) <= 1)
+        & (n_digits >= 1)
+        & (n_digits <= 15)
+    )
+
+    mantissa = np.zeros(n, dtype=np.int64)
+    for j in range(width):
+        mantissa = np.where(is_digit[:, j], mantissa * 10 + codes[:, j] - _ZERO, mantissa)
+    dot_pos = np.where(is_dot.any(axis=1), is_dot.argmax(axis=1), width)
+    scale = (is_digit & (cols > dot_pos[:, None])).sum(axis=1)
+
+    values = mantissa / _POW10[np.minimum(scale, 15)]
+    values = np.where(negative, -values, values)
+    return ok, np.where(ok, values, np.nan)
+
+
+def _fallback(result: np.ndarray, text: np.ndarray, todo: np.ndarray, parse_one):
+    """Parse lại từng dòng (quy tắc cũ) cho các dòng todo, bỏ qua dòng chắc chắn trống."""
+    todo = todo & ~np.isin(text, _MISSING_TEXT)
+    for i in np.flatnonzero(todo):
+        value = parse_one(str(text[i]))
+        if value is not None:
+            result[i] = value
+    return result
+
+
+def _int_if_complete(values: np.ndarray, index) -> pd.Series:
+    """
+    apply() trả int/None: cột int64 nếu không có None, float64 nếu có.
+    Giữ đúng quy tắc đó để CSV ghi ra không đổi (900 chứ không phải 900.0).
+    """
+    out = pd.Series(values, index=index, dtype="float64")
+    if len(out) and out.notna().all():
+        return out.astype("int64")
+    return out
+
+
+# ============================================================
+#  SỐ
+# ============================================================
+
+def _float_or_none(text: str):
+    try:
+        return float(text.strip().replace(",", "."))
+    except ValueError:
+        return None
+
+
+def parse_number(s: pd.Series) -> pd.Series:
+    """
+    Chuyển cả cột về float64, xử lý luôn dấu phẩy thập phân ("1,5" -> 1.5).
+    Giá trị thiếu / không parse được -> NaN.
+    """
+    if len(s) == 0 or (is_numeric_dtype(s) and not is_bool_dtype(s)):
+        return s.astype("float64")
+
+    text = np.strings.strip(_as_text(s))
+    plain, values = _plain_decimal(text, comma=True)
+    result = _fallback(values, text, ~plain, _float_or_none)
+    return pd.Series(result, index=s.index, dtype="float64")
+
+
+# ============================================================
+#  GIỜ
+# ============================================================
+
+def _hhmm_one(text: str):
+    m = _HHMM.match(text)
+    if not m:
+        return None
+    return int(m.group(1)) * 60 + int(m.group(2))
+
+
+def hhmm_to_min(s: pd.Series) -> pd.Series:
+    """'HH:MM' (hoặc 'HH:MM:SS') ở đầu chuỗi -> số phút trong ngày; không khớp -> NaN."""
+    text = _as_text(s)
+    result = np.full(len(text), np.nan)
+
+    # dạng phổ biến "H:MM" / "HH:MM...": đưa về 5 ký tự "HH:MM" rồi đọc mã ký tự
+    colon = np.strings.find(text, ":")
+    padded = np.where(colon == 1, np.strings.add("0", text), text)
+    codes = _codes(padded.astype("U5")).astype(np.int64) - _ZERO
+    digits = codes[:, [0, 1, 3, 4]]
+    fast = ((colon == 1) | (colon == 2)) & ((digits >= 0) & (digits <= 9)).all(axis=1)
+    fast &= codes[:, 2] == ord(":") - _ZERO
+
+    result[fast] = (codes[fast, 0] * 10 + codes[fast, 1]) * 60 + codes[fast, 3] * 10 + codes[fast, 4]
+    result = _fallback(result, text, ~fast, _hhmm_one)
+    return _int_if_complete(result, s.index)
+
+
+def split_time_range(s: pd.Series):
+    """
+    Khoảng giờ "06:00-22:00" -> (open_min, close_min).
+    Chỉ nhận chuỗi có đúng 1 dấu '-', còn lại -> NaN.
+    """
+    is_str = np.fromiter((isinstance(v, str) for v in s), dtype=bool, count=len(s))
+    text = _as_text(s)
+    parts = np.strings.partition(text, "-")
+    ok = is_str & (np.strings.count(text, "-") == 1)
+
+    open_part = pd.Series(np.where(ok, parts[0], ""), index=s.index)
+    close_part = pd.Series(np.where(ok, parts[2], ""), index=s.index)
+    return hhmm_to_min(open_part), hhmm_to_min(close_part)
+
+
+def _leading_number_one(text: str):
+    m = _LEADING_NUMBER.match(text.strip())
+    return float(m.group(1)) if m else None
+
+
+def extract_leading_number(s: pd.Series) -> pd.Series:
+    """Số ở đầu chuỗi ("8 hours" -> 8.0, "7.5h" -> 7.5); không có -> NaN."""
+    if is_numeric_dtype(s) and not is_bool_dtype(s):
+        values = s.to_numpy(dtype="float64", na_value=np.nan)
+        # str(x) của số dương không ở dạng mũ (1e-05, 1e+16) chính là số đó; số âm -> NaN
+        plain = (values <= 0) | ((values >= 1e-4) & (values < 1e16))
+        if plain[~np.isnan(values)].all():
+            return pd.Series(np.where(np.signbit(values), np.nan, values), index=s.index)
+
+    if not len(s):
+        return s.astype("float64")
+    text = np.strings.strip(_as_text(s))
+    # dạng phổ biến "8", "7.5", "8 hours": phần trước dấu cách là số không dấu,
+    # không bắt đầu / kết thúc bằng '.'
+    token = np.strings.partition(text, " ")[0]
+    plain, values = _plain_decimal(token)
+    fast = (
+        plain
+        & ~np.strings.startswith(token, "-")
+        & ~np.strings.startswith(token, ".")
+        & ~np.strings.endswith(token, ".")
+    )
+    result = _fallback(np.where(fast, values, np.nan), text, ~fast, _leading_number_one)
+    return pd.Series(result, index=s.index, dtype="float64")
@@ -0,0 +1,246 @@
+# src/utils/perf.py
+"""
+Đo hiệu năng + log có cấu trúc cho pipeline.
+
+- track(label, **fields): thời gian (wall + CPU), đỉnh RSS của 1 khối code; in "⏱ ..."
+  như cũ và ghi 1 bản ghi JSON (label + fields: stage, region, rows_in, rows_out,
+  nodes_settled ...) vào PERF_LOG
+- start_run(): mở 1 lần chạy (run_id chung cho các bản ghi), Pipeline.run gọi
+- write_prometheus(): các bản ghi của lần chạy -> textfile Prometheus (PERF_PROMETHEUS)
+- profile_stage(): cProfile 1 stage -> PERF_PROFILE_DIR/stage{N}_{run_id}.prof
+"""
+
+import cProfile
+import io
+import json
+import os
+import pstats
+import resource
+import sys
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+from src.utils.config import PERF_LOG, PERF_PROFILE_DIR, PERF_PROFILE_TOP, PERF_PROMETHEUS
+
+_PROC_STATUS = Path("/proc/self/status")
+_PROC_CLEAR_REFS = Path("/proc/self/clear_refs")
+
+# Lần chạy hiện tại: run_id + các bản ghi đã ghi (cho write_prometheus)
+_RUN = {"id": None, "records": []}
+
+# Đỉnh RSS (MB) đã thấy của các khối track đang mở (ngoài -> trong): khối con reset
+# VmHWM nên trước đó đẩy đỉnh hiện tại vào khối cha, khi kết thúc trả đỉnh của nó lên
+_PEAKS = []
+
+
+def _read_status_kb(field: str):
+    """Đọc 1 trường (kB) trong /proc/self/status (Linux), None nếu không có."""
+    try:
+        for line in _PROC_STATUS.read_text().splitlines():
+            if line.startswith(field + ":"):
+                return int(line.split()[1])
+    except OSError:
+        return None
+    return None
+
+
+def _reset_peak_rss() -> bool:
+    """Reset đỉnh RSS của process (Linux >= 4.0: ghi '5' vào clear_refs)."""
+    try:
+        _PROC_CLEAR_REFS.write_text("5")
+        return True
+    except OSError:
+        return False
+
+
+def peak_rss_mb() -> float:
+    """Đỉnh RSS của process (MB). Linux: VmHWM, nơi khác: ru_maxrss."""
+    hwm = _read_status_kb("VmHWM")
+    if hwm is not None:
+        return hwm / 1024
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS trả về bytes, Linux trả về kB
+    return maxrss / 1024 ** 2 if sys.platform == "darwin" else maxrss / 1024
+
+
+def _cpu_seconds() -> float:
+    """CPU time (user + sys) của process + các process con đã kết thúc (worker pool)."""
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return own.ru_utime + own.ru_stime + children.ru_utime + children.ru_stime
+
+
+# ============================================================
+#  BẢN GHI JSON
+# ============================================================
+
+def _json_value(value):
+    """Số NumPy (np.int64 ...) -> số Python; kiểu khác -> chuỗi."""
+    return value.item() if hasattr(value, "item") else str(value)
+
+
+def start_run(run_id: str = None) -> str:
+    """Bắt đầu 1 lần chạy mới: run_id chung cho các bản ghi sau đó."""
+    _RUN["id"] = run_id or f"{datetime.now():%Y%m%dT%H%M%S}-{os.getpid()}"
+    _RUN["records"] = []
+    return _RUN["id"]
+
+
+def run_records() -> list:
+    """Các bản ghi của lần chạy hiện tại."""
+    return list(_RUN["records"])
+
+
+def emit(record: dict, path: Path = None) -> dict:
+    """
+    Ghi 1 bản ghi (dict) ra PERF_LOG dạng JSON line (thêm ts, run_id).
+    path=None -> PERF_LOG; PERF_LOG = None -> chỉ giữ trong bộ nhớ.
+    """
+    record = {"ts": datetime.now().isoformat(timespec="milliseconds"), "run_id": _RUN["id"], **record}
+    if record.get("nodes_settled") and record.get("seconds"):
+        record["nodes_settled_per_s"] = round(record["nodes_settled"] / record["seconds"], 1)
+    _RUN["records"].append(record)
+
+    path = PERF_LOG if path is None else path
+    if path is not None:
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record, ensure_ascii=False, default=_json_value) + "\n")
+    return record
+
+
+@contextmanager
+def track(label: str, log: bool = True, **fields):
+    """
+    Đo thời gian chạy (wall + CPU) + đỉnh RSS của 1 khối code.
+
+    Không dùng tracemalloc vì làm chậm pandas (to_csv...) vài lần.
+    Trên Linux đỉnh RSS được reset đầu khối nên số đo là của riêng khối đó; khối lồng
+    nhau vẫn đúng (đỉnh của khối con được tính vào khối cha, _PEAKS).
+    Nơi khác là đỉnh của cả process tính đến cuối khối. CPU time gồm cả worker
+    pool đã đóng trong khối.
+
+    fields (stage, region, rows_in ...) và các khoá gán thêm vào stats trong khối
+    (rows_out, nodes_settled ...) đi vào bản ghi JSON; log=False -> không ghi
+    (người gọi tự emit(stats) sau khi bổ sung số liệu).
+
+    Dùng:
+        with track("Region HCM", stage=5, region="HCM") as stats:
+            ...
+            stats["rows_out"] = n * n
+        stats["seconds"], stats["peak_mb"]
+    """
+    if _PEAKS:
+        _PEAKS[-1] = max(_PEAKS[-1], peak_rss_mb())
+    _reset_peak_rss()
+    _PEAKS.append(0.0)
+    stats = {"label": label, **fields}
+    t0 = time.perf_counter()
+    cpu0 = _cpu_seconds()
+    try:
+        yield stats
+    finally:
+        stats["seconds"] = round(time.perf_counter() - t0, 4)
+        stats["cpu_seconds"] = round(_cpu_seconds() - cpu0, 4)
+        peak = max(_PEAKS.pop(), peak_rss_mb())
+        if _PEAKS:
+            _PEAKS[-1] = max(_PEAKS[-1], peak)
+        stats["peak_mb"] = round(peak, 1)
+        print(f"  ⏱ {label}: {stats['seconds']:.2f}s (CPU {stats['cpu_seconds']:.2f}s), "
+              f"peak RSS {stats['peak_mb']:.1f} MB")
+        if log:
+            emit(stats)
+
+
+# ============================================================
+#  PROMETHEUS TEXTFILE
+# ============================================================
+
+# tên metric -> (khoá trong bản ghi, hệ số, mô tả)
+_METRICS = [
+    ("seconds", "seconds", 1, "Wall time (giây)"),
+    ("cpu_seconds", "cpu_seconds", 1, "CPU time user + sys, gồm worker (giây)"),
+    ("peak_rss_bytes", "peak_mb", 1024 ** 2, "Đỉnh RSS của process (bytes)"),
+    ("rows_in", "rows_in", 1, "Số dòng input"),
+    ("rows_out", "rows_out", 1, "Số dòng / ô output"),
+    ("dijkstra_nodes_settled_per_second", "nodes_settled_per_s", 1, "Stage 5: số node Dijkstra settle / giây"),
+]
+
+
+def _label_value(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def write_prometheus(path: Path = None, records: list = None) -> Path:
+    """
+    Ghi các bản ghi của lần chạy ra textfile Prometheus (gauge):
+        lmd_stage_<metric>{stage, name}           – bản ghi có stage, không có region
+        lmd_region_<metric>{stage, region, step}  – bản ghi theo region / shard (step mặc định "build")
+    path=None -> PERF_PROMETHEUS (None -> không ghi). Ghi qua file tạm + os.replace.
+    """
+    path = PERF_PROMETHEUS if path is None else path
+    if path is None:
+        return None
+    records = run_records() if records is None else records
+
+    lines = []
+    for scope in ("stage", "region"):
+        for metric, key, scale, help_text in _METRICS:
+            samples = []
+            for record in records:
+                if record.get("stage") is None or record.get(key) is None:
+                    continue
+                if (scope == "region") != (record.get("region") is not None):
+                    continue
+                labels = {"stage": record["stage"]}
+                if scope == "region":
+                    labels["region"] = record["region"]
+                    labels["step"] = record.get("step", "build")
+                else:
+                    labels["name"] = record.get("name", record["label"])
+                text = ",".join(f'{k}="{_label_value(v)}"' for k, v in labels.items())
+                samples.append(f"lmd_{scope}_{metric}{{{text}}} {record[key] * scale:.15g}")
+            if samples:
+                lines.append(f"# HELP lmd_{scope}_{metric} {help_text}")
+                lines.append(f"# TYPE lmd_{scope}_{metric} gauge")
+                lines.extend(samples)
+
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_text("\n".join(lines) + "\n", encoding="utf-8")
+    os.replace(tmp, path)
+    return path
+
+
+# ============================================================
+#  CPROFILE
+# ============================================================
+
+@contextmanager
+def profile_stage(stage: int, enabled: bool = True, top: int = None):
+    """
+    cProfile cho 1 stage (chỉ process chính, worker pool không được profile).
+    Ghi PERF_PROFILE_DIR/stage{N}_{run_id}.prof (mở bằng snakeviz / pstats) và in
+    `top` hàm tốn thời gian nhất (cumulative).
+    """
+    if not enabled:
+        yield None
+        return
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield profiler
+    finally:
+        profiler.disable()
+        PERF_PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+        path = PERF_PROFILE_DIR / f"stage{stage}_{_RUN['id'] or 'adhoc'}.prof"
+        profiler.dump_stats(path)
+
+        out = io.StringIO()
+        pstats.Stats(profiler, stream=out).sort_stats("cumulative").print_stats(top or PERF_PROFILE_TOP)
+        print(out.getvalue().rstrip())
+        print(f"  → cProfile GIAI ĐOẠN {stage}: {path}")
@@ -0,0 +1,235 @@
+# src/utils/pipeline.py
+
+import hashlib
+import json
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable
+
+import numpy as np
+import pandas as pd
+
+from src.utils.config import NODE_SHARDS, NODES_MASTER, PIPELINE_STATE, ROOT, region_file
+from src.utils.perf import emit, profile_stage, start_run, track, write_prometheus
+
+_HASH_BLOCK = 1 << 20
+
+
+# ============================================================
+#  KHAI BÁO STAGE
+# ============================================================
+
+@dataclass
+class Stage:
+    """
+    1 giai đoạn của pipeline.
+
+    - inputs / outputs: hàm trả về list[Path] (gọi lúc quyết định chạy, vì file theo
+      region chỉ biết được sau khi stage trước đã ghi nodes_master.csv)
+    - params: hàm trả về dict cấu hình ảnh hưởng kết quả (đổi -> chạy lại)
+    """
+
+    number: int
+    name: str
+    run: Callable
+    inputs: Callable
+    outputs: Callable
+    params: Callable = field(default=lambda: {})
+
+
+def region_ids() -> list:
+    """
+    Đơn vị của Giai đoạn 4–6 (rỗng nếu chưa có nodes_master.csv): shard_id trong
+    node_shards.csv nếu đã chia shard (cuối Giai đoạn 3), không thì region_id.
+    """
+    if NODE_SHARDS.exists():
+        return pd.read_csv(NODE_SHARDS, usecols=["shard_id"])["shard_id"].dropna().unique().tolist()
+    if not NODES_MASTER.exists():
+        return []
+    regions = pd.read_csv(NODES_MASTER, usecols=["region_id"])["region_id"]
+    return regions.dropna().unique().tolist()
+
+
+def per_region(template: str) -> list:
+    """Tên file mẫu theo region (config) -> list đường dẫn cho mọi region hiện có."""
+    return [region_file(template, r) for r in region_ids()]
+
+
+# ============================================================
+#  HASH FILE (cache theo size + mtime)
+# ============================================================
+
+def _state_key(path: Path) -> str:
+    """Đường dẫn lưu trong state: tương đối theo ROOT (đổi chỗ repo không phải hash lại)."""
+    path = Path(path).resolve()
+    try:
+        return path.relative_to(ROOT).as_posix()
+    except ValueError:
+        return str(path)
+
+
+class FileHasher:
+    """
+    Hash nội dung file (blake2b), có cache theo (size, mtime_ns) lưu trong state
+    (khoá = đường dẫn tương đối theo ROOT) -> file lớn không đổi thì không phải đọc lại.
+    """
+
+    def __init__(self, cache: dict):
+        self.cache = cache
+
+    def file_digest(self, path: Path):
+        if not path.exists():
+            return None
+        st = path.stat()
+        key = _state_key(path)
+        cached = self.cache.get(key)
+        if cached and cached[0] == st.st_size and cached[1] == st.st_mtime_ns:
+            return cached[2]
+
+        h = hashlib.blake2b(digest_size=16)
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(_HASH_BLOCK), b""):
+                h.update(block)
+        digest = h.hexdigest()
+        self.cache[key] = [st.st_size, st.st_mtime_ns, digest]
+        return digest
+
+    def digest(self, paths: list, params: dict = None) -> str:
+        """Hash gộp của 1 tập file (theo tên + nội dung) và params."""
+        h = hashlib.blake2b(digest_size=16)
+        for path in sorted(Path(p) for p in paths):
+            h.update(_state_key(path).encode())
+            h.update(str(self.file_digest(path)).encode())
+        h.update(json.dumps(params or {}, sort_keys=True, default=str).encode())
+        return h.hexdigest()
+
+
+# ============================================================
+#  RUNNER
+# ============================================================
+
+def _count_file_rows(path: Path):
+    """Số dòng dữ liệu của 1 file output / input (None nếu không đếm được rẻ)."""
+    if path.suffix == ".csv":
+        newlines, last = 0, b"\n"
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(_HASH_BLOCK), b""):
+                newlines += block.count(b"\n")
+                last = block[-1:]
+        lines = newlines + (last != b"\n")
+        return max(lines - 1, 0)   # bỏ dòng header
+    if path.suffix == ".npy":
+        return int(np.load(path, mmap_mode="r").shape[0])
+    if path.suffix == ".npz":
+        with np.load(path, allow_pickle=False) as data:
+            for key in ("origin_id", "indices", "node_ids"):
+                if key in data.files:
+                    return int(len(data[key]))
+    return None
+
+
+def count_rows(paths: list):
+    """
+    Tổng số dòng của các file (CSV: dòng dữ liệu, bảng edge: số edge, ma trận: số hàng).
+    File không đếm được (xlsx, parquet ...) bỏ qua; không đếm được file nào -> None.
+    """
+    counts = [_count_file_rows(Path(p)) for p in paths if Path(p).exists()]
+    counts = [c for c in counts if c is not None]
+    return sum(counts) if counts else None
+
+
+class Pipeline:
+    """
+    Chạy các stage theo thứ tự, bỏ qua stage có input/params/output không đổi
+    so với lần chạy thành công trước (ghi trong PIPELINE_STATE).
+    """
+
+    def __init__(self, stages: list, state_path: Path = PIPELINE_STATE):
+        self.stages = sorted(stages, key=lambda s: s.number)
+        self.state_path = state_path
+        self.state = self._load_state()
+        self.hasher = FileHasher(self.state.setdefault("files", {}))
+
+    def _load_state(self) -> dict:
+        if self.state_path.exists():
+            try:
+                return json.loads(self.state_path.read_text(encoding="utf-8"))
+            except (OSError, ValueError):
+                print(f"⚠ Không đọc được {self.state_path}, coi như chưa chạy lần nào.")
+        return {}
+
+    def _save_state(self):
+        self.state_path.parent.mkdir(exist_ok=True)
+        self.state_path.write_text(json.dumps(self.state, indent=2), encoding="utf-8")
+
+    def why_stale(self, stage: Stage):
+        """Lý do stage cần chạy lại, None nếu đã up-to-date."""
+        record = self.state.get("stages", {}).get(str(stage.number))
+        if record is None:
+            return "chưa chạy lần nào"
+
+        missing = [p for p in stage.inputs() if not Path(p).exists()]
+        if missing:
+            return f"thiếu input: {Path(missing[0]).name}"
+        if self.hasher.digest(stage.inputs(), stage.params()) != record.get("inputs"):
+            return "input hoặc cấu hình đã đổi"
+
+        outputs = stage.outputs()
+        if not outputs or any(not Path(p).exists() for p in outputs):
+            return "thiếu output"
+        if self.hasher.digest(outputs) != record.get("outputs"):
+            return "output bị sửa ngoài pipeline"
+        return None
+
+    def run(
+        self,
+        first: int = None,
+        last: int = None,
+        force: bool = False,
+        dry_run: bool = False,
+        profile: bool = False,
+    ):
+        """
+        Chạy các stage đã chọn. Mỗi stage chạy được đo (track) và ghi 1 bản ghi JSON
+        (PERF_LOG): wall / CPU time, peak RSS, rows_in / rows_out theo file input / output;
+        cuối lần chạy ghi textfile Prometheus nếu bật PERF_PROMETHEUS.
+        profile=True -> cProfile từng stage (perf.profile_stage).
+        """
+        if not dry_run:
+            start_run()
+        selected = [
+            s for s in self.stages
+            if (first is None or s.number >= first) and (last is None or s.number <= last)
+        ]
+        upstream_changed = False
+        for stage in selected:
+            reason = "--force" if force else self.why_stale(stage)
+            if reason is None and dry_run and upstream_changed:
+                reason = "stage trước sẽ chạy lại"
+
+            if reason is None:
+                print(f"⏭ GIAI ĐOẠN {stage.number} ({stage.name}): up-to-date, bỏ qua")
+                continue
+
+            if dry_run:
+                print(f"▶ GIAI ĐOẠN {stage.number} ({stage.name}): SẼ CHẠY – {reason}")
+                upstream_changed = True
+                continue
+
+            print(f"▶ GIAI ĐOẠN {stage.number} ({stage.name}): chạy – {reason}")
+            rows_in = count_rows(stage.inputs())
+            with track(f"GIAI ĐOẠN {stage.number}", log=False, stage=stage.number,
+                       name=stage.name, reason=reason) as stats:
+                with profile_stage(stage.number, enabled=profile):
+                    stage.run()
+            emit({**stats, "rows_in": rows_in, "rows_out": count_rows(stage.outputs())})
+
+            self.state.setdefault("stages", {})[str(stage.number)] = {
+                "name": stage.name,
+                "inputs": self.hasher.digest(stage.inputs(), stage.params()),
+                "outputs": self.hasher.digest(stage.outputs()),
+            }
+            self._save_state()
+
+        if not dry_run:
+            write_prometheus()
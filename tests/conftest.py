@@ -0,0 +1,32 @@
+# tests/conftest.py
+import numpy as np
+import pandas as pd
+import pytest
+
+
+def make_grid(size: int = 6, seed: int = 0):
+    """
+    Lưới size x size, cạnh 2 chiều giữa 2 ô kề nhau: distance = 1 km mọi cạnh (rất nhiều
+    đường hoà nhau theo distance), time là số nguyên ngẫu nhiên (cũng có hoà theo time).
+    Trả về (edges, nodes) như edges_{region} / nodes_master.
+    """
+    rng = np.random.default_rng(seed)
+    node_id = lambda r, c: f"N{r:02d}{c:02d}"
+    rows = []
+    for r in range(size):
+        for c in range(size):
+            for dr, dc in ((0, 1), (1, 0), (0, -1), (-1, 0)):
+                rr, cc = r + dr, c + dc
+                if 0 <= rr < size and 0 <= cc < size:
+                    rows.append((node_id(r, c), node_id(rr, cc), 1.0, float(rng.integers(1, 10))))
+    edges = pd.DataFrame(rows, columns=["origin_id", "destination_id", "distance_km", "travel_time_min"])
+    nodes = pd.DataFrame(
+        [(node_id(r, c), 10.0 + r * 0.005, 106.0 + c * 0.005) for r in range(size) for c in range(size)],
+        columns=["node_id", "lat", "lon"],
+    )
+    return edges, nodes
+
+
+@pytest.fixture
+def grid():
+    return make_grid()
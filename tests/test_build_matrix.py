@@ -0,0 +1,27 @@
+# tests/test_build_matrix.py
+import numpy as np
+import pytest
+
+from src.preprocessing.build_matrix import _compute_matrices_parallel, _compute_region_matrices
+from src.preprocessing.graph_engine import build_region_graph
+from tests.conftest import make_grid
+
+
+@pytest.mark.parametrize("mode", ["path", "independent"])
+def test_parallel_matches_sequential(mode):
+    prepared = {}
+    for seed, region in enumerate(["A", "B"]):
+        edges, nodes = make_grid(size=5 + seed, seed=seed)
+        active = nodes["node_id"].tolist()[::2]  # node còn lại chỉ là node trung gian
+        prepared[region] = (build_region_graph(edges, extra_nodes=active), active)
+
+    stats = {}
+    parallel = _compute_matrices_parallel(prepared, mode, "distance", workers=2, chunk_size=4, stats=stats)
+    settled = 0
+    for region, (graph, active) in prepared.items():
+        region_stats = {}
+        dist, time = _compute_region_matrices(graph, active, mode, "distance", stats=region_stats)
+        np.testing.assert_array_equal(parallel[region][0], dist)
+        np.testing.assert_array_equal(parallel[region][1], time)
+        settled += region_stats["nodes_settled"]
+    assert stats["nodes_settled"] == settled
@@ -0,0 +1,167 @@
+# tests/test_graph_engine.py
+import heapq
+import math
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.preprocessing.contraction import build_contraction_hierarchy
+from src.preprocessing.graph_engine import (
+    AStarSearch,
+    build_region_graph,
+    nearest_targets,
+    node_coordinates,
+    reverse_graph,
+    shortest_path_matrix,
+    shortest_path_pair,
+)
+
+
+def baseline_dijkstra(adjacency: dict, source: str) -> dict:
+    """_dijkstra_source_to_all của Stage 5 bản gốc (dict + heapq)."""
+    dist = {n: math.inf for n in adjacency.keys()}
+    dist[source] = 0.0
+    pq = [(0.0, source)]
+    while pq:
+        d, u = heapq.heappop(pq)
+        if d > dist[u]:
+            continue
+        for v, w in adjacency.get(u, []):
+            nd = d + w
+            if nd < dist[v]:
+                dist[v] = nd
+                heapq.heappush(pq, (nd, v))
+    return dist
+
+
+def lex_dijkstra(edges, source, primary, secondary):
+    """Dijkstra thuần Python trên cặp (primary, secondary): đường ngắn nhất theo thứ tự từ điển."""
+    adjacency = {}
+    for u, v, a, b in zip(edges["origin_id"], edges["destination_id"], edges[primary], edges[secondary]):
+        adjacency.setdefault(u, []).append((v, a, b))
+    best = {source: (0.0, 0.0)}
+    done = set()
+    heap = [(0.0, 0.0, source)]
+    while heap:
+        a, b, u = heapq.heappop(heap)
+        if u in done:
+            continue
+        done.add(u)
+        for v, wa, wb in adjacency.get(u, ()):
+            cand = (a + wa, b + wb)
+            if cand < best.get(v, (math.inf, math.inf)):
+                best[v] = cand
+                heapq.heappush(heap, (*cand, v))
+    return best
+
+
+COLUMNS = {"distance": "distance_km", "time": "travel_time_min"}
+
+
+@pytest.mark.parametrize("weight", ["distance", "time"])
+def test_csr_dijkstra_matches_baseline(grid, weight):
+    edges, _ = grid
+    # thêm cạnh 1 chiều, cạnh song song dài hơn và 1 node không tới được
+    extra = pd.DataFrame(
+        [("N0000", "N0505", 50.0, 90.0), ("N0000", "N0001", 3.0, 20.0), ("X", "N0000", 1.0, 1.0)],
+        columns=edges.columns,
+    )
+    edges = pd.concat([edges, extra], ignore_index=True)
+    graph = build_region_graph(edges, extra_nodes=["Y"])
+    got = shortest_path_matrix(graph, np.arange(graph.num_nodes), weight=weight, dtype=np.float64)
+
+    adjacency = {n: [] for n in set(edges["origin_id"]) | set(edges["destination_id"])}
+    for u, v, w in zip(edges["origin_id"], edges["destination_id"], edges[COLUMNS[weight]]):
+        adjacency[u].append((v, float(w)))
+    for i, source in enumerate(graph.node_ids):
+        ref = baseline_dijkstra(adjacency, source) if source in adjacency else {source: 0.0}
+        want = [ref.get(v, math.inf) for v in graph.node_ids]
+        np.testing.assert_array_equal(got[i], want)
+
+
+@pytest.mark.parametrize("primary", ["distance", "time"])
+def test_path_mode_breaks_ties_by_secondary(grid, primary):
+    edges, _ = grid
+    graph = build_region_graph(edges)
+    secondary = "time" if primary == "distance" else "distance"
+    idx = np.arange(graph.num_nodes)
+    dist, time = shortest_path_pair(graph, idx, idx, primary=primary, dtype=np.float64)
+
+    for i, nid in enumerate(graph.node_ids):
+        ref = lex_dijkstra(edges, nid, COLUMNS[primary], COLUMNS[secondary])
+        want = np.array([ref[v] for v in graph.node_ids])
+        first, second = (want[:, 0], want[:, 1]) if primary == "distance" else (want[:, 1], want[:, 0])
+        np.testing.assert_allclose(dist[i], first)
+        np.testing.assert_allclose(time[i], second)
+
+
+@pytest.mark.parametrize("primary", ["distance", "time"])
+def test_path_mode_times_match_across_engines(grid, primary):
+    edges, nodes = grid
+    graph = build_region_graph(edges)
+    idx = np.arange(graph.num_nodes)
+    dist, time = shortest_path_pair(graph, idx, idx, primary=primary, dtype=np.float64)
+
+    # cột từ Dijkstra trên graph đảo chiều (bước vá incremental)
+    rev_dist, rev_time = shortest_path_pair(reverse_graph(graph), idx, idx, primary=primary, dtype=np.float64)
+    np.testing.assert_allclose(rev_dist.T, dist)
+    np.testing.assert_allclose(rev_time.T, time)
+
+    # A* điểm -> điểm
+    search = AStarSearch(graph, *node_coordinates(graph, nodes))
+    for source in range(0, graph.num_nodes, 5):
+        targets = [(source + 7) % graph.num_nodes, graph.num_nodes - 1 - source]
+        d, t = search.query(source, targets, primary=primary)
+        np.testing.assert_allclose(d, dist[source, targets])
+        np.testing.assert_allclose(t, time[source, targets])
+
+    # contraction hierarchies (bảng many-to-many theo bucket)
+    ch = build_contraction_hierarchy(graph, primary)
+    ch_dist, ch_time = ch.table(idx, idx, dtype=np.float64)
+    np.testing.assert_allclose(ch_dist, dist)
+    np.testing.assert_allclose(ch_time, time)
+
+
+def test_independent_mode_matches_across_engines(grid):
+    edges, nodes = grid
+    graph = build_region_graph(edges)
+    idx = np.arange(graph.num_nodes)
+    dist, time = shortest_path_pair(graph, idx, idx, mode="independent", dtype=np.float64)
+
+    ch_dist, _ = build_contraction_hierarchy(graph, "distance").table(idx, idx, dtype=np.float64)
+    _, ch_time = build_contraction_hierarchy(graph, "time").table(idx, idx, dtype=np.float64)
+    np.testing.assert_allclose(ch_dist, dist)
+    np.testing.assert_allclose(ch_time, time)
+
+    search = AStarSearch(graph, *node_coordinates(graph, nodes))
+    for source in range(0, graph.num_nodes, 7):
+        d, t = search.query(source, idx[:3], mode="independent")
+        np.testing.assert_allclose(d, dist[source, :3])
+        np.testing.assert_allclose(t, time[source, :3])
+
+
+def test_nearest_targets_uses_same_tie_break(grid):
+    edges, _ = grid
+    graph = build_region_graph(edges)
+    idx = np.arange(graph.num_nodes)
+    dist, time = shortest_path_pair(graph, idx, idx, dtype=np.float64)
+    indptr, indices, knn_dist, knn_time = nearest_targets(graph, idx, idx, k=5, radius=1.0, dtype=np.float64)
+    for r in range(graph.num_nodes):
+        cols = indices[indptr[r]:indptr[r + 1]]
+        np.testing.assert_allclose(knn_dist[indptr[r]:indptr[r + 1]], dist[r, cols])
+        np.testing.assert_allclose(knn_time[indptr[r]:indptr[r + 1]], time[r, cols])
+
+
+def test_nodes_settled_counts_full_dijkstra_before_slicing(grid):
+    edges, _ = grid
+    # node lẻ 1 chiều: tới được từ N0000 nhưng không phải target
+    extra = pd.DataFrame([("N0000", "X", 1.0, 1.0)], columns=edges.columns)
+    edges = pd.concat([edges, extra], ignore_index=True)
+    graph = build_region_graph(edges)
+    sources, targets = graph.encode(["N0000", "X"]), graph.encode(["N0505"])
+    for mode, runs in (("path", 1), ("independent", 2)):
+        stats = {}
+        shortest_path_pair(graph, sources, targets, mode=mode, stats=stats)
+        # N0000 settle cả 37 node; X không có cạnh ra -> chỉ settle chính nó
+        assert stats["nodes_settled"] == runs * (37 + 1)
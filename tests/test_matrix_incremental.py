@@ -0,0 +1,40 @@
+# tests/test_matrix_incremental.py
+import numpy as np
+import pytest
+
+from src.preprocessing.build_matrix import _compute_region_matrices
+from src.preprocessing.graph_engine import build_region_graph
+from src.preprocessing.matrix_incremental import (
+    patch_region_matrices,
+    plan_region_update,
+    region_fingerprint,
+)
+from src.preprocessing.matrix_store import RegionMatrices
+
+
+def _matrices(edges, nodes, mode, primary):
+    active = nodes["node_id"].tolist()
+    graph = build_region_graph(edges, extra_nodes=active)
+    dist, time = _compute_region_matrices(graph, active, mode=mode, primary=primary)
+    state = region_fingerprint(nodes.assign(node_type="customer"), edges, graph, mode, primary)
+    return graph, active, RegionMatrices(np.array(active, dtype=object), dist, time), state
+
+
+@pytest.mark.parametrize("mode", ["path", "independent"])
+@pytest.mark.parametrize("primary", ["distance", "time"])
+def test_patch_after_drop_and_restore_equals_full_rebuild(grid, mode, primary):
+    edges, nodes = grid
+    # bỏ vài node (và cạnh của chúng) rồi thêm lại -> node graph mới = via nodes
+    dropped = {"N0101", "N0303", "N0402", "N0204"}
+    kept_edges = edges[~edges["origin_id"].isin(dropped) & ~edges["destination_id"].isin(dropped)]
+    kept_nodes = nodes[~nodes["node_id"].isin(dropped)]
+    _, _, old, old_state = _matrices(kept_edges, kept_nodes, mode, primary)
+
+    graph, active, full, state = _matrices(edges, nodes, mode, primary)
+    plan, reason = plan_region_update(old_state, state, edges)
+    assert plan is not None, reason
+    assert set(plan["via_nodes"]) == dropped
+
+    dist, time = patch_region_matrices(graph, active, old, plan, mode, primary)
+    np.testing.assert_array_equal(dist, full.distance)
+    np.testing.assert_array_equal(time, full.time)
@@ -0,0 +1,62 @@
+# tests/test_parsing.py
+import re
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.utils.parsing import hhmm_to_min, parse_number
+
+
+# ---- bản cũ (Series.apply từng dòng, copy từ các loader trước khi vector hoá) ----
+
+def parse_number_row(x):
+    if pd.isna(x):
+        return None
+    s = str(x).strip().replace(",", ".")
+    try:
+        return float(s)
+    except ValueError:
+        return None
+
+
+def hhmm_to_min_row(x):
+    if pd.isna(x):
+        return None
+    m = re.match(r"(\d{1,2}):(\d{2})", str(x))
+    if not m:
+        return None
+    return int(m.group(1)) * 60 + int(m.group(2))
+
+
+def assert_identical(new: pd.Series, old: pd.Series):
+    assert new.dtype == old.dtype
+    pd.testing.assert_series_equal(new, old, check_exact=True)
+    assert new.to_csv() == old.to_csv()
+
+
+NUMBERS = [
+    "1,5", " 2.25 ", "-0.0", "-3", "0.1", "7,", ".5", "1e3", "-1.5E-7",
+    "123456789012345", "12345678901234567", "0.30000000000000004",
+    "1.2.3", "abc", "", "  ", "nan", "inf", "١٢", None, np.nan,
+]
+
+
+@pytest.mark.parametrize("values", [
+    NUMBERS,
+    [1, 2.5, None],
+    [3, 4, 5],
+    ["0.0001", "99999.999", "42"],
+])
+def test_parse_number_matches_apply(values):
+    s = pd.Series(values, dtype=object)
+    assert_identical(parse_number(s), s.apply(parse_number_row).astype("float64"))
+
+
+@pytest.mark.parametrize("values", [
+    ["8:05", "08:30", "23:59:59", "7:5", "24:00", "ab", "", " 8:00", "12:345", "１２:00", None, np.nan],
+    ["06:00", "9:30", "22:00"],
+])
+def test_hhmm_to_min_matches_apply(values):
+    s = pd.Series(values, dtype=object)
+    assert_identical(hhmm_to_min(s), s.apply(hhmm_to_min_row))
@@ -0,0 +1,20 @@
+# tests/test_perf.py
+import numpy as np
+import pytest
+
+from src.utils.perf import _reset_peak_rss, track
+
+
+def test_nested_track_keeps_peak_of_earlier_children():
+    if not _reset_peak_rss():
+        pytest.skip("không reset được đỉnh RSS (không phải Linux)")
+
+    with track("stage", log=False) as outer:
+        with track("region lớn", log=False) as big:
+            block = np.ones(64 * 1024 ** 2 // 8)  # 64 MB đã chạm tới
+            del block
+        with track("region nhỏ", log=False) as small:
+            pass
+
+    assert small["peak_mb"] < big["peak_mb"] - 32
+    assert outer["peak_mb"] >= big["peak_mb"]
@@ -0,0 +1,52 @@
+# tests/test_pipeline.py
+import os
+
+import pytest
+
+import src.utils.perf as perf
+from src.utils.pipeline import Pipeline, Stage
+
+
+@pytest.fixture
+def chain(tmp_path, monkeypatch):
+    """2 stage nối nhau: a.txt -> b.txt -> c.txt; runs đếm số lần mỗi stage chạy."""
+    monkeypatch.setattr(perf, "PERF_LOG", None)
+    a, b, c = (tmp_path / name for name in ("a.txt", "b.txt", "c.txt"))
+    a.write_text("1")
+    runs = {1: 0, 2: 0}
+
+    def copy(src, dst, number):
+        def run():
+            runs[number] += 1
+            dst.write_text(src.read_text() + "!")
+        return run
+
+    stages = [
+        Stage(1, "copy a", copy(a, b, 1), lambda: [a], lambda: [b]),
+        Stage(2, "copy b", copy(b, c, 2), lambda: [b], lambda: [c]),
+    ]
+    state = tmp_path / "state.json"
+    Pipeline(stages, state).run()
+    return a, c, stages, state, runs
+
+
+def test_dry_run_reports_touched_input_and_downstream(chain, capsys):
+    a, c, stages, state, runs = chain
+    Pipeline(stages, state).run(dry_run=True)
+    assert capsys.readouterr().out.count("up-to-date") == 2
+
+    # chỉ đổi mtime, nội dung giữ nguyên -> vẫn up-to-date (hash nội dung)
+    st = a.stat()
+    os.utime(a, ns=(st.st_atime_ns, st.st_mtime_ns + 10 ** 9))
+    Pipeline(stages, state).run(dry_run=True)
+    assert capsys.readouterr().out.count("up-to-date") == 2
+
+    a.write_text("2")
+    Pipeline(stages, state).run(dry_run=True)
+    out = capsys.readouterr().out
+    assert "GIAI ĐOẠN 1 (copy a): SẼ CHẠY – input hoặc cấu hình đã đổi" in out
+    assert "GIAI ĐOẠN 2 (copy b): SẼ CHẠY – stage trước sẽ chạy lại" in out
+    assert runs == {1: 1, 2: 1} and c.read_text() == "1!!"
+
+    Pipeline(stages, state).run()
+    assert runs == {1: 2, 2: 2} and c.read_text() == "2!!"
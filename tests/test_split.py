@@ -0,0 +1,37 @@
+# tests/test_split.py
+import warnings
+
+import numpy as np
+
+from src.ga.split import _arrival_times
+
+
+def test_inf_leg_only_breaks_its_own_route():
+    # 2 tuyến: [5, inf, 3 | 4, 2], service 1 phút, xe rời depot lúc 480
+    leg = np.array([5.0, np.inf, 3.0, 4.0, 2.0])
+    service = np.ones(5)
+    ready = np.zeros(5)
+    depart = np.full(5, 480.0)
+    is_first = np.array([True, False, False, True, False])
+    route_of = np.array([0, 0, 0, 1, 1])
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        arrival = _arrival_times(leg, service, ready, depart, is_first, route_of)
+
+    assert not np.isnan(arrival).any()
+    assert arrival[0] == 485.0
+    assert np.isinf(arrival[1:3]).all()
+    np.testing.assert_array_equal(arrival[3:], [484.0, 487.0])
+
+
+def test_ready_time_waits_within_route():
+    leg = np.array([5.0, 3.0, 4.0])
+    service = np.full(3, 10.0)
+    ready = np.array([0.0, 600.0, 0.0])
+    depart = np.full(3, 480.0)
+    is_first = np.array([True, False, True])
+    route_of = np.array([0, 0, 1])
+
+    arrival = _arrival_times(leg, service, ready, depart, is_first, route_of)
+    np.testing.assert_array_equal(arrival, [485.0, 600.0, 484.0])